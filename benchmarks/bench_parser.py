@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Time the code DB parser against the one it replaced (legacy_parser.py).
+
+Each workload is one large translation unit built in memory:
+
+  synthetic  functions from generate.py (comments, string literals with braces,
+             nested blocks), the same shape as the code-db stage's tree
+  vuln-lib   ossfuzz-target/src/vuln_lib.c repeated
+  dense      tiny comment-free functions, four lines each; the per-function
+             overhead dominates here, so this is the new parser's worst case
+
+Both parsers see the same text; the best of --repeat runs counts. Where both
+parsers are expected to agree (vuln-lib, dense) their output is compared and a
+mismatch fails the run. Speed-ups below --min-speedup are marked; with
+--strict they fail the run.
+
+Usage:
+  python3 benchmarks/bench_parser.py [--scale 1.0] [--repeat 2]
+                                     [--min-speedup 5] [--strict]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+BENCH_DIR = ROOT / "benchmarks"
+sys.path.insert(0, str(BENCH_DIR))
+sys.path.insert(0, str(ROOT / "code-db-builder"))
+
+import generate  # noqa: E402
+import legacy_parser  # noqa: E402
+from build_code_db import scan_functions  # noqa: E402
+
+# Full-size workloads; --scale multiplies the counts.
+FULL_SIZE = {"synthetic": 50_000, "vuln-lib": 4_000, "dense": 100_000}
+VULN_LIB = ROOT / "ossfuzz-target" / "src" / "vuln_lib.c"
+
+
+def synthetic_tu(functions: int) -> str:
+    rng = random.Random(generate.SEED)
+    lines = ["#include <stdint.h>", "#include <stdlib.h>", "#include <string.h>", ""]
+    for index in range(functions):
+        lines.extend(generate._function_source(rng, index))
+    return "\n".join(lines) + "\n"
+
+
+def vuln_lib_tu(copies: int) -> str:
+    return VULN_LIB.read_text() * copies
+
+
+def dense_tu(functions: int) -> str:
+    return "".join(f"int f{i}(int a) {{\n  if (a) {{ a++; }}\n  return a;\n}}\n" for i in range(functions))
+
+
+# name -> (builder, whether both parsers must agree)
+WORKLOADS: Dict[str, Tuple[Callable[[int], str], bool]] = {
+    "synthetic": (synthetic_tu, False),
+    "vuln-lib": (vuln_lib_tu, True),
+    "dense": (dense_tu, True),
+}
+
+
+Parser = Callable[[str], List[Dict[str, int]]]
+
+
+def best_time(parse: Parser, text: str, repeat: int) -> Tuple[float, List[Dict[str, int]]]:
+    best = float("inf")
+    functions: List[Dict[str, int]] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        functions = parse(text)
+        best = min(best, time.perf_counter() - started)
+    return best, functions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare the code DB parser with the legacy one.")
+    parser.add_argument("--scale", type=float, default=1.0, help="fraction of the full-size workloads (default: 1)")
+    parser.add_argument("--repeat", type=int, default=2, help="runs per parser; the fastest counts (default: 2)")
+    parser.add_argument("--min-speedup", type=float, default=5.0, help="target speed-up (default: 5)")
+    parser.add_argument("--strict", action="store_true", help="fail if a workload misses --min-speedup")
+    parser.add_argument("--workload", action="append", choices=list(WORKLOADS), help="workload (default: all)")
+    args = parser.parse_args()
+
+    failed: List[str] = []
+    for name in args.workload or list(WORKLOADS):
+        build, must_agree = WORKLOADS[name]
+        text = build(max(1, int(FULL_SIZE[name] * args.scale)))
+        old_seconds, old = best_time(legacy_parser.extract_functions, text, max(1, args.repeat))
+        new_seconds, new = best_time(scan_functions, text, max(1, args.repeat))
+        speedup = old_seconds / max(new_seconds, 1e-9)
+        mark = "" if speedup >= args.min_speedup else f"  below {args.min_speedup:g}x"
+        print(
+            f"[bench] {name:<10} {text.count(chr(10)):>8,} lines {len(new):>7,} functions  "
+            f"old {old_seconds:6.2f}s  new {new_seconds:6.2f}s  {speedup:5.1f}x{mark}"
+        )
+        if must_agree and old != new:
+            failed.append(f"{name}: parsers disagree ({len(old)} vs {len(new)} functions)")
+        elif mark and args.strict:
+            failed.append(f"{name}: {speedup:.1f}x is below {args.min_speedup:g}x")
+    for problem in failed:
+        print(f"[bench] FAILED {problem}", file=sys.stderr)
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
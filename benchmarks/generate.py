@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic inputs for the benchmark suite (run_benchmarks.py).
+
+  - a C source tree: `files` files holding `functions` functions in total, with
+    comments, string literals, nested blocks and a sprinkling of the calls the
+    analyze.py rules look for (memcpy, printf(var), malloc(a * b), free);
+  - a SARIF report with `results` results pointing into that tree, most with
+    file:// URIs under the tree and some with foreign prefixes, as CodeQL
+    emits for sources built elsewhere;
+  - an AFL++ output tree: out-<harness>-<ts>/default/crashes/id:... files for
+    several harnesses and runs, with some inputs repeated across runs.
+
+The same parameters and seed always produce byte-identical output. Each
+dataset directory records its parameters in .params.json and is only
+regenerated when they change.
+
+Usage:
+  python3 benchmarks/generate.py [--scale 0.01] [--data-dir benchmarks/data]
+"""
+
+import argparse
+import json
+import random
+import shutil
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_DATA_DIR = ROOT / "benchmarks" / "data"
+SEED = 1337
+# Bump whenever the generated content changes so cached datasets are rebuilt.
+GENERATOR_VERSION = 1
+
+# Full-size dataset; --scale multiplies every count.
+FULL_SIZE = {
+    "files": 10_000,
+    "functions": 1_000_000,
+    "sarif_results": 500_000,
+    "harnesses": 50,
+    "runs_per_harness": 4,
+    "crashes": 40_000,
+}
+
+PARAMS_FILE = ".params.json"
+# (rel path, line count) of every generated source file.
+Layout = List[Tuple[str, int]]
+
+_TYPES = ["int", "size_t", "char *", "const uint8_t *", "unsigned", "long"]
+# Statements (one or more lines each) that make up function bodies.
+_STATEMENTS = [
+    ["    int {v} = {n};"],
+    ["    /* {v}: keep {{ and }} out of the brace count */"],
+    ['    const char *{v}_msg = "value {{ %d }}";'],
+    ["    if ({v} > {n}) {{", "        {v} -= {n};", "    }}"],
+    ["    for (int i = 0; i < {n}; i++) {{ {v} += i; }}"],
+    ["    // {v} = {v} * 2;"],
+    ["    {v} = helper_{n}({v}, size);"],
+]
+_RULE_LINES = [
+    "    memcpy(buf, data, size);",
+    "    printf(data);",
+    "    char *p = malloc(size * {n});",
+    "    free(ptr); ptr[0] = 0;",
+]
+
+
+def scaled(scale: float) -> Dict[str, int]:
+    return {key: max(1, int(value * scale)) for key, value in FULL_SIZE.items()}
+
+
+def _fresh(dest: Path, params: Dict[str, object]) -> bool:
+    """True if dest already holds a dataset generated with params; otherwise clears it."""
+    params = dict(params, version=GENERATOR_VERSION)
+    marker = dest / PARAMS_FILE
+    try:
+        if json.loads(marker.read_text()) == params:
+            return True
+    except (OSError, ValueError):
+        pass
+    if dest.exists():
+        shutil.rmtree(dest)
+    dest.mkdir(parents=True)
+    return False
+
+
+def _mark(dest: Path, params: Dict[str, object]) -> None:
+    (dest / PARAMS_FILE).write_text(json.dumps(dict(params, version=GENERATOR_VERSION)) + "\n")
+
+
+def _function_source(rng: random.Random, index: int) -> List[str]:
+    lines = [
+        f"/* synthetic function {index} */",
+        f"static {rng.choice(_TYPES)} fn_{index}(const uint8_t *data, size_t size) {{",
+    ]
+    var = f"v{index % 97}"
+    for _ in range(rng.randint(2, 7)):
+        n = rng.randint(1, 64)
+        lines.extend(line.format(v=var, n=n) for line in rng.choice(_STATEMENTS))
+    if rng.random() < 0.2:
+        lines.append(rng.choice(_RULE_LINES).format(n=rng.randint(2, 16)))
+    lines.append(f"    return {var if index % 3 else 0};")
+    lines.append("}")
+    lines.append("")
+    return lines
+
+
+def generate_c_tree(dest: Path, files: int, functions: int, seed: int = SEED) -> Layout:
+    """Write the C tree under dest/src and return its layout."""
+    params = {"kind": "c-tree", "files": files, "functions": functions, "seed": seed}
+    layout_path = dest / "layout.json"
+    if _fresh(dest, params):
+        return [tuple(entry) for entry in json.loads(layout_path.read_text())]  # type: ignore[misc]
+    rng = random.Random(seed)
+    layout: Layout = []
+    per_file, extra = divmod(functions, files)
+    index = 0
+    for file_no in range(files):
+        rel = f"src/mod{file_no // 100:03d}/file{file_no:05d}.c"
+        lines = ["#include <stdint.h>", "#include <stdlib.h>", "#include <string.h>", ""]
+        for _ in range(per_file + (1 if file_no < extra else 0)):
+            lines.extend(_function_source(rng, index))
+            index += 1
+        path = dest / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("\n".join(lines) + "\n")
+        layout.append((rel, len(lines)))
+    layout_path.write_text(json.dumps(layout) + "\n")
+    _mark(dest, params)
+    return layout
+
+
+def generate_sarif(dest: Path, tree_root: Path, layout: Layout, results: int, seed: int = SEED) -> Path:
+    """Write dest/findings.sarif with `results` results located in the tree."""
+    params = {"kind": "sarif", "results": results, "files": len(layout), "root": str(tree_root), "seed": seed}
+    sarif_path = dest / "findings.sarif"
+    if _fresh(dest, params):
+        return sarif_path
+    rng = random.Random(seed)
+    rules = ["cpp/unbounded-write", "cpp/tainted-format-string", "cpp/use-after-free", "cpp/integer-overflow"]
+    with sarif_path.open("w") as out:
+        out.write('{"version": "2.1.0", "runs": [{"tool": {"driver": {"name": "CodeQL"}}, "results": [\n')
+        for i in range(results):
+            rel, line_count = layout[rng.randrange(len(layout))]
+            if rng.random() < 0.9:
+                uri = (tree_root / rel).as_uri()
+            else:
+                uri = f"file:///build/checkout/{rel}"
+            result = {
+                "ruleId": rules[i % len(rules)],
+                "message": {"text": f"synthetic finding {i}"},
+                "locations": [
+                    {
+                        "physicalLocation": {
+                            "artifactLocation": {"uri": uri},
+                            "region": {"startLine": rng.randint(1, line_count)},
+                        }
+                    }
+                ],
+            }
+            out.write(("," if i else "") + json.dumps(result) + "\n")
+        out.write("]}]}\n")
+    _mark(dest, params)
+    return sarif_path
+
+
+def generate_afl_tree(dest: Path, harnesses: int, runs_per_harness: int, crashes: int, seed: int = SEED) -> Path:
+    """Write out-<harness>-<ts>/default/crashes trees under dest; returns dest."""
+    params = {"kind": "afl", "harnesses": harnesses, "runs": runs_per_harness, "crashes": crashes, "seed": seed}
+    if _fresh(dest, params):
+        return dest
+    rng = random.Random(seed)
+    dirs = []
+    for h in range(harnesses):
+        for run in range(runs_per_harness):
+            crash_dir = dest / f"out-bench_{h:03d}_afl-{1700000000 + run}" / "default" / "crashes"
+            crash_dir.mkdir(parents=True)
+            (crash_dir / "README.txt").write_text("Command line used to find this crash:\n")
+            dirs.append(crash_dir)
+    # Inputs come from a pool half the size of the crash count, so many are found more than once.
+    for i in range(crashes):
+        crash_dir = dirs[i % len(dirs)]
+        sig = rng.choice((6, 11))
+        name = (
+            f"id:{i // len(dirs):06d},sig:{sig:02d},src:000000,"
+            f"time:{rng.randint(1, 10**6)},execs:{rng.randint(1, 10**7)},op:havoc,rep:2"
+        )
+        payload = rng.randrange(crashes // 2 + 1).to_bytes(4, "little") * rng.randint(1, 64)
+        (crash_dir / name).write_bytes(payload)
+    _mark(dest, params)
+    return dest
+
+
+def generate_all(data_dir: Path, scale: float, seed: int = SEED) -> Dict[str, object]:
+    """Generate (or reuse) every dataset for `scale`; returns their locations and sizes."""
+    size = scaled(scale)
+    tree = data_dir / "tree"
+    layout = generate_c_tree(tree, size["files"], size["functions"], seed)
+    sarif = generate_sarif(data_dir / "sarif", tree, layout, size["sarif_results"], seed)
+    afl = generate_afl_tree(data_dir / "afl", size["harnesses"], size["runs_per_harness"], size["crashes"], seed)
+    return {"size": size, "tree": tree, "sarif": sarif, "afl": afl}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate synthetic benchmark inputs.")
+    parser.add_argument("--scale", type=float, default=1.0, help="fraction of the full-size dataset (default: 1)")
+    parser.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR, help="where to write the datasets")
+    args = parser.parse_args()
+    datasets = generate_all(args.data_dir, args.scale)
+    print(f"[bench] Datasets in {args.data_dir}: {json.dumps(datasets['size'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Python stages of the pipeline on synthetic inputs.
+
+Stages (each run in a fresh interpreter so memory numbers do not mix):
+
+  code-db          build_code_db.build_db over the synthetic C tree
+  analyze          analyze.analyze over its code DB (one worker)
+  static-analysis  run_static_analysis.collect_findings over the synthetic SARIF
+  collect-crashes  collect_crashes.index_output_dirs + collect_crashes_for_harness
+                   over the synthetic AFL++ output tree
+
+For every stage the throughput (items per second of the timed call) and the
+peak RSS of its process (wait4) are reported and written to
+benchmarks/results.json. Inputs come from generate.py and are cached in
+benchmarks/data/, so only the first run at a given --scale pays for them (the
+full-size set takes about 600 MB). --data-dir must stay inside the repo:
+collect_crashes reports crash paths relative to it.
+
+With a baseline (benchmarks/baseline.json, written by --update-baseline) the
+run fails if any stage's throughput drops, or its peak RSS grows, by more than
+--tolerance relative to the baseline. Baselines are per machine and scale; a
+baseline recorded at another scale is not compared.
+
+Usage:
+  python3 benchmarks/run_benchmarks.py [--scale 1.0] [--stage STAGE ...]
+                                       [--repeat N] [--tolerance 0.25]
+                                       [--update-baseline]
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+BENCH_DIR = ROOT / "benchmarks"
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+DEFAULT_RESULTS = BENCH_DIR / "results.json"
+BASELINE_VERSION = 1
+
+sys.path.insert(0, str(BENCH_DIR))
+for _subdir in ("code-db-builder", "code-ql", "static-analyzer", "fuzzer"):
+    sys.path.insert(0, str(ROOT / _subdir))
+
+import generate  # noqa: E402
+
+Result = Dict[str, object]
+
+
+def code_db_path(data_dir: Path) -> Path:
+    return data_dir / "code_db.json"
+
+
+def prepare(data_dir: Path, scale: float) -> Dict[str, object]:
+    """Generate the datasets and the code DB the later stages read; both are cached."""
+    import build_code_db
+
+    datasets = generate.generate_all(data_dir, scale)
+    db_path = code_db_path(data_dir)
+    key_path = db_path.with_name(db_path.name + ".key")
+    key = (datasets["tree"] / generate.PARAMS_FILE).read_text()  # type: ignore[operator]
+    if not db_path.exists() or not key_path.exists() or key_path.read_text() != key:
+        db = build_code_db.build_db(datasets["tree"])  # type: ignore[arg-type]
+        db_path.write_text(json.dumps(db) + "\n")
+        key_path.write_text(key)
+    return datasets
+
+
+def bench_code_db(datasets: Dict[str, object], data_dir: Path) -> Result:
+    import build_code_db
+
+    tree: Path = datasets["tree"]  # type: ignore[assignment]
+    started = time.perf_counter()
+    db = build_code_db.build_db(tree)
+    seconds = time.perf_counter() - started
+    functions = sum(len(entry["functions"]) for entry in db["files"])
+    return {"seconds": seconds, "items": functions, "unit": "functions"}
+
+
+def bench_analyze(datasets: Dict[str, object], data_dir: Path) -> Result:
+    import analyze
+
+    db = analyze.load_code_db(code_db_path(data_dir))
+    functions = sum(len(entry["functions"]) for entry in db["files"])
+    started = time.perf_counter()
+    findings = analyze.analyze(db, Path(db["project_root"]))
+    seconds = time.perf_counter() - started
+    return {"seconds": seconds, "items": functions, "unit": "functions", "findings": len(findings)}
+
+
+def bench_static_analysis(datasets: Dict[str, object], data_dir: Path) -> Result:
+    import run_static_analysis
+
+    size: Dict[str, int] = datasets["size"]  # type: ignore[assignment]
+    started = time.perf_counter()
+    findings = run_static_analysis.collect_findings(datasets["sarif"], code_db_path(data_dir))  # type: ignore[arg-type]
+    seconds = time.perf_counter() - started
+    return {"seconds": seconds, "items": size["sarif_results"], "unit": "results", "findings": len(findings)}
+
+
+def bench_collect_crashes(datasets: Dict[str, object], data_dir: Path) -> Result:
+    import collect_crashes
+
+    size: Dict[str, int] = datasets["size"]  # type: ignore[assignment]
+    started = time.perf_counter()
+    index = collect_crashes.index_output_dirs(datasets["afl"])  # type: ignore[arg-type]
+    unique = sum(len(collect_crashes.collect_crashes_for_harness(base, index)) for base in sorted(index))
+    seconds = time.perf_counter() - started
+    return {"seconds": seconds, "items": size["crashes"], "unit": "crash files", "unique": unique}
+
+
+STAGES: Dict[str, Callable[[Dict[str, object], Path], Result]] = {
+    "code-db": bench_code_db,
+    "analyze": bench_analyze,
+    "static-analysis": bench_static_analysis,
+    "collect-crashes": bench_collect_crashes,
+}
+
+
+def run_child(args: List[str]) -> Dict[str, object]:
+    """Run this script in a child interpreter; returns its JSON output plus its peak RSS (kB)."""
+    proc = subprocess.Popen([sys.executable, str(Path(__file__).resolve()), *args], stdout=subprocess.PIPE, text=True)
+    assert proc.stdout is not None
+    output = proc.stdout.read()
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        raise SystemExit(f"[bench] {' '.join(args)} failed with exit code {proc.returncode}")
+    result = json.loads(output.strip().splitlines()[-1])
+    result["peak_rss_kb"] = usage.ru_maxrss
+    return result
+
+
+def run_stage(stage: str, data_dir: Path, scale: float, repeat: int) -> Result:
+    """Best throughput and highest peak RSS over `repeat` fresh runs of a stage."""
+    runs = [run_child(["--child", stage, "--data-dir", str(data_dir), "--scale", str(scale)]) for _ in range(repeat)]
+    best = min(runs, key=lambda run: float(run["seconds"]))  # type: ignore[arg-type]
+    result: Result = dict(best)
+    result["throughput"] = float(best["items"]) / max(float(best["seconds"]), 1e-9)  # type: ignore[arg-type]
+    result["peak_rss_kb"] = max(int(run["peak_rss_kb"]) for run in runs)  # type: ignore[call-overload]
+    return result
+
+
+def load_baseline(path: Path) -> Optional[Dict[str, object]]:
+    if not path.exists():
+        return None
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, json.JSONDecodeError):
+        return None
+    return data if data.get("version") == BASELINE_VERSION else None
+
+
+def regressions(results: Dict[str, Result], baseline: Dict[str, object], tolerance: float) -> List[str]:
+    """Human-readable regressions of results against baseline stages."""
+    problems: List[str] = []
+    stages: Dict[str, Dict[str, float]] = baseline.get("stages", {})  # type: ignore[assignment]
+    for stage, result in results.items():
+        base = stages.get(stage)
+        if base is None:
+            continue
+        throughput = float(result["throughput"])  # type: ignore[arg-type]
+        if throughput < base["throughput"] * (1.0 - tolerance):
+            problems.append(
+                f"{stage}: throughput {throughput:,.0f} {result['unit']}/s is "
+                f"{100 * (1 - throughput / base['throughput']):.0f}% below baseline {base['throughput']:,.0f}"
+            )
+        rss = int(result["peak_rss_kb"])  # type: ignore[call-overload]
+        if rss > base["peak_rss_kb"] * (1.0 + tolerance):
+            problems.append(
+                f"{stage}: peak RSS {rss / 1024:,.1f} MiB is "
+                f"{100 * (rss / base['peak_rss_kb'] - 1):.0f}% above baseline {base['peak_rss_kb'] / 1024:,.1f} MiB"
+            )
+    return problems
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline's Python stages on synthetic inputs.")
+    parser.add_argument("--scale", type=float, default=1.0, help="fraction of the full-size dataset (default: 1)")
+    parser.add_argument("--stage", action="append", choices=list(STAGES), help="stage to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per stage; the fastest counts (default: 1)")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="allowed slowdown / memory growth vs baseline (default: 0.25)"
+    )
+    parser.add_argument("--data-dir", type=Path, default=generate.DEFAULT_DATA_DIR, help="synthetic dataset cache")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="baseline JSON")
+    parser.add_argument("--update-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--output", type=Path, default=DEFAULT_RESULTS, help="results JSON")
+    parser.add_argument("--child", choices=["prepare", *STAGES], help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.child == "prepare":
+        size = prepare(args.data_dir, args.scale)["size"]
+        print(json.dumps({"size": size}))
+        return
+    if args.child is not None:
+        datasets = generate.generate_all(args.data_dir, args.scale)
+        print(json.dumps(STAGES[args.child](datasets, args.data_dir)))
+        return
+
+    print(f"[bench] Preparing datasets (scale {args.scale:g}) in {args.data_dir} ...")
+    started = time.monotonic()
+    size = run_child(["--child", "prepare", "--data-dir", str(args.data_dir), "--scale", str(args.scale)])["size"]
+    print(f"[bench] Datasets ready in {time.monotonic() - started:.1f}s: {json.dumps(size)}")
+
+    results: Dict[str, Result] = {}
+    for stage in args.stage or list(STAGES):
+        result = run_stage(stage, args.data_dir, args.scale, max(1, args.repeat))
+        results[stage] = result
+        print(
+            f"[bench] {stage:<16} {float(result['seconds']):8.2f}s  "  # type: ignore[arg-type]
+            f"{float(result['throughput']):>12,.0f} {result['unit']}/s  "  # type: ignore[arg-type]
+            f"peak rss {int(result['peak_rss_kb']) / 1024:8.1f} MiB"  # type: ignore[call-overload]
+        )
+
+    report = {
+        "version": BASELINE_VERSION,
+        "scale": args.scale,
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "size": size,
+        "stages": results,
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"[bench] Results written to {args.output}")
+
+    if args.update_baseline:
+        baseline = load_baseline(args.baseline) or {}
+        stages = dict(baseline.get("stages", {})) if baseline.get("scale") == args.scale else {}
+        for stage, result in results.items():
+            stages[stage] = {"throughput": result["throughput"], "peak_rss_kb": result["peak_rss_kb"]}
+        report = dict(report, stages=stages)
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"[bench] Baseline updated: {args.baseline}")
+        return
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"[bench] No baseline at {args.baseline}; record one with --update-baseline")
+        return
+    if baseline.get("scale") != args.scale:
+        print(f"[bench] Baseline was recorded at scale {baseline.get('scale')}; not comparing")
+        return
+    problems = regressions(results, baseline, args.tolerance)
+    for problem in problems:
+        print(f"[bench] REGRESSION {problem}", file=sys.stderr)
+    if problems:
+        raise SystemExit(1)
+    print(f"[bench] No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,153 +5,440 @@ Quick-and-dirty code database builder for the ossfuzz-target project.
 It scans source files and emits JSON describing files and their functions with
 start/end line numbers. Intended to run from the repo root:
 
-  python3 code-db-builder/build_code_db.py [path-to-project] [output-json]
+  python3 code-db-builder/build_code_db.py [path-to-project] [output-json] [--jobs N]
+                                           [--sqlite PATH] [--quiet]
 
 Defaults to ../ossfuzz-target and writes to code-db-builder/code_db.json when
 run from the repo root.
+
+Parsed functions are cached per file (keyed by content hash and parser version)
+in <output-json stem>.cache.json, so unchanged files are not re-parsed. Files
+that do need parsing can be spread across N worker processes with --jobs
+(0 = one per CPU); the output is identical to a serial run.
+
+With --sqlite the database is also written as an indexed SQLite store (see
+code_db_store.py) that consumers can query without loading all of it.
+
+Records are written as each file is parsed rather than after the whole tree
+is scanned. An output path ending in .ndjson selects line-delimited output: a
+header line {"format": "code-db-ndjson", "version": 1, "project_root": ...}
+followed by one {"path", "functions"} record per line, which iter_db_file (and
+every consumer of the code DB) reads one file at a time. --quiet skips the
+copy echoed to stdout.
 """
 
+import argparse
+import hashlib
 import json
+import os
 import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from code_db_store import write_store
 
 
 ALLOWED_EXTS = {".c", ".cc", ".cpp", ".cxx", ".h", ".hpp"}
 KEYWORDS = {"if", "for", "while", "switch", "catch", "return", "sizeof"}
+# Bump whenever extract_functions changes its output so cached entries are discarded.
+PARSER_VERSION = 2
+# Line-delimited output: a header line, then one file record per line.
+NDJSON_FORMAT = "code-db-ndjson"
+NDJSON_VERSION = 1
+NDJSON_SUFFIXES = {".ndjson", ".jsonl"}
 
+FileRecord = Dict[str, object]
 
-def strip_comments(lines: List[str]) -> List[str]:
-    """Remove // and /* */ comments for simple parsing."""
-    stripped: List[str] = []
-    in_block = False
-    for line in lines:
-        i = 0
-        new_line = []
-        while i < len(line):
-            if not in_block and line.startswith("//", i):
-                break  # rest of line is a comment
-            if not in_block and line.startswith("/*", i):
-                in_block = True
-                i += 2
-                continue
-            if in_block and line.startswith("*/", i):
-                in_block = False
-                i += 2
-                continue
-            if in_block:
-                i += 1
-                continue
-            new_line.append(line[i])
-            i += 1
-        stripped.append("".join(new_line))
-    return stripped
 
+# Tokens whose contents must never be read as braces, semicolons or calls: comments,
+# string/char literals (including C++ raw strings) and preprocessor directives.
+# Every alternative begins with a literal character so the regex engine can skip
+# uninteresting text with its first-character fast path, and loops are unrolled
+# ("normal* (special normal*)*") to avoid per-character backtracking.
+_SKIP = r"""
+    /\*[^*]*\*+(?:[^/*][^*]*\*+)*/ | /\*.*
+  | //[^\n\\]*(?:\\.[^\n\\]*)*
+  | R"(?P<delim>[^()\\\s"]{0,16})\(.*?\)(?P=delim)"
+  | "[^"\\\n]*(?:\\.[^"\\\n]*)*"?
+  | '(?<![0-9A-Fa-f]')[^'\\\n]*(?:\\.[^'\\\n]*)*'?
+  | \#[^\n\\/]*(?:(?:\\.|/(?![/*]))[^\n\\/]*)*
+"""
+# Between functions we need parentheses and the statement/block delimiters as
+# well; tokens are told apart by their first character.
+_HEADER_RE = re.compile(r"\{ | \} | ; | \( | \) |" + _SKIP, re.MULTILINE | re.DOTALL | re.VERBOSE)
+# Inside a function body braces are counted with str.count between literals and
+# comments, so only those need to be tokenized.
+_BODY_SKIP_RE = re.compile(_SKIP, re.MULTILINE | re.DOTALL | re.VERBOSE)
+_BRACE_RE = re.compile(r"[{}]")
+# Brace-counting window inside bodies; doubles while a function keeps going.
+_BODY_WINDOW = 256
+_BODY_WINDOW_MAX = 1 << 16
+# Identifier (reversed) directly before an opening parenthesis.
+_REVERSED_IDENT_RE = re.compile(r"\s*(\w+)")
+_DIGITS = "0123456789"
+# Call-like constructs that can follow a declarator but never name the function.
+NON_FUNCTION_CALLS = {"__attribute__", "__declspec", "alignas", "decltype", "noexcept", "throw"}
 
-def extract_functions(path: Path) -> List[Dict[str, int]]:
-    """Return a list of functions with start/end line numbers for a file."""
-    raw_lines = path.read_text().splitlines()
-    lines = strip_comments(raw_lines)
 
+def scan_functions(text: str) -> List[Dict[str, int]]:
+    """
+    Find top-level function definitions in C/C++ source text in one linear pass.
+
+    A function's range starts on the first line after the previous top-level
+    declaration, statement or function (so leading comments belong to it) and
+    ends on the line of its closing brace. Function names are the last
+    call-like identifier at parenthesis depth 0 before the opening brace.
+    Braces that do not follow such a header (namespaces, extern "C", classes,
+    initializers) are transparent, so nested definitions are still found.
+    """
     functions: List[Dict[str, int]] = []
-    header_lines: List[str] = []
-    header_start: Optional[int] = None
-    brace_depth = 0
-    current_name: Optional[str] = None
-    current_start: Optional[int] = None
-
-    for idx, line in enumerate(lines, start=1):
-        # Collapse whitespace to help the regex.
-        collapsed = line.strip()
-
-        if brace_depth == 0:
-            if not header_lines:
-                header_start = idx
-            header_lines.append(collapsed)
-
-            if "{" in collapsed:
-                header_text = " ".join(header_lines)
-                # Skip likely non-function constructs.
-                candidates = re.findall(r"([A-Za-z_][A-Za-z0-9_]*)\s*\(", header_text)
-                if not candidates:
-                    header_lines.clear()
-                    header_start = None
-                    continue
-                name = candidates[-1]
-                if name in KEYWORDS:
-                    header_lines.clear()
-                    header_start = None
-                    continue
-
-                current_name = name
-                current_start = header_start if header_start is not None else idx
-                brace_depth = header_text.count("{") - header_text.count("}")
-                header_lines.clear()
-                header_start = None
-                # Handle edge case: function with opening and closing brace on same line.
-                if brace_depth == 0:
-                    functions.append(
-                        {
-                            "name": current_name,
-                            "start_line": current_start,
-                            "end_line": idx,
-                        }
-                    )
-                    current_name = None
-                    current_start = None
+    search_header = _HEADER_RE.search
+    search_skip = _BODY_SKIP_RE.search
+    find_braces = _BRACE_RE.finditer
+    match_reversed_ident = _REVERSED_IDENT_RE.match
+    count = text.count
+    size = len(text)
+
+    line = 1  # line number of text[line_pos]
+    line_pos = 0
+    header_start = 1
+    name: Optional[str] = None
+    parens = 0
+    pos = 0
+    # Next literal/comment inside bodies, reused until the scan passes it.
+    skip = None
+    skip_from = size + 1
+    while True:
+        m = search_header(text, pos)
+        if m is None:
+            break
+        token_pos = m.start()
+        pos = m.end()
+        token = text[token_pos]
+        if token == "(":
+            if parens == 0:
+                # Identifier in front of "(", matched on the reversed preceding text.
+                call = match_reversed_ident(text[max(0, token_pos - 256) : token_pos][::-1])
+                if call is not None:
+                    ident = call.group(1)[::-1]
+                    if ident[0] not in _DIGITS and ident not in NON_FUNCTION_CALLS:
+                        name = ident
+            parens += 1
+            continue
+        if token == ")":
+            if parens:
+                parens -= 1
+            continue
+        if token not in "{};":
+            continue  # comment, literal or directive
+
+        line += count("\n", line_pos, token_pos)
+        line_pos = token_pos
+        if token != "{" or name is None or name in KEYWORDS:
+            # End of a declaration/statement, or a brace that does not open a function.
+            header_start = line + 1
+            name = None
+            parens = 0
+            continue
+
+        start_line = header_start if header_start < line else line
+        depth = 1
+        end = -1
+        window = _BODY_WINDOW
+        while True:
+            if skip is None and skip_from > pos or skip is not None and skip.start() < pos:
+                skip = search_skip(text, pos)
+                skip_from = pos
+            seg_end = skip.start() if skip is not None else size
+            # Bound each step so a distant literal does not make us count to EOF.
+            chunked = seg_end - pos > window
+            if chunked:
+                seg_end = pos + window
+                if window < _BODY_WINDOW_MAX:
+                    window *= 2
+            closes = count("}", pos, seg_end)
+            if closes < depth:
+                depth += count("{", pos, seg_end) - closes
+            else:
+                # The function may end inside this segment: walk its braces.
+                for brace in find_braces(text, pos, seg_end):
+                    depth += 1 if brace.group() == "{" else -1
+                    if depth == 0:
+                        end = brace.end()
+                        break
+                if end >= 0:
+                    break
+            if chunked:
+                pos = seg_end
                 continue
+            if skip is None:
+                break  # unterminated function at EOF
+            pos = skip.end()
+        if end < 0:
+            break
 
-            # Reset if we hit a declaration/statement ending in semicolon without a brace.
-            if ";" in collapsed:
-                header_lines.clear()
-                header_start = None
-        else:
-            # Already inside a function; track braces.
-            brace_depth += line.count("{")
-            brace_depth -= line.count("}")
-            if brace_depth <= 0 and current_name is not None and current_start is not None:
-                functions.append(
-                    {
-                        "name": current_name,
-                        "start_line": current_start,
-                        "end_line": idx,
-                    }
-                )
-                current_name = None
-                current_start = None
-                brace_depth = 0
+        pos = end
+        line += count("\n", line_pos, pos - 1)
+        line_pos = pos - 1
+        functions.append({"name": name, "start_line": start_line, "end_line": line})
+        header_start = line + 1
+        name = None
+        parens = 0
 
     return functions
 
 
-def build_db(root: Path) -> Dict[str, List[Dict[str, int]]]:
-    files_info = []
-    for path in sorted(root.rglob("*")):
-        if path.suffix.lower() not in ALLOWED_EXTS or not path.is_file():
-            continue
-        rel_path = path.relative_to(root)
-        functions = extract_functions(path)
-        files_info.append(
-            {"path": str(rel_path), "functions": functions},
+def extract_functions(path: Path) -> List[Dict[str, int]]:
+    """Return a list of functions with start/end line numbers for a file."""
+    return scan_functions(path.read_text())
+
+
+def default_cache_path(out_path: Path) -> Path:
+    """Cache file stored next to the output JSON (code_db.json -> code_db.cache.json)."""
+    return out_path.with_name(f"{out_path.stem}.cache.json")
+
+
+def load_cache(cache_path: Path, root: Path) -> Dict[str, Dict[str, object]]:
+    """Return cached per-file entries, or an empty dict if the cache is missing or stale."""
+    if not cache_path.exists():
+        return {}
+    try:
+        data = json.loads(cache_path.read_text())
+    except (OSError, ValueError):
+        return {}
+    if data.get("parser_version") != PARSER_VERSION or data.get("project_root") != str(root):
+        return {}
+    files = data.get("files")
+    return files if isinstance(files, dict) else {}
+
+
+def save_cache(cache_path: Path, root: Path, entries: Dict[str, Dict[str, object]]) -> None:
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+    payload = {"parser_version": PARSER_VERSION, "project_root": str(root), "files": entries}
+    tmp_path.write_text(json.dumps(payload) + "\n")
+    os.replace(tmp_path, cache_path)
+
+
+def iter_parsed(paths: List[Path], jobs: int = 1) -> Iterator[List[Dict[str, int]]]:
+    """Yield extract_functions for each path in order, from a process pool when jobs != 1."""
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    if jobs == 1 or len(paths) < 2:
+        for path in paths:
+            yield extract_functions(path)
+        return
+    workers = min(jobs, len(paths))
+    # A few chunks per worker keeps IPC overhead low while still balancing uneven file sizes.
+    chunksize = max(1, len(paths) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(extract_functions, paths, chunksize=chunksize)
+
+
+def parse_files(paths: List[Path], jobs: int = 1) -> List[List[Dict[str, int]]]:
+    """Run extract_functions over paths, in a process pool when jobs != 1. Order is preserved."""
+    return list(iter_parsed(paths, jobs))
+
+
+def iter_db(root: Path, cache_path: Optional[Path] = None, jobs: int = 1) -> Iterator[FileRecord]:
+    """
+    Scan root for C/C++ sources and yield one {"path", "functions"} record per
+    file, in path order, as soon as it is parsed.
+
+    When cache_path is given, files whose content hash matches the cache reuse
+    their previously parsed functions; only added or modified files are parsed,
+    and deleted files are dropped from the cache, which is saved once the last
+    record has been yielded. Parsing runs on `jobs` worker processes
+    (0 = one per CPU).
+    """
+    cached = load_cache(cache_path, root) if cache_path is not None else {}
+    sources = [
+        path
+        for path in sorted(root.rglob("*"))
+        if path.suffix.lower() in ALLOWED_EXTS and path.is_file()
+    ]
+    rel_paths = [str(path.relative_to(root)) for path in sources]
+
+    hits: Dict[str, List[Dict[str, int]]] = {}
+    digests: Dict[str, str] = {}
+    to_parse: List[Path] = []
+    for path, rel_path in zip(sources, rel_paths):
+        if cache_path is not None:
+            digest = hashlib.sha256(path.read_bytes()).hexdigest()
+            digests[rel_path] = digest
+            hit = cached.get(rel_path)
+            if isinstance(hit, dict) and hit.get("sha256") == digest:
+                hits[rel_path] = hit.get("functions", [])
+                continue
+        to_parse.append(path)
+
+    # Parsed results arrive in path order, so they interleave with the cache hits.
+    parsed = iter_parsed(to_parse, jobs)
+    entries: Dict[str, Dict[str, object]] = {}
+    for rel_path in rel_paths:
+        functions = hits[rel_path] if rel_path in hits else next(parsed)
+        if cache_path is not None:
+            entries[rel_path] = {"sha256": digests[rel_path], "functions": functions}
+        yield {"path": rel_path, "functions": functions}
+
+    if cache_path is not None:
+        dropped = len(cached.keys() - entries.keys())
+        save_cache(cache_path, root, entries)
+        sys.stderr.write(
+            f"[code-db] Cache {cache_path}: reused {len(hits)}, parsed {len(to_parse)}, dropped {dropped} file(s)\n"
         )
-    return {"project_root": str(root), "files": files_info}
+
+
+def build_db(
+    root: Path, cache_path: Optional[Path] = None, jobs: int = 1
+) -> Dict[str, List[Dict[str, int]]]:
+    """Scan root for C/C++ sources and return the whole code database (see iter_db)."""
+    return {"project_root": str(root), "files": list(iter_db(root, cache_path, jobs))}  # type: ignore[dict-item]
+
+
+def is_ndjson_path(path: Path) -> bool:
+    return path.suffix.lower() in NDJSON_SUFFIXES
+
+
+def stream_db(
+    records: Iterable[FileRecord], project_root: str, streams: List[TextIO], ndjson: bool = False
+) -> Iterator[FileRecord]:
+    """
+    Write a code DB to every stream while records pass through, and yield them on.
+
+    As JSON the output is byte-identical to json.dumps(db, indent=2) plus a
+    newline; as NDJSON it is a header line ({"format", "version",
+    "project_root"}) followed by one file record per line. Either way only the
+    current record is held, so the DB can be written while it is being built.
+    The document is complete once the generator is exhausted.
+    """
+    if ndjson:
+        header = {"format": NDJSON_FORMAT, "version": NDJSON_VERSION, "project_root": project_root}
+        for stream in streams:
+            stream.write(json.dumps(header) + "\n")
+        for record in records:
+            line = json.dumps(record) + "\n"
+            for stream in streams:
+                stream.write(line)
+            yield record
+        return
+
+    head = "{\n  " + json.dumps("project_root") + ": " + json.dumps(project_root) + ',\n  "files": ['
+    for stream in streams:
+        stream.write(head)
+    count = 0
+    for record in records:
+        chunk = ("\n    " if count == 0 else ",\n    ") + json.dumps(record, indent=2).replace("\n", "\n    ")
+        for stream in streams:
+            stream.write(chunk)
+        count += 1
+        yield record
+    tail = "]\n}\n" if count == 0 else "\n  ]\n}\n"
+    for stream in streams:
+        stream.write(tail)
+
+
+def write_db(
+    records: Iterable[FileRecord],
+    project_root: str,
+    out_path: Path,
+    quiet: bool = False,
+    sqlite_path: Optional[Path] = None,
+) -> None:
+    """
+    Stream records into out_path (NDJSON by suffix, else JSON), echoing to stdout
+    unless quiet and feeding an SQLite store at sqlite_path, all in one pass.
+
+    The file is written to a .tmp sibling and replaced atomically once complete,
+    so an interrupted build never leaves a truncated code DB behind.
+    """
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    try:
+        with tmp_path.open("w") as out:
+            streams = [out] if quiet else [out, sys.stdout]
+            written = stream_db(records, project_root, streams, ndjson=is_ndjson_path(out_path))
+            if sqlite_path is not None:
+                # The store consumes the same pass, so the database is never held in memory.
+                write_store({"project_root": project_root, "files": written}, sqlite_path)
+            else:
+                for _ in written:
+                    pass
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    os.replace(tmp_path, out_path)
+
+
+def read_db_header(path: Path) -> Optional[Dict[str, object]]:
+    """The NDJSON header of a code DB file, or None if it is a JSON document."""
+    with path.open("r") as f:
+        first = f.readline()
+    try:
+        header = json.loads(first)
+    except ValueError:
+        return None
+    if isinstance(header, dict) and header.get("format") == NDJSON_FORMAT:
+        return header
+    return None
+
+
+def iter_db_file(path: Path) -> Tuple[str, Iterator[FileRecord]]:
+    """
+    Open a code DB file (JSON or NDJSON) as (project_root, file records).
+
+    NDJSON is read one line at a time, so the whole database is never
+    materialized; a JSON document has to be parsed in full first.
+    """
+    header = read_db_header(path)
+    if header is None:
+        data = json.loads(path.read_text())
+        return str(data.get("project_root", "")), iter(data.get("files", []))
+    if header.get("version") != NDJSON_VERSION:
+        raise SystemExit(f"[code-db] {path}: unsupported NDJSON version {header.get('version')}")
+
+    def records() -> Iterator[FileRecord]:
+        with path.open("r") as f:
+            f.readline()
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    return str(header.get("project_root", "")), records()
 
 
 def main() -> None:
-    target = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).resolve().parent.parent / "ossfuzz-target"
-    out_path = (
-        Path(sys.argv[2])
-        if len(sys.argv) > 2
-        else Path(__file__).resolve().parent / "code_db.json"
+    parser = argparse.ArgumentParser(description="Build the code database JSON for a C/C++ project.")
+    parser.add_argument(
+        "target",
+        nargs="?",
+        type=Path,
+        default=Path(__file__).resolve().parent.parent / "ossfuzz-target",
+        help="project root to scan (default: ../ossfuzz-target)",
+    )
+    parser.add_argument(
+        "output",
+        nargs="?",
+        type=Path,
+        default=Path(__file__).resolve().parent / "code_db.json",
+        help="output path; .ndjson writes line-delimited records (default: code-db-builder/code_db.json)",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1, help="parser worker processes (0 = one per CPU, default: 1)"
     )
+    parser.add_argument("--sqlite", type=Path, help="also write an indexed SQLite store to this path")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not echo the database to stdout")
+    args = parser.parse_args()
+    target = args.target
+    out_path = args.output
     if not target.exists():
         sys.stderr.write(f"Target path does not exist: {target}\n")
         sys.exit(1)
-    db = build_db(target)
-    out_path.write_text(json.dumps(db, indent=2) + "\n")
-    json.dump(db, sys.stdout, indent=2)
-    sys.stdout.write("\n")
+    records = iter_db(target, cache_path=default_cache_path(out_path), jobs=args.jobs)
+    write_db(records, str(target), out_path, quiet=args.quiet, sqlite_path=args.sqlite)
+    if args.sqlite is not None:
+        sys.stderr.write(f"[code-db] Wrote SQLite store to {args.sqlite}\n")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Indexed SQLite store for the code database.
+
+Same content as code_db.json, in a single file with the tables
+
+  meta(key, value)                      project_root, schema_version
+  files(id, path)                       one row per source file, in DB order
+  functions(id, file_id, name, start_line, end_line)
+
+and an index on functions(file_id, start_line, end_line), so consumers can ask
+for the function enclosing a line, or the functions overlapping a line range,
+without loading the whole database. files.path is unique, and so indexed, for
+exact path lookups. The JSON stays the export format:
+
+  python3 code-db-builder/code_db_store.py import code_db.json code_db.sqlite
+  python3 code-db-builder/code_db_store.py import code_db.ndjson code_db.sqlite
+  python3 code-db-builder/code_db_store.py export code_db.sqlite code_db.json
+
+build_code_db.py --sqlite PATH (and start.py with code_db_sqlite in config.yml)
+write the store next to the JSON.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+SCHEMA_VERSION = 1
+_MAGIC = b"SQLite format 3\x00"
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE files (id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE);
+CREATE TABLE functions (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    name TEXT,
+    start_line INTEGER,
+    end_line INTEGER
+);
+"""
+# Created after the bulk insert, which is faster than maintaining them row by row.
+_INDEXES = """
+CREATE INDEX functions_by_span ON functions(file_id, start_line, end_line);
+CREATE INDEX functions_by_name ON functions(name);
+"""
+
+Function = Dict[str, object]
+
+
+def is_store(path: Path) -> bool:
+    """True if path is an SQLite file (as opposed to the JSON code DB)."""
+    try:
+        with path.open("rb") as f:
+            return f.read(len(_MAGIC)) == _MAGIC
+    except OSError:
+        return False
+
+
+def write_store(db: Dict, path: Path) -> None:
+    """
+    Write a code DB dict (as built by build_code_db.build_db) to an SQLite store, atomically.
+
+    db["files"] is iterated once, so it may be a generator of file records.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+    conn = sqlite3.connect(str(tmp_path))
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.executescript(_SCHEMA)
+        conn.executemany(
+            "INSERT INTO meta VALUES (?, ?)",
+            [("schema_version", str(SCHEMA_VERSION)), ("project_root", str(db.get("project_root", "")))],
+        )
+        # One executemany per file, so only the current file's functions are in memory.
+        file_id = 0
+        for entry in db.get("files", []):
+            rel = entry.get("path")
+            if not rel:
+                continue
+            file_id += 1
+            conn.execute("INSERT INTO files VALUES (?, ?)", (file_id, rel))
+            conn.executemany(
+                "INSERT INTO functions (file_id, name, start_line, end_line) VALUES (?, ?, ?, ?)",
+                [
+                    (file_id, fn.get("name"), fn.get("start_line"), fn.get("end_line"))
+                    for fn in entry.get("functions", [])
+                ],
+            )
+        conn.executescript(_INDEXES)
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+
+
+class CodeDbStore:
+    """Read-only queries over an SQLite code DB store."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        meta = dict(self._conn.execute("SELECT key, value FROM meta"))
+        if meta.get("schema_version") != str(SCHEMA_VERSION):
+            self._conn.close()
+            raise SystemExit(f"[code-db] {path} has schema {meta.get('schema_version')}, expected {SCHEMA_VERSION}")
+        self.project_root = meta.get("project_root", "")
+        self._file_ids: Dict[str, Optional[int]] = {}
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def file_id(self, rel: str) -> Optional[int]:
+        if rel not in self._file_ids:
+            row = self._conn.execute("SELECT id FROM files WHERE path = ?", (rel,)).fetchone()
+            self._file_ids[rel] = row[0] if row else None
+        return self._file_ids[rel]
+
+    def files(self) -> List[str]:
+        return [path for (path,) in self._conn.execute("SELECT path FROM files ORDER BY id")]
+
+    def first_file(self, paths: Sequence[str]) -> Optional[str]:
+        """The earliest file (in code DB order) whose path is exactly one of paths."""
+        if not paths:
+            return None
+        row = self._conn.execute(
+            f"SELECT path FROM files WHERE path IN ({', '.join('?' * len(paths))}) ORDER BY id LIMIT 1", list(paths)
+        ).fetchone()
+        return row[0] if row else None
+
+    def functions(self, rel: str) -> List[Function]:
+        """Functions of a file in code DB order."""
+        file_id = self.file_id(rel)
+        if file_id is None:
+            return []
+        cursor = self._conn.execute(
+            "SELECT name, start_line, end_line FROM functions WHERE file_id = ? ORDER BY id", (file_id,)
+        )
+        return [{"name": name, "start_line": start, "end_line": end} for name, start, end in cursor]
+
+    def functions_overlapping(self, rel: str, first_line: int, last_line: int) -> List[Function]:
+        """Functions of a file whose range intersects [first_line, last_line], by (start_line, end_line)."""
+        file_id = self.file_id(rel)
+        if file_id is None:
+            return []
+        cursor = self._conn.execute(
+            "SELECT name, start_line, end_line FROM functions"
+            " WHERE file_id = ? AND start_line <= ? AND end_line >= ?"
+            " ORDER BY start_line, end_line, id",
+            (file_id, last_line, first_line),
+        )
+        return [{"name": name, "start_line": start, "end_line": end} for name, start, end in cursor]
+
+    def enclosing(self, rel: str, line: int) -> Optional[Function]:
+        """The innermost function of a file containing line (latest start, then latest end)."""
+        file_id = self.file_id(rel)
+        if file_id is None:
+            return None
+        row = self._conn.execute(
+            "SELECT name, start_line, end_line FROM functions"
+            " WHERE file_id = ? AND start_line <= ? AND end_line >= ?"
+            " ORDER BY start_line DESC, end_line DESC, id DESC LIMIT 1",
+            (file_id, line, line),
+        ).fetchone()
+        if row is None:
+            return None
+        return {"name": row[0], "start_line": row[1], "end_line": row[2]}
+
+    def iter_files(self) -> Iterator[Dict[str, object]]:
+        """Yield {"path", "functions"} per file in code DB order, one file at a time."""
+        cursor = self._conn.execute(
+            "SELECT files.path, functions.id, functions.name, functions.start_line, functions.end_line"
+            " FROM files LEFT JOIN functions ON functions.file_id = files.id"
+            " ORDER BY files.id, functions.id"
+        )
+        current: Optional[Dict[str, object]] = None
+        for path, function_id, name, start, end in cursor:
+            if current is None or current["path"] != path:
+                if current is not None:
+                    yield current
+                current = {"path": path, "functions": []}
+            if function_id is not None:
+                current["functions"].append({"name": name, "start_line": start, "end_line": end})  # type: ignore[attr-defined]
+        if current is not None:
+            yield current
+
+    def to_json(self) -> Dict[str, object]:
+        """The whole database in code_db.json form."""
+        return {"project_root": self.project_root, "files": list(self.iter_files())}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert between code_db.json and the SQLite code DB store.")
+    parser.add_argument("command", choices=["import", "export"], help="import JSON into a store, or export a store")
+    parser.add_argument("source", type=Path)
+    parser.add_argument("dest", type=Path)
+    args = parser.parse_args()
+    if not args.source.exists():
+        raise SystemExit(f"[code-db] Not found: {args.source}")
+    if args.command == "import":
+        from build_code_db import iter_db_file
+
+        # NDJSON sources are inserted one file record at a time.
+        project_root, records = iter_db_file(args.source)
+        write_store({"project_root": project_root, "files": records}, args.dest)
+    else:
+        store = CodeDbStore(args.source)
+        tmp_path = args.dest.with_name(args.dest.name + ".tmp")
+        tmp_path.write_text(json.dumps(store.to_json(), indent=2) + "\n")
+        os.replace(tmp_path, args.dest)
+        store.close()
+    print(f"[code-db] Wrote {args.dest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,114 +5,426 @@ Heuristic static analyzer for the ossfuzz-target project.
 Reads the code database JSON (generated by start.py / code-db-builder) and scans
 functions for common vulnerability patterns, emitting findings as JSON.
 
+Checks are declared as Rule objects in RULES. A RuleEngine compiles all of
+their patterns once into a single matcher, runs it in one pass over each
+function body and hands every rule its own matches. Per-rule hit counts and
+timings are kept on the engine (print them with --rule-stats).
+
+With --workers N the files in the code DB are sharded across N worker
+processes (--chunk-size files per task); each file is read once by the worker
+that owns it and findings are merged back in code DB order, so the output is
+identical to a serial run.
+
+The code DB may also be given as its NDJSON form or its SQLite store
+(code-db-builder/code_db_store.py); files are then read one record at a time
+instead of parsing the whole JSON document.
+
 Usage:
-  python3 code-ql/analyze.py [code-db-json] [output-json]
+  python3 code-ql/analyze.py [code-db-json] [output-json] [--rule-stats]
+                             [--workers N] [--chunk-size N]
 
 Defaults:
   code-db-json: ./code-db-builder/code_db.json
   output-json:  ./code-ql/findings.json
 """
 
+import argparse
 import json
+import os
 import re
 import sys
+import time
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
-from typing import Dict, List
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Match, Optional, Tuple
 
 ROOT = Path(__file__).resolve().parent.parent
 DEFAULT_DB = ROOT / "code-db-builder" / "code_db.json"
 DEFAULT_OUT = ROOT / "code-ql" / "findings.json"
+sys.path.insert(0, str(ROOT / "code-db-builder"))
+
+from build_code_db import iter_db_file, read_db_header  # noqa: E402
+from code_db_store import CodeDbStore, is_store  # noqa: E402
+
+# Files per worker task when the file count is not known up front (streamed code DB).
+STREAM_CHUNK_SIZE = 64
+
+
+def _iter_store(store: CodeDbStore) -> Iterator[Dict]:
+    try:
+        yield from store.iter_files()
+    finally:
+        store.close()
 
 
 def load_code_db(db_path: Path) -> Dict:
+    """
+    The code DB as {"project_root", "files"}. For an NDJSON code DB or an SQLite
+    store "files" is an iterator that reads one file record at a time.
+    """
     if not db_path.exists():
         raise SystemExit(f"[analyze] Code DB not found: {db_path}. Run start.py first.")
+    if is_store(db_path):
+        store = CodeDbStore(db_path)
+        return {"project_root": store.project_root, "files": _iter_store(store)}
+    if read_db_header(db_path) is not None:
+        project_root, records = iter_db_file(db_path)
+        return {"project_root": project_root, "files": records}
     return json.loads(db_path.read_text())
 
 
-def detect_issues(lines: List[str]) -> List[Dict[str, str]]:
-    issues: List[Dict[str, str]] = []
-    joined = "\n".join(lines)
+class Snippet:
+    """A function body being analyzed: its lines, joined text and an offset-to-line map."""
 
-    # Unsafe copy operations.
-    if re.search(r"\b(memcpy|strcpy|strcat|sprintf)\s*\(", joined):
-        issues.append({"type": "unsafe_copy", "detail": "Uses memcpy/strcpy/strcat/sprintf without bounds checks"})
+    def __init__(self, lines: List[str]) -> None:
+        self.lines = lines
+        self.text = "\n".join(lines)
+        self._line_starts: Optional[List[int]] = None
 
-    # Format string risk: printf-like without string literal.
-    for line in lines:
-        if "printf(" in line:
-            if not re.search(r"printf\s*\(\s*\"", line):
-                issues.append({"type": "format_string", "detail": f"printf without literal format: {line.strip()}"})
-                break
+    def line_of(self, offset: int) -> int:
+        """Index into self.lines of the line containing a character offset of self.text."""
+        if self._line_starts is None:
+            starts = [0]
+            for line in self.lines[:-1]:
+                starts.append(starts[-1] + len(line) + 1)
+            self._line_starts = starts
+        return bisect_right(self._line_starts, offset) - 1
 
-    # Suspicious allocation math.
-    if re.search(r"malloc\s*\([^)]*-\s*[^)]+\)", joined):
-        issues.append({"type": "allocation_math", "detail": "malloc size uses subtraction; potential under-allocation"})
 
-    # Double free / UAF hints.
-    frees = re.findall(r"free\s*\(\s*([A-Za-z_][A-Za-z0-9_]*)\s*\)", joined)
-    if len(frees) > 1:
-        issues.append({"type": "double_free", "detail": f"Multiple frees detected: {', '.join(frees)}"})
-    if frees:
-        first_free = frees[0]
-        # Check for use after free by looking for identifier use after the first free.
-        seen_free = False
-        for line in lines:
-            if re.search(rf"free\s*\(\s*{re.escape(first_free)}\s*\)", line):
-                seen_free = True
+Issue = Dict[str, str]
+
+
+class Rule:
+    """
+    A heuristic check.
+
+    `pattern` is contributed to the engine's combined matcher (named groups
+    must be unique across rules); `evaluate` receives every match of that
+    pattern in a snippet, in order, and returns the issues to report.
+    `first_chars` lists the characters a match can start with; when every
+    rule provides it the engine skips all other positions cheaply.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        pattern: str,
+        evaluate: Callable[[List[Match[str]], Snippet], List[Issue]],
+        first_chars: str = "",
+    ) -> None:
+        self.name = name
+        self.pattern = pattern
+        self.evaluate = evaluate
+        self.first_chars = first_chars
+
+
+class RuleEngine:
+    """Runs a set of rules with one combined regex pass per snippet and keeps per-rule stats."""
+
+    def __init__(self, rules: Iterable[Rule]) -> None:
+        self.rules = list(rules)
+        # Each rule sits in a zero-width lookahead so rules never consume text that
+        # another rule also needs to see (e.g. "sprintf(" is both a copy and a printf).
+        combined = "|".join(f"(?=(?P<_rule{i}>{rule.pattern}))" for i, rule in enumerate(self.rules))
+        if self.rules and all(rule.first_chars for rule in self.rules):
+            first = "".join(sorted(set("".join(rule.first_chars for rule in self.rules))))
+            combined = f"(?=[{re.escape(first)}])(?:{combined})"
+        self._matcher = re.compile(combined)
+        self._group_to_rule = {f"_rule{i}": i for i in range(len(self.rules))}
+        # The alternation only reports the first rule that matches at a position, so
+        # after a hit the later rules that could start there are tried on their own.
+        self._patterns = [re.compile(rule.pattern) for rule in self.rules]
+        self._shared_starts = [
+            [j for j in range(i + 1, len(self.rules)) if self._may_share_start(rule, self.rules[j])]
+            for i, rule in enumerate(self.rules)
+        ]
+        self.reset_stats()
+
+    @staticmethod
+    def _may_share_start(first: Rule, second: Rule) -> bool:
+        if not first.first_chars or not second.first_chars:
+            return True
+        return bool(set(first.first_chars) & set(second.first_chars))
+
+    def reset_stats(self) -> None:
+        self.stats: Dict[str, Dict[str, float]] = {
+            rule.name: {"hits": 0, "issues": 0, "seconds": 0.0} for rule in self.rules
+        }
+        self.scan_seconds = 0.0
+        self.snippets = 0
+
+    def detect(self, lines: List[str]) -> List[Issue]:
+        snippet = Snippet(lines)
+        hits: List[List[Match[str]]] = [[] for _ in self.rules]
+        group_to_rule = self._group_to_rule
+        patterns = self._patterns
+        shared_starts = self._shared_starts
+        text = snippet.text
+        started = time.perf_counter()
+        for match in self._matcher.finditer(text):
+            index = group_to_rule[match.lastgroup]
+            hits[index].append(match)
+            for other in shared_starts[index]:
+                other_match = patterns[other].match(text, match.start())
+                if other_match:
+                    hits[other].append(other_match)
+        self.scan_seconds += time.perf_counter() - started
+        self.snippets += 1
+
+        issues: List[Issue] = []
+        for rule, rule_hits in zip(self.rules, hits):
+            stats = self.stats[rule.name]
+            stats["hits"] += len(rule_hits)
+            if not rule_hits:
                 continue
-            if seen_free and re.search(rf"\b{re.escape(first_free)}\b", line):
-                issues.append({"type": "use_after_free", "detail": f"Use of '{first_free}' after free"})
-                break
+            started = time.perf_counter()
+            found = rule.evaluate(rule_hits, snippet)
+            stats["seconds"] += time.perf_counter() - started
+            stats["issues"] += len(found)
+            issues.extend(found)
+        return issues
+
+    def export_stats(self) -> Dict[str, object]:
+        """Picklable snapshot of the counters, for shipping out of a worker process."""
+        return {
+            "rules": {name: dict(stats) for name, stats in self.stats.items()},
+            "scan_seconds": self.scan_seconds,
+            "snippets": self.snippets,
+        }
+
+    def merge_stats(self, exported: Dict[str, object]) -> None:
+        """Add counters produced by export_stats() (typically in a worker) to this engine."""
+        for name, stats in exported["rules"].items():
+            totals = self.stats.setdefault(name, {"hits": 0, "issues": 0, "seconds": 0.0})
+            for key, value in stats.items():
+                totals[key] = totals.get(key, 0) + value
+        self.scan_seconds += exported["scan_seconds"]
+        self.snippets += exported["snippets"]
+
+    def format_stats(self) -> str:
+        rows = [f"[analyze] combined scan: {self.snippets} snippets in {self.scan_seconds * 1000:.1f} ms"]
+        ranked = sorted(self.stats.items(), key=lambda item: item[1]["seconds"], reverse=True)
+        for name, stats in ranked:
+            rows.append(
+                f"[analyze] rule {name}: hits={int(stats['hits'])} issues={int(stats['issues'])} "
+                f"time={stats['seconds'] * 1000:.1f} ms"
+            )
+        return "\n".join(rows)
+
+
+@lru_cache(maxsize=1024)
+def identifier_pattern(name: str) -> "re.Pattern[str]":
+    return re.compile(rf"\b{re.escape(name)}\b")
+
+
+def _unsafe_copy(hits: List[Match[str]], snippet: Snippet) -> List[Issue]:
+    return [{"type": "unsafe_copy", "detail": "Uses memcpy/strcpy/strcat/sprintf without bounds checks"}]
 
+
+def _format_string(hits: List[Match[str]], snippet: Snippet) -> List[Issue]:
+    # A line is risky if it calls printf( and none of its printf calls starts with a literal
+    # on that same line (the pattern does not cross newlines, so printf(\n"fmt") is risky).
+    calls: Dict[int, bool] = {}
+    literal_lines = set()
+    for match in hits:
+        line_no = snippet.line_of(match.start())
+        if match.group("_printf_literal"):
+            literal_lines.add(line_no)
+        if match.group("_printf").startswith("printf("):
+            calls.setdefault(line_no, True)
+    for line_no in sorted(calls):
+        if line_no not in literal_lines:
+            line = snippet.lines[line_no]
+            return [{"type": "format_string", "detail": f"printf without literal format: {line.strip()}"}]
+    return []
+
+
+def _allocation_math(hits: List[Match[str]], snippet: Snippet) -> List[Issue]:
+    return [{"type": "allocation_math", "detail": "malloc size uses subtraction; potential under-allocation"}]
+
+
+def _temporal(hits: List[Match[str]], snippet: Snippet) -> List[Issue]:
+    issues: List[Issue] = []
+    frees = [match.group("_freed") for match in hits]
+    if len(frees) > 1:
+        issues.append({"type": "double_free", "detail": f"Multiple frees detected: {', '.join(frees)}"})
+    first_free = frees[0]
+    # Only a free(ptr) written on one line counts as the free; lines that free the
+    # same pointer again are not uses.
+    line_frees = [
+        match for match in hits if match.group("_freed") == first_free and "\n" not in match.group("_free")
+    ]
+    if not line_frees:
+        return issues
+    free_lines = {snippet.line_of(match.start()) for match in line_frees}
+    first_line = min(free_lines)
+    next_line_start = snippet.text.find("\n", line_frees[0].start())
+    if next_line_start < 0:
+        return issues
+    for use in identifier_pattern(first_free).finditer(snippet.text, next_line_start):
+        line_no = snippet.line_of(use.start())
+        if line_no > first_line and line_no not in free_lines:
+            issues.append({"type": "use_after_free", "detail": f"Use of '{first_free}' after free"})
+            break
     return issues
 
 
-def analyze(db: Dict, root: Path) -> List[Dict[str, object]]:
-    findings: List[Dict[str, object]] = []
-    for file_entry in db.get("files", []):
-        rel_path = file_entry.get("path")
-        if not rel_path:
-            continue
-        abs_path = root / rel_path
-        if not abs_path.exists():
+RULES: List[Rule] = [
+    Rule("unsafe_copy", r"\b(?:memcpy|strcpy|strcat|sprintf)\s*\(", _unsafe_copy, first_chars="ms"),
+    Rule(
+        "format_string",
+        r"(?P<_printf>printf[^\S\n]*\([^\S\n]*(?P<_printf_literal>\")?)",
+        _format_string,
+        first_chars="p",
+    ),
+    Rule("allocation_math", r"malloc\s*\([^)]*-\s*[^)]+\)", _allocation_math, first_chars="m"),
+    Rule(
+        "temporal",
+        r"(?P<_free>free\s*\(\s*(?P<_freed>[A-Za-z_][A-Za-z0-9_]*)\s*\))",
+        _temporal,
+        first_chars="f",
+    ),
+]
+DEFAULT_ENGINE = RuleEngine(RULES)
+
+
+def detect_issues(lines: List[str], engine: Optional[RuleEngine] = None) -> List[Issue]:
+    return (engine or DEFAULT_ENGINE).detect(lines)
+
+
+Finding = Dict[str, object]
+
+
+def analyze_file(file_entry: Dict, root: Path, engine: Optional[RuleEngine] = None) -> List[Finding]:
+    """Scan every function of one code DB file entry; the source file is read once."""
+    findings: List[Finding] = []
+    rel_path = file_entry.get("path")
+    if not rel_path:
+        return findings
+    abs_path = root / rel_path
+    if not abs_path.exists():
+        return findings
+    file_lines = abs_path.read_text().splitlines()
+    for func in file_entry.get("functions", []):
+        start = func.get("start_line")
+        end = func.get("end_line")
+        name = func.get("name")
+        if not (name and isinstance(start, int) and isinstance(end, int) and start >= 1 and end >= start):
             continue
-        file_lines = abs_path.read_text().splitlines()
-        for func in file_entry.get("functions", []):
-            start = func.get("start_line")
-            end = func.get("end_line")
-            name = func.get("name")
-            if not (name and isinstance(start, int) and isinstance(end, int) and start >= 1 and end >= start):
-                continue
-            snippet = file_lines[start - 1 : end]
-            issues = detect_issues(snippet)
-            if issues:
-                findings.append(
-                    {
-                        "file": str(rel_path),
-                        "function": name,
-                        "start_line": start,
-                        "end_line": end,
-                        "issues": issues,
-                    }
-                )
+        snippet = file_lines[start - 1 : end]
+        issues = detect_issues(snippet, engine)
+        if issues:
+            findings.append(
+                {
+                    "file": str(rel_path),
+                    "function": name,
+                    "start_line": start,
+                    "end_line": end,
+                    "issues": issues,
+                }
+            )
+    return findings
+
+
+# Per-process engine used by pool workers; built once by _init_worker.
+_WORKER_ENGINE: Optional[RuleEngine] = None
+
+
+def _init_worker(rules: List[Rule]) -> None:
+    global _WORKER_ENGINE
+    _WORKER_ENGINE = RuleEngine(rules)
+
+
+def _analyze_chunk(task: Tuple[List[Dict], Path]) -> Tuple[List[Finding], Dict[str, object]]:
+    entries, root = task
+    engine = _WORKER_ENGINE
+    # Stats are returned per chunk, so only count this chunk's work.
+    engine.reset_stats()
+    findings = [finding for entry in entries for finding in analyze_file(entry, root, engine)]
+    return findings, engine.export_stats()
+
+
+def analyze(
+    db: Dict,
+    root: Path,
+    engine: Optional[RuleEngine] = None,
+    workers: int = 1,
+    chunk_size: int = 0,
+) -> List[Finding]:
+    """
+    Scan all functions in the code DB and return findings in code DB order.
+
+    With workers != 1 (0 = one per CPU) files are sharded across a process pool
+    in tasks of `chunk_size` files (0 = pick automatically); per-rule stats from
+    the workers are merged into `engine`.
+    """
+    engine = engine or DEFAULT_ENGINE
+    files = db.get("files", [])
+    entries: Iterable[Dict] = (entry for entry in files if entry.get("path"))
+    # A list is sized up front; a streamed code DB ("files" is an iterator) is consumed lazily.
+    count: Optional[int] = None
+    if isinstance(files, list):
+        entries = list(entries)
+        count = len(entries)
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    if workers == 1 or (count is not None and count < 2):
+        return [finding for entry in entries for finding in analyze_file(entry, root, engine)]
+
+    if count is not None:
+        workers = min(workers, count)
+    if chunk_size <= 0:
+        # A few tasks per worker balances uneven file sizes without much IPC overhead.
+        chunk_size = max(1, count // (workers * 4)) if count is not None else STREAM_CHUNK_SIZE
+    findings: List[Finding] = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(engine.rules,)) as pool:
+        # Results are taken in task order, which keeps the output deterministic; only a
+        # couple of tasks per worker are in flight, so a streamed DB is never held whole.
+        pending: Deque["Future[Tuple[List[Finding], Dict[str, object]]]"] = deque()
+        remaining = iter(entries)
+        for chunk in iter(lambda: list(islice(remaining, chunk_size)), []):
+            pending.append(pool.submit(_analyze_chunk, (chunk, root)))
+            while pending and (len(pending) >= 2 * workers or pending[0].done()):
+                chunk_findings, stats = pending.popleft().result()
+                findings.extend(chunk_findings)
+                engine.merge_stats(stats)
+        for future in pending:
+            chunk_findings, stats = future.result()
+            findings.extend(chunk_findings)
+            engine.merge_stats(stats)
     return findings
 
 
 def main() -> None:
-    args = sys.argv[1:]
-    db_path = Path(args[0]) if len(args) >= 1 else DEFAULT_DB
-    out_path = Path(args[1]) if len(args) >= 2 else DEFAULT_OUT
+    parser = argparse.ArgumentParser(description="Heuristic vulnerability scan over the code DB.")
+    parser.add_argument("code_db", nargs="?", type=Path, default=DEFAULT_DB, help="code DB JSON, NDJSON or SQLite store")
+    parser.add_argument("output", nargs="?", type=Path, default=DEFAULT_OUT, help="findings JSON")
+    parser.add_argument("--rule-stats", action="store_true", help="print per-rule hits and timings to stderr")
+    parser.add_argument(
+        "-w", "--workers", type=int, default=1, help="worker processes (0 = one per CPU, default: 1)"
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=0, help="files per worker task (default: chosen from file count)"
+    )
+    args = parser.parse_args()
+    db_path = args.code_db
+    out_path = args.output
 
     db = load_code_db(db_path)
     root = Path(db.get("project_root", ROOT))
-    findings = analyze(db, root)
+    findings = analyze(db, root, workers=args.workers, chunk_size=args.chunk_size)
 
     out_path.parent.mkdir(parents=True, exist_ok=True)
     out_path.write_text(json.dumps(findings, indent=2) + "\n")
     print(f"[analyze] Wrote findings to {out_path}")
     json.dump(findings, sys.stdout, indent=2)
     sys.stdout.write("\n")
+    if args.rule_stats:
+        sys.stderr.write(DEFAULT_ENGINE.format_stats() + "\n")
 
 
 if __name__ == "__main__":
@@ -9,6 +9,13 @@ set -euo pipefail
 #   DB_DIR       - CodeQL database directory (default: code-ql/db)
 #   RESULTS      - SARIF output path (default: code-ql/findings.sarif)
 #   QUERY_SUITE  - CodeQL suite/queries to run (default: /workspace/code-ql/queries)
+#   CACHE_DIR    - cached SARIF results (default: code-ql/cache)
+#   CODEQL_FORCE - set to 1 to ignore the cached database and SARIF
+#
+# The database is reused while a key over the target sources, the build wrapper
+# and the CodeQL version matches the stamp stored in ${DB_DIR}.key. SARIF is
+# cached per (source key, query key), so an unchanged target skips CodeQL
+# entirely and a query-only change just re-runs `database analyze`.
 #
 # Example:
 #   bash code-ql/run_codeql.sh
@@ -19,6 +26,10 @@ CODEQL_BIN="${CODEQL_BIN:-codeql}"
 TARGET="${TARGET:-${ROOT}/ossfuzz-target}"
 DB_DIR="${DB_DIR:-${ROOT}/code-ql/db}"
 RESULTS="${RESULTS:-${ROOT}/code-ql/findings.sarif}"
+CACHE_DIR="${CACHE_DIR:-${ROOT}/code-ql/cache}"
+CODEQL_FORCE="${CODEQL_FORCE:-0}"
+# Number of cached SARIF files to keep.
+CACHE_KEEP="${CACHE_KEEP:-10}"
 # Default to custom queries bundled in this repo; override to run other suites.
 QUERY_SUITE="${QUERY_SUITE:-/workspace/code-ql/queries}"
 # Include both the CLI bundles and the downloaded packs.
@@ -34,16 +45,24 @@ if [ ! -d "${TARGET}" ]; then
   exit 1
 fi
 
-if [ -d "${DB_DIR}" ]; then
-  echo "[codeql] Removing existing database at ${DB_DIR}"
-  rm -rf "${DB_DIR}"
-fi
+# Hash the files under a directory whose names match the given find expression.
+# Paths are hashed relative to the directory so moving a checkout keeps its key.
+hash_tree() {
+  local dir="$1"
+  shift
+  (
+    cd "${dir}"
+    find . -path ./out -prune -o -type f \( "$@" \) -print0 \
+      | LC_ALL=C sort -z \
+      | xargs -0 -r sha256sum
+  ) | sha256sum | cut -d' ' -f1
+}
 
-mkdir -p "${DB_DIR}"
 mkdir -p "$(dirname "${RESULTS}")"
 
 # Generate a small build wrapper to avoid quoting issues in --command.
 BUILD_WRAPPER="$(mktemp)"
+trap 'rm -f "${BUILD_WRAPPER}"' EXIT
 cat > "${BUILD_WRAPPER}" <<'EOF'
 #!/usr/bin/env bash
 set -euo pipefail
@@ -53,11 +72,56 @@ CC=clang CXX=clang++ OUT=out LIB_FUZZING_ENGINE="-fsanitize=fuzzer" CFLAGS=-g CX
 EOF
 chmod +x "${BUILD_WRAPPER}"
 
-echo "[codeql] Creating database at ${DB_DIR} ..."
-"${CODEQL_BIN}" database create "${DB_DIR}" \
-  --language=cpp \
-  --source-root "${TARGET}" \
-  --command "${BUILD_WRAPPER}"
+CODEQL_VERSION="$("${CODEQL_BIN}" version --format=terse)"
+
+# Source key: target sources and build files, the build wrapper and the CLI version.
+SRC_KEY="$(
+  {
+    hash_tree "${TARGET}" -name '*.c' -o -name '*.cc' -o -name '*.cpp' -o -name '*.cxx' \
+      -o -name '*.h' -o -name '*.hh' -o -name '*.hpp' -o -name '*.hxx' -o -name '*.inc' \
+      -o -name 'build.sh' -o -name 'Makefile*' -o -name '*.mk' -o -name 'CMakeLists.txt' -o -name '*.cmake'
+    sha256sum < "${BUILD_WRAPPER}"
+    echo "${CODEQL_VERSION}"
+  } | sha256sum | cut -d' ' -f1
+)"
+
+# Query key: the query pack contents (or the suite name for packs outside the tree).
+if [ -d "${QUERY_SUITE}" ]; then
+  QUERY_KEY="$(hash_tree "${QUERY_SUITE}" -name '*.ql' -o -name '*.qll' -o -name '*.qls' -o -name '*.yml')"
+else
+  QUERY_KEY="$(echo "${QUERY_SUITE}" | sha256sum | cut -d' ' -f1)"
+fi
+QUERY_KEY="$(printf '%s\n%s\n' "${QUERY_KEY}" "${CODEQL_VERSION}" | sha256sum | cut -d' ' -f1)"
+
+DB_STAMP="${DB_DIR}.key"
+CACHED_SARIF="${CACHE_DIR}/sarif-${SRC_KEY:0:16}-${QUERY_KEY:0:16}.sarif"
+
+if [ "${CODEQL_FORCE}" != "1" ] && [ -f "${CACHED_SARIF}" ]; then
+  cp "${CACHED_SARIF}" "${RESULTS}"
+  echo "[codeql] Sources and queries unchanged; reused cached SARIF ${CACHED_SARIF}"
+  echo "[codeql] Analysis complete. SARIF written to ${RESULTS}"
+  exit 0
+fi
+
+if [ "${CODEQL_FORCE}" != "1" ] && [ -f "${DB_DIR}/codeql-database.yml" ] && [ -f "${DB_STAMP}" ] \
+  && [ "$(cat "${DB_STAMP}")" = "${SRC_KEY}" ]; then
+  echo "[codeql] Sources unchanged; reusing database at ${DB_DIR}"
+else
+  if [ -d "${DB_DIR}" ]; then
+    echo "[codeql] Removing existing database at ${DB_DIR}"
+    rm -rf "${DB_DIR}"
+  fi
+  # Drop the stamp first so an interrupted create is never mistaken for a valid DB.
+  rm -f "${DB_STAMP}"
+  mkdir -p "${DB_DIR}"
+
+  echo "[codeql] Creating database at ${DB_DIR} ..."
+  "${CODEQL_BIN}" database create "${DB_DIR}" \
+    --language=cpp \
+    --source-root "${TARGET}" \
+    --command "${BUILD_WRAPPER}"
+  echo "${SRC_KEY}" > "${DB_STAMP}"
+fi
 
 # Ensure query dependencies are installed/resolved before analysis.
 "${CODEQL_BIN}" pack install "${QUERY_SUITE}" --search-path "${SEARCH_PATH}"
@@ -70,4 +134,10 @@ echo "[codeql] Analyzing with suite ${QUERY_SUITE} ..."
   --output "${RESULTS}" \
   --threads=0
 
+mkdir -p "${CACHE_DIR}"
+cp "${RESULTS}" "${CACHED_SARIF}.tmp"
+mv "${CACHED_SARIF}.tmp" "${CACHED_SARIF}"
+# Keep only the most recent SARIF results.
+ls -1t "${CACHE_DIR}"/sarif-*.sarif 2>/dev/null | tail -n +"$((CACHE_KEEP + 1))" | xargs -r rm -f
+
 echo "[codeql] Analysis complete. SARIF written to ${RESULTS}"
@@ -0,0 +1,65 @@
+#!/usr/bin/env bash
+# AFL++ campaign settings from config.yml, resolved once per campaign.
+#
+# Sourced by run_afl.sh and run_afl_all.sh; run directly it prints the settings
+# as KEY=value lines (start.py --pipelined reads them that way). Variables that
+# are already set in the environment win over config.yml. Everything is read in
+# a single python3 call and exported with AFL_CONFIG_RESOLVED=1, so the
+# per-harness run_afl.sh started by a campaign inherits the values instead of
+# parsing config.yml again.
+#
+#   AFL_TIME_LIMIT - afl_time_limit, afl-fuzz -V seconds (default: 60)
+#   AFL_SEEDS_DIR  - seeds_dir as an absolute path (default: fuzzer/user_seeds)
+#   AFL_JOBS       - afl_jobs, max concurrent harnesses (default: 0 = one per CPU)
+#   AFL_RESUME     - afl_resume as 0/1 (default: 0)
+#   AFL_BUDGET     - afl_budget, fixed or bandit (default: fixed)
+#   AFL_POOL       - afl_pool as 0/1: fuzz in warm worker containers (afl_pool.sh)
+#                    instead of one docker run per harness (default: 1)
+
+AFL_CONFIG_ROOT="$(cd "$(dirname "${BASH_SOURCE[0]}")/../.." && pwd)"
+
+if [ "${AFL_CONFIG_RESOLVED:-0}" != "1" ]; then
+  eval "$(
+ROOT_ENV="${AFL_CONFIG_ROOT}" CONFIG_ENV="${CONFIG_PATH:-${AFL_CONFIG_ROOT}/config.yml}" python3 - <<'PY'
+import os, re, shlex
+root = os.environ["ROOT_ENV"]
+values = {}
+try:
+    with open(os.environ["CONFIG_ENV"], "r") as f:
+        for line in f:
+            m = re.match(r"\s*(\w+)\s*:\s*(.*?)\s*$", line)
+            if m and m.group(1) not in values:
+                values[m.group(1)] = m.group(2)
+except FileNotFoundError:
+    pass
+
+def leading(pattern, raw, default):
+    m = re.match(pattern, raw or "")
+    return m.group(0) if m else default
+
+def flag(raw, default):
+    word = leading(r"\S+", raw, "")
+    return ("1" if word.lower() in ("1", "true", "yes", "on") else "0") if word else default
+
+seeds = values.get("seeds_dir") or os.path.join("fuzzer", "user_seeds")
+settings = {
+    "AFL_TIME_LIMIT": leading(r"\d+", values.get("afl_time_limit"), "60"),
+    "AFL_SEEDS_DIR": os.path.abspath(os.path.join(root, seeds)),
+    "AFL_JOBS": leading(r"\d+", values.get("afl_jobs"), "0"),
+    "AFL_RESUME": flag(values.get("afl_resume"), "0"),
+    "AFL_BUDGET": leading(r"\w+", values.get("afl_budget"), "fixed").lower(),
+    "AFL_POOL": flag(values.get("afl_pool"), "1"),
+}
+for key, value in settings.items():
+    print(f"{key}=${{{key}:-{shlex.quote(value)}}}")
+PY
+)"
+  export AFL_TIME_LIMIT AFL_SEEDS_DIR AFL_JOBS AFL_RESUME AFL_BUDGET AFL_POOL
+  export AFL_CONFIG_RESOLVED=1
+fi
+
+if [ "${BASH_SOURCE[0]}" = "$0" ]; then
+  for key in AFL_TIME_LIMIT AFL_SEEDS_DIR AFL_JOBS AFL_RESUME AFL_BUDGET AFL_POOL; do
+    printf '%s=%s\n' "${key}" "${!key}"
+  done
+fi
@@ -0,0 +1,99 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+# Warm AFL++ worker containers that run build and fuzz jobs via docker exec.
+#
+# Usage:
+#   afl_pool.sh start WORKER [CPU]        start a worker (pinned to CPU if given)
+#   afl_pool.sh exec WORKER JOB CMD...    run CMD in WORKER as job JOB and wait for it
+#   afl_pool.sh running WORKER JOB        exit 0 while job JOB is running in WORKER
+#   afl_pool.sh kill WORKER JOB [SIGNAL]  signal job JOB (default TERM)
+#   afl_pool.sh stop WORKER...            remove workers
+#
+# A worker is a long-lived container of the AFL++ image (same mounts, user and
+# working directory as the per-harness `docker run` in run_afl.sh) that only
+# idles, so running a harness there skips container start-up and tear-down.
+# run_afl_all.sh and start.py --pipelined start one worker per slot and pass
+# it to run_afl.sh as AFL_WORKER.
+#
+# A job runs in its own session inside the worker and records its pid in
+# /tmp/mini-crs-jobs/JOB.pid there; run_afl.sh execs afl-fuzz, so the pid stays
+# the fuzzer's. `kill` signals the job's process group, which is how
+# budget_scheduler.py stops a job early without stopping the worker. docker
+# exec does not forward signals, so `exec` relays SIGTERM/SIGINT to the job
+# itself and waits until it has shut down.
+#
+# Environment overrides:
+#   AFL_IMAGE - image for the workers (default: mini-crs-afl)
+
+if [[ $# -lt 2 ]]; then
+  echo "Usage: $0 start|exec|running|kill|stop WORKER ..." >&2
+  exit 1
+fi
+
+ROOT="$(cd "$(dirname "${BASH_SOURCE[0]}")/../.." && pwd)"
+IMAGE="${AFL_IMAGE:-mini-crs-afl}"
+JOB_DIR="/tmp/mini-crs-jobs"
+COMMAND="$1"
+WORKER="$2"
+shift 2
+
+signal_job() {
+  docker exec "${WORKER}" sh -c \
+    'pid="$(cat "$1" 2>/dev/null)" && [ -n "${pid}" ] && kill -"$2" "-${pid}" 2>/dev/null' \
+    job "${JOB_DIR}/$1.pid" "$2"
+}
+
+case "${COMMAND}" in
+  start)
+    CPU="${1:-}"
+    CPU_ARGS=()
+    if [ -n "${CPU}" ]; then
+      CPU_ARGS+=(--cpuset-cpus "${CPU}")
+    fi
+    # --init reaps the orphans that finished jobs leave behind.
+    docker run -d --rm --init \
+      --name "${WORKER}" \
+      "${CPU_ARGS[@]}" \
+      -u "$(id -u):$(id -g)" \
+      -v "${ROOT}:/workspace" \
+      -w /workspace/fuzzer \
+      "${IMAGE}" \
+      sleep infinity > /dev/null
+    echo "[afl] Worker ${WORKER} started${CPU:+ on CPU ${CPU}}"
+    ;;
+  exec)
+    if [[ $# -lt 2 ]]; then
+      echo "Usage: $0 exec WORKER JOB CMD..." >&2
+      exit 1
+    fi
+    JOB="$1"
+    shift
+    docker exec "${WORKER}" setsid -w bash -c \
+      'mkdir -p "$(dirname "$1")" && echo $$ > "$1" && shift && exec "$@"' \
+      job "${JOB_DIR}/${JOB}.pid" "$@" &
+    client=$!
+    trap 'signal_job "${JOB}" TERM || true' TERM INT
+    while kill -0 "${client}" 2>/dev/null; do
+      wait "${client}" || true
+    done
+    status=0
+    wait "${client}" || status=$?
+    trap - TERM INT
+    docker exec "${WORKER}" rm -f "${JOB_DIR}/${JOB}.pid" || true
+    exit "${status}"
+    ;;
+  running)
+    signal_job "$1" 0
+    ;;
+  kill)
+    signal_job "$1" "${2:-TERM}"
+    ;;
+  stop)
+    docker rm -f "${WORKER}" "$@" > /dev/null 2>&1 || true
+    ;;
+  *)
+    echo "[afl] Unknown pool command: ${COMMAND}" >&2
+    exit 1
+    ;;
+esac
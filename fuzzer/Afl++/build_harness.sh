@@ -0,0 +1,98 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+# Usage: build_harness.sh path/to/harness.c
+# Compiles a harness against the shared instrumented target, reusing cached
+# builds. Runs inside the AFL++ docker image (run_afl.sh calls it there).
+#
+# The target shim (fuzzer/harnesses/target_shim.c, which includes the target
+# source) is compiled once into fuzzer/build/libtarget<variant>.a and every
+# harness links against it. The archive and each harness binary carry a key
+# over their sources and headers, the flags and the compiler; an artifact whose
+# key still matches is reused without recompiling.
+#
+# Environment overrides:
+#   CC       - compiler (default: afl-clang-fast)
+#   CFLAGS   - extra compile flags (default: none)
+#   VARIANT  - suffix for build products, e.g. _asan (default: none)
+
+if [[ $# -lt 1 ]]; then
+  echo "Usage: $0 path/to/harness.c" >&2
+  exit 1
+fi
+
+FUZZER_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
+ROOT="$(dirname "${FUZZER_DIR}")"
+HARNESS="$(cd "$(dirname "$1")" && pwd)/$(basename "$1")"
+CC="${CC:-afl-clang-fast}"
+CFLAGS="${CFLAGS:-}"
+VARIANT="${VARIANT:-}"
+BUILD_DIR="${FUZZER_DIR}/build"
+KEY_DIR="${BUILD_DIR}/.keys"
+SHIM="${FUZZER_DIR}/harnesses/target_shim.c"
+INCLUDE_DIR="${ROOT}/ossfuzz-target/include"
+
+if [ ! -f "${SHIM}" ]; then
+  echo "[build] Target shim not found: ${SHIM} (run fuzzer/generate_harnesses.py)" >&2
+  exit 1
+fi
+
+mkdir -p "${BUILD_DIR}" "${KEY_DIR}"
+cd "${FUZZER_DIR}"
+
+# Hash a source file and every non-system header it includes (as listed by -MM).
+source_key() {
+  "${CC}" ${CFLAGS} -I"${INCLUDE_DIR}" -MM "$1" \
+    | sed -e 's/^[^:]*://' -e 's/\\$//' \
+    | tr -s ' ' '\n' \
+    | sed '/^$/d' \
+    | LC_ALL=C sort -u \
+    | xargs sha256sum \
+    | sha256sum | cut -d' ' -f1
+}
+
+# Compiler identity, flags and the AFL++ settings that change instrumentation.
+TOOL_KEY="$(
+  {
+    "${CC}" --version 2>&1
+    sha256sum "$(command -v "${CC}")"
+    echo "${CFLAGS}"
+    env | grep -E '^AFL_(LLVM_|USE_|HARDEN|CC_COMPILER)' | LC_ALL=C sort || true
+  } | sha256sum | cut -d' ' -f1
+)"
+
+LIB="${BUILD_DIR}/libtarget${VARIANT}.a"
+LIB_KEY_FILE="${KEY_DIR}/libtarget${VARIANT}.key"
+LIB_KEY="$(printf '%s\n%s\n' "$(source_key "${SHIM}")" "${TOOL_KEY}" | sha256sum | cut -d' ' -f1)"
+
+# Concurrent harness runs share the archive, so only one of them builds it.
+(
+  flock 9
+  if [ -f "${LIB}" ] && [ "$(cat "${LIB_KEY_FILE}" 2>/dev/null)" = "${LIB_KEY}" ]; then
+    echo "[build] Reusing ${LIB}"
+  else
+    echo "[build] Compiling target shim -> ${LIB}"
+    obj="${BUILD_DIR}/target_shim${VARIANT}.$$.o"
+    "${CC}" ${CFLAGS} -I"${INCLUDE_DIR}" -c "${SHIM}" -o "${obj}"
+    rm -f "${LIB}.tmp"
+    ar rcs "${LIB}.tmp" "${obj}"
+    rm -f "${obj}"
+    mv "${LIB}.tmp" "${LIB}"
+    echo "${LIB_KEY}" > "${LIB_KEY_FILE}"
+  fi
+) 9> "${BUILD_DIR}/.lock"
+
+NAME="$(basename "${HARNESS}" .c)${VARIANT}"
+OUT="${BUILD_DIR}/${NAME}"
+KEY_FILE="${KEY_DIR}/${NAME}.key"
+KEY="$(printf '%s\n%s\n%s\n' "$(source_key "${HARNESS}")" "${TOOL_KEY}" "${LIB_KEY}" | sha256sum | cut -d' ' -f1)"
+
+if [ -x "${OUT}" ] && [ "$(cat "${KEY_FILE}" 2>/dev/null)" = "${KEY}" ]; then
+  echo "[build] Reusing ${OUT}"
+  exit 0
+fi
+
+echo "[build] Compiling ${HARNESS#${ROOT}/} -> ${OUT}"
+"${CC}" ${CFLAGS} -I"${INCLUDE_DIR}" "${HARNESS}" "${LIB}" -o "${OUT}.tmp.$$"
+mv "${OUT}.tmp.$$" "${OUT}"
+echo "${KEY}" > "${KEY_FILE}"
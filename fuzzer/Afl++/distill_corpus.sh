@@ -0,0 +1,78 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+# Usage: distill_corpus.sh path/to/harness-binary seeds_dir
+# Minimizes a seed set for one harness and prints the directory to pass to
+# afl-fuzz -i. Runs inside the AFL++ docker image (run_afl.sh calls it there).
+#
+# afl-cmin keeps the smallest set of seeds that still covers every edge the
+# full set reaches; with AFL_TMIN=1 each kept seed is then shrunk with afl-tmin
+# (in parallel). The result is cached in fuzzer/corpus/<harness> under a key
+# over the seed set, the harness binary and AFL_TMIN, so it is only redone when
+# the seeds or the binary change. If minimization fails the seeds are used as is.
+#
+# Environment overrides:
+#   AFL_TMIN      - set to 1 to also afl-tmin every kept seed (default: 0)
+#   DISTILL_JOBS  - parallel afl-cmin/afl-tmin tasks (default: nproc)
+
+if [[ $# -lt 2 ]]; then
+  echo "Usage: $0 path/to/harness-binary seeds_dir" >&2
+  exit 1
+fi
+
+BINARY="$1"
+SEEDS="$2"
+AFL_TMIN="${AFL_TMIN:-0}"
+DISTILL_JOBS="${DISTILL_JOBS:-$(nproc)}"
+FUZZER_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
+NAME="$(basename "${BINARY}")"
+CORPUS_DIR="${FUZZER_DIR}/corpus"
+OUT="${CORPUS_DIR}/${NAME}"
+KEY_FILE="${CORPUS_DIR}/${NAME}.key"
+
+mkdir -p "${CORPUS_DIR}"
+
+# Seed set hash: names and contents of the top-level seed files.
+SEEDS_KEY="$(
+  cd "${SEEDS}"
+  find . -maxdepth 1 -type f -print0 | LC_ALL=C sort -z | xargs -0 -r sha256sum | sha256sum | cut -d' ' -f1
+)"
+KEY="$(printf '%s\n%s\ntmin=%s\n' "${SEEDS_KEY}" "$(sha256sum < "${BINARY}" | cut -d' ' -f1)" "${AFL_TMIN}" \
+  | sha256sum | cut -d' ' -f1)"
+
+if [ -d "${OUT}" ] && [ "$(cat "${KEY_FILE}" 2>/dev/null)" = "${KEY}" ]; then
+  echo "[distill] Reusing ${OUT} ($(ls -1 "${OUT}" | wc -l) inputs)" >&2
+  echo "${OUT}"
+  exit 0
+fi
+
+WORK="$(mktemp -d "${CORPUS_DIR}/.${NAME}.XXXXXX")"
+trap 'rm -rf "${WORK}"' EXIT
+
+seed_count="$(find "${SEEDS}" -maxdepth 1 -type f | wc -l)"
+echo "[distill] Minimizing ${seed_count} seeds for ${NAME} ..." >&2
+if ! AFL_SKIP_CPUFREQ=1 afl-cmin -T "${DISTILL_JOBS}" -i "${SEEDS}" -o "${WORK}/cmin" -- "${BINARY}" >&2 \
+  || [ -z "$(ls -A "${WORK}/cmin" 2>/dev/null)" ]; then
+  echo "[distill] afl-cmin failed for ${NAME}; using the seeds unminimized" >&2
+  rm -rf "${WORK}/cmin"
+  mkdir -p "${WORK}/cmin"
+  find "${SEEDS}" -maxdepth 1 -type f -exec cp {} "${WORK}/cmin/" \;
+fi
+RESULT="${WORK}/cmin"
+
+if [ "${AFL_TMIN}" = "1" ]; then
+  mkdir -p "${WORK}/tmin"
+  # afl-tmin handles one input at a time; fan out over the kept seeds. An input
+  # tmin cannot process is kept as is.
+  find "${RESULT}" -maxdepth 1 -type f -printf '%f\0' \
+    | xargs -0 -r -P "${DISTILL_JOBS}" -I{} sh -c \
+      'AFL_SKIP_CPUFREQ=1 afl-tmin -i "$1/$3" -o "$2/$3" -- "$0" >/dev/null 2>&1 || cp "$1/$3" "$2/$3"' \
+      "${BINARY}" "${RESULT}" "${WORK}/tmin" {}
+  RESULT="${WORK}/tmin"
+fi
+
+rm -rf "${OUT}"
+mv "${RESULT}" "${OUT}"
+echo "${KEY}" > "${KEY_FILE}"
+echo "[distill] ${NAME}: kept $(ls -1 "${OUT}" | wc -l) of ${seed_count} seeds -> ${OUT}" >&2
+echo "${OUT}"
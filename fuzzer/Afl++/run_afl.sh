@@ -3,7 +3,26 @@ set -euo pipefail
 
 # Usage: run_afl.sh path/to/harness.c [output_dir]
 # Builds the given harness with afl-clang-fast inside the AFL++ docker image
-# and launches afl-fuzz. Requires the AFL++ image tag set by setup_afl_docker.sh.
+# (via build_harness.sh, which reuses cached builds) and launches afl-fuzz.
+# Requires the AFL++ image tag set by setup_afl_docker.sh.
+# Harnesses are persistent-mode and read test cases from shared memory, so no @@.
+#
+# Environment overrides:
+#   AFL_CPU    - pin the container and afl-fuzz to this CPU (set by run_afl_all.sh)
+#   AFL_NO_UI  - set to 1 to replace the status screen with periodic log lines
+#   AFL_RESUME - set to 1 to resume the campaign in output_dir (AFL_AUTORESUME),
+#                seeding new sessions from seeds_dir plus older runs' queues
+#                (default: config afl_resume)
+#   AFL_DISTILL - set to 0 to skip corpus distillation (distill_corpus.sh)
+#   AFL_TIME_LIMIT - afl-fuzz -V seconds (default: config afl_time_limit)
+#   AFL_SEEDS_DIR  - seed inputs (default: config seeds_dir)
+#   AFL_CONTAINER_NAME - docker container name, so the run can be stopped early
+#   AFL_WORKER  - run as a job in this warm worker container (afl_pool.sh)
+#                 instead of a fresh docker run; AFL_CONTAINER_NAME is then unused
+#                 and the CPU pinning of the worker applies
+#   AFL_TMIN    - set to 1 to also afl-tmin the distilled seeds
+# Settings not in the environment are read from config.yml by afl_config.sh;
+# run_afl_all.sh resolves them once and every run_afl.sh it starts inherits them.
 
 if [[ $# -lt 1 ]]; then
   echo "Usage: $0 path/to/harness.c [output_dir]" >&2
@@ -13,75 +32,114 @@ fi
 HARNESS="$1"
 OUTDIR="${2:-/workspace/fuzzer/out}"
 IMAGE="${AFL_IMAGE:-mini-crs-afl}"
+AFL_CPU="${AFL_CPU:-}"
+AFL_NO_UI="${AFL_NO_UI:-0}"
+AFL_DISTILL="${AFL_DISTILL:-1}"
+AFL_TMIN="${AFL_TMIN:-0}"
+AFL_CONTAINER_NAME="${AFL_CONTAINER_NAME:-}"
+AFL_WORKER="${AFL_WORKER:-}"
 
 ROOT="$(cd "$(dirname "${BASH_SOURCE[0]}")/../.." && pwd)"
-CONFIG="${ROOT}/config.yml"
+# afl_time_limit, seeds_dir and afl_resume, resolved once per campaign (afl_config.sh).
+source "${ROOT}/fuzzer/Afl++/afl_config.sh"
+TIME_LIMIT="${AFL_TIME_LIMIT}"
+SEEDS_DIR="${AFL_SEEDS_DIR}"
 
-# Read optional AFL time limit (seconds) from config.yml (key: afl_time_limit)
-TIME_LIMIT="$(
-ROOT_ENV="${ROOT}" CONFIG_ENV="${CONFIG}" python3 - <<'PY'
-import os, re
-cfg = os.environ.get("CONFIG_ENV") or os.environ.get("CONFIG_PATH") or "config.yml"
-default = "60"
-try:
-    with open(cfg, "r") as f:
-        for line in f:
-            m = re.match(r"\s*afl_time_limit\s*:\s*(\d+)", line)
-            if m:
-                print(m.group(1).strip())
-                raise SystemExit
-except FileNotFoundError:
-    pass
-print(default)
-PY
-)"
+# Resolve harness path relative to repo root
+HARNESS_ABS="$(cd "$(dirname "${HARNESS}")" && pwd)/$(basename "${HARNESS}")"
+HARNESS_REL="${HARNESS_ABS#${ROOT}/}"
+HARNESS_NAME="$(basename "${HARNESS_REL}" .c)"
 
-# Seeds directory (absolute path)
-SEEDS_DIR="$(
-ROOT_ENV="${ROOT}" CONFIG_ENV="${CONFIG}" python3 - <<'PY'
-import os, re
-root = os.environ["ROOT_ENV"]
-cfg = os.environ.get("CONFIG_ENV") or os.path.join(root, "config.yml")
-default = os.path.join(root, "fuzzer", "user_seeds")
-val = default
-try:
-    with open(cfg, "r") as f:
-        for line in f:
-            m = re.match(r"\s*seeds_dir\s*:\s*(.+)", line)
-            if m:
-                raw = m.group(1).strip()
-                if os.path.isabs(raw):
-                    val = raw
-                else:
-                    val = os.path.abspath(os.path.join(root, raw))
-                break
-except FileNotFoundError:
-    pass
-print(val)
+AFL_RESUME_ENV=""
+if [ "${AFL_RESUME}" = "1" ]; then
+  # Seed set = seeds_dir plus the queues of older timestamped runs, deduplicated by
+  # content. It is used whenever the persistent output dir starts a fresh session.
+  MERGED_DIR="${ROOT}/fuzzer/seeds-merged/${HARNESS_NAME}"
+  ROOT_ENV="${ROOT}" NAME_ENV="${HARNESS_NAME}" SEEDS_ENV="${SEEDS_DIR}" MERGED_ENV="${MERGED_DIR}" python3 - <<'PY'
+import glob, hashlib, os
+root, name = os.environ["ROOT_ENV"], os.environ["NAME_ENV"]
+seeds, merged = os.environ["SEEDS_ENV"], os.environ["MERGED_ENV"]
+os.makedirs(merged, exist_ok=True)
+have = set(os.listdir(merged))
+queues = sorted(glob.glob(os.path.join(root, "fuzzer", f"out-{name}-*", "default", "queue")))
+added = 0
+for src in [seeds] + queues:
+    try:
+        entries = sorted(os.scandir(src), key=lambda e: e.name)
+    except OSError:
+        continue
+    for entry in entries:
+        if not entry.is_file():
+            continue
+        try:
+            with open(entry.path, "rb") as f:
+                data = f.read()
+        except OSError:
+            continue
+        digest = hashlib.sha1(data).hexdigest()[:16]
+        if digest in have:
+            continue
+        with open(os.path.join(merged, digest), "wb") as f:
+            f.write(data)
+        have.add(digest)
+        added += 1
+print(f"[afl] Seed set {merged}: {len(have)} inputs ({added} new, from seeds and {len(queues)} older run(s))")
 PY
-)"
+  SEEDS_DIR="${MERGED_DIR}"
+  # Continue the previous session in OUTDIR if there is one, otherwise start from the seed set.
+  AFL_RESUME_ENV="AFL_AUTORESUME=1"
+  if [ -f "${ROOT}${OUTDIR#/workspace}/default/fuzzer_stats" ]; then
+    echo "[afl] Resuming previous session in ${OUTDIR}"
+  fi
+fi
+
 # Container path for seeds (under /workspace if within repo)
 SEEDS_CONT="${SEEDS_DIR}"
 if [[ "${SEEDS_DIR}" == "${ROOT}"* ]]; then
   SEEDS_CONT="/workspace${SEEDS_DIR#${ROOT}}"
 fi
 
-# Resolve harness path relative to repo root
-HARNESS_ABS="$(cd "$(dirname "${HARNESS}")" && pwd)/$(basename "${HARNESS}")"
-HARNESS_REL="$(python3 -c "import os; root=os.path.abspath('${ROOT}'); path=os.path.abspath('${HARNESS_ABS}'); print(os.path.relpath(path, root))")"
-HARNESS_NAME="$(basename "${HARNESS_REL}" .c)"
-
 echo "[afl] Using image: ${IMAGE}"
 echo "[afl] Harness: ${HARNESS_REL}"
 echo "[afl] Time limit (seconds): ${TIME_LIMIT}"
 echo "[afl] Seeds dir: ${SEEDS_DIR}"
 
-docker run --rm \
+# afl-fuzz treats AFL_NO_UI as enabled whenever it is set, so only export it when requested.
+AFL_UI_ENV=""
+if [ "${AFL_NO_UI}" = "1" ]; then
+  AFL_UI_ENV="AFL_NO_UI=1"
+fi
+
+AFL_BIND_ARGS=""
+if [ -n "${AFL_CPU}" ]; then
+  echo "[afl] Pinned to CPU ${AFL_CPU}"
+  AFL_BIND_ARGS="-b ${AFL_CPU}"
+fi
+
+JOB="set -euo pipefail; \
+  mkdir -p build \"${OUTDIR}\" \"${SEEDS_CONT}\"; \
+  bash Afl++/build_harness.sh ${HARNESS_REL#fuzzer/}; \
+  CORPUS=\"${SEEDS_CONT}\"; \
+  if [ \"${AFL_DISTILL}\" = 1 ]; then CORPUS=\$(AFL_TMIN=${AFL_TMIN} bash Afl++/distill_corpus.sh build/${HARNESS_NAME} \"${SEEDS_CONT}\"); fi; \
+  AFL_SKIP_CPUFREQ=1 ${AFL_UI_ENV} ${AFL_RESUME_ENV} exec afl-fuzz ${AFL_BIND_ARGS} -V \"${TIME_LIMIT}\" -i \"\${CORPUS}\" -o \"${OUTDIR}\" -- build/${HARNESS_NAME}"
+
+if [ -n "${AFL_WORKER}" ]; then
+  echo "[afl] Worker: ${AFL_WORKER}"
+  exec bash "${ROOT}/fuzzer/Afl++/afl_pool.sh" exec "${AFL_WORKER}" "${HARNESS_NAME}" bash -lc "${JOB}"
+fi
+
+DOCKER_CPU_ARGS=()
+if [ -n "${AFL_CONTAINER_NAME}" ]; then
+  DOCKER_CPU_ARGS+=(--name "${AFL_CONTAINER_NAME}")
+fi
+if [ -n "${AFL_CPU}" ]; then
+  DOCKER_CPU_ARGS+=(--cpuset-cpus "${AFL_CPU}")
+fi
+
+exec docker run --rm \
+  "${DOCKER_CPU_ARGS[@]}" \
   -u "$(id -u):$(id -g)" \
   -v "${ROOT}:/workspace" \
   -w /workspace/fuzzer \
   "${IMAGE}" \
-  bash -lc "set -euo pipefail; \
-    mkdir -p build \"${OUTDIR}\" \"${SEEDS_CONT}\"; \
-    AFL_SKIP_CPUFREQ=1 afl-clang-fast -I../ossfuzz-target/include ${HARNESS_REL#fuzzer/} -o build/${HARNESS_NAME}; \
-    AFL_SKIP_CPUFREQ=1 afl-fuzz -V \"${TIME_LIMIT}\" -i \"${SEEDS_CONT}\" -o \"${OUTDIR}\" -- build/${HARNESS_NAME} @@"
+  bash -lc "${JOB}"
@@ -3,39 +3,77 @@ set -euo pipefail
 
 # Run AFL++ for all harnesses listed in fuzzer/harnesses.json (or a provided index).
 # Usage: run_afl_all.sh [harness_index_json]
+#
+# Harnesses run concurrently, one AFL++ instance per slot. Harnesses beyond the
+# number of slots wait in a queue and start as soon as a running one finishes.
+# The script exits non-zero if any harness failed.
+#
+# Environment overrides:
+#   AFL_JOBS  - max concurrent harnesses (default: config afl_jobs, else one per CPU)
+#   AFL_CPUS  - CPUs to pin instances to, e.g. "0-3,8" (default: all online CPUs)
+#   AFL_PIN   - set to 0 to disable CPU pinning (default: 1)
+#   LOG_DIR   - per-harness logs (default: fuzzer/logs)
+#   AFL_RESUME - 1 to keep one output dir per harness (fuzzer/out-<harness>) and
+#               resume it across runs (default: config afl_resume, else 0)
+#   AFL_BUDGET - "fixed" gives every harness afl_time_limit seconds; "bandit"
+#               shares afl_time_limit x harnesses between them by coverage
+#               progress (fuzzer/budget_scheduler.py) (default: config afl_budget, else fixed)
+#   AFL_POOL  - 1 to start one warm worker container per slot (afl_pool.sh) and
+#               run every harness in one with docker exec; 0 for a fresh
+#               docker run per harness (default: config afl_pool, else 1)
 
 ROOT="$(cd "$(dirname "${BASH_SOURCE[0]}")/../.." && pwd)"
 INDEX="${1:-${ROOT}/fuzzer/harnesses.json}"
 IMAGE="${AFL_IMAGE:-mini-crs-afl}"
-CONFIG="${ROOT}/config.yml"
+LOG_DIR="${LOG_DIR:-${ROOT}/fuzzer/logs}"
+AFL_PIN="${AFL_PIN:-1}"
 
 if [ ! -f "${INDEX}" ]; then
   echo "[afl] Harness index not found: ${INDEX}" >&2
   exit 1
 fi
 
-# Read time limit from config (seconds).
-TIME_LIMIT="$(
-python3 - <<'PY'
-import os, re
-cfg = os.path.abspath(os.environ.get("CONFIG_PATH", os.path.join(os.path.dirname(__file__), "..", "..", "config.yml")))
-default = "60"
-try:
-    with open(cfg, "r") as f:
-        for line in f:
-            m = re.match(r"\s*afl_time_limit\s*:\s*(\d+)", line)
-            if m:
-                print(m.group(1))
-                raise SystemExit
-except FileNotFoundError:
-    pass
-print(default)
-PY
-)"
+# Settings from config.yml, resolved once for the campaign; every run_afl.sh
+# started below inherits them (afl_config.sh).
+source "${ROOT}/fuzzer/Afl++/afl_config.sh"
+TIME_LIMIT="${AFL_TIME_LIMIT}"
+
+if [ "${AFL_BUDGET}" != "fixed" ] && [ "${AFL_BUDGET}" != "bandit" ]; then
+  echo "[afl] Unknown AFL_BUDGET '${AFL_BUDGET}' (expected fixed or bandit)" >&2
+  exit 1
+fi
+
+# CPU slots: expand AFL_CPUS ("0-3,8") or use every online CPU.
+CPUS=()
+if [ -n "${AFL_CPUS:-}" ]; then
+  IFS=',' read -r -a cpu_ranges <<< "${AFL_CPUS}"
+  for range in "${cpu_ranges[@]}"; do
+    if [[ "${range}" == *-* ]]; then
+      for ((cpu = ${range%-*}; cpu <= ${range#*-}; cpu++)); do
+        CPUS+=("${cpu}")
+      done
+    else
+      CPUS+=("${range}")
+    fi
+  done
+else
+  for ((cpu = 0; cpu < $(nproc); cpu++)); do
+    CPUS+=("${cpu}")
+  done
+fi
+
+if [ "${AFL_JOBS}" -le 0 ] || { [ "${AFL_PIN}" = "1" ] && [ "${AFL_JOBS}" -gt "${#CPUS[@]}" ]; }; then
+  # Pinned instances never share a CPU, so there is at most one slot per CPU.
+  AFL_JOBS="${#CPUS[@]}"
+fi
 
 echo "[afl] Using image: ${IMAGE}"
 echo "[afl] Harness index: ${INDEX}"
 echo "[afl] Time limit (seconds): ${TIME_LIMIT}"
+echo "[afl] Resume mode: $([ "${AFL_RESUME}" = "1" ] && echo "on (persistent fuzzer/out-<harness>)" || echo off)"
+echo "[afl] Time budget: ${AFL_BUDGET}"
+echo "[afl] Worker pool: $([ "${AFL_POOL}" = "1" ] && echo "on (${AFL_JOBS} workers)" || echo off)"
+echo "[afl] Concurrent harnesses: ${AFL_JOBS} (pinning: $([ "${AFL_PIN}" = "1" ] && echo "CPUs ${CPUS[*]:0:${AFL_JOBS}}" || echo off))"
 
 # Extract harness list
 HARNESS_LIST=($(python3 - <<PY
@@ -48,9 +86,157 @@ for h in data.get("harnesses", []):
 PY
 ))
 
+mkdir -p "${LOG_DIR}"
+STATUS_DIR="$(mktemp -d)"
+
+declare -A RUNNING_NAME=()  # pid -> harness name
+declare -A RUNNING_SLOT=()  # pid -> slot index
+FREE_SLOTS=()
+for ((slot = 0; slot < AFL_JOBS; slot++)); do
+  FREE_SLOTS+=("${slot}")
+done
+FAILED=()
+PASSED=0
+WORKERS=()
+
+stop_workers() {
+  if [ "${#WORKERS[@]}" -gt 0 ]; then
+    bash "${ROOT}/fuzzer/Afl++/afl_pool.sh" stop "${WORKERS[@]}"
+    WORKERS=()
+  fi
+}
+
+# Bandit budget: the whole campaign shares TIME_LIMIT x harnesses instance-seconds.
+# Instances get that as their hard -V cap; the scheduler stops them earlier.
+SCHEDULER_PID=""
+REGISTRY_DIR=""
+RUN_TIME_LIMIT="${TIME_LIMIT}"
+if [ "${AFL_BUDGET}" = "bandit" ]; then
+  REGISTRY_DIR="$(mktemp -d)"
+  RUN_TIME_LIMIT=$((TIME_LIMIT * ${#HARNESS_LIST[@]}))
+  python3 "${ROOT}/fuzzer/budget_scheduler.py" --registry "${REGISTRY_DIR}" \
+    --budget "${RUN_TIME_LIMIT}" --harnesses "${#HARNESS_LIST[@]}" \
+    --report "${LOG_DIR}/budget_report.json" > "${LOG_DIR}/budget_scheduler.log" 2>&1 &
+  SCHEDULER_PID=$!
+fi
+
+stop_scheduler() {
+  if [ -n "${SCHEDULER_PID}" ]; then
+    kill -TERM "${SCHEDULER_PID}" 2>/dev/null || true
+    wait "${SCHEDULER_PID}" 2>/dev/null || true
+    cat "${LOG_DIR}/budget_scheduler.log"
+    SCHEDULER_PID=""
+  fi
+  if [ -n "${REGISTRY_DIR}" ]; then
+    rm -rf "${REGISTRY_DIR}"
+  fi
+}
+
+stop_all() {
+  # run_afl.sh execs docker run / afl_pool.sh exec, which stop afl-fuzz and wait for it.
+  for pid in "${!RUNNING_NAME[@]}"; do
+    pkill -TERM -P "${pid}" 2>/dev/null || true
+  done
+  wait || true
+  stop_scheduler
+  stop_workers
+  rm -rf "${STATUS_DIR}"
+}
+trap 'echo "[afl] Interrupted; stopping running harnesses" >&2; stop_all; exit 130' INT TERM
+
+# Worker pool: one container per slot, pinned like the slot, kept for the whole campaign.
+if [ "${AFL_POOL}" = "1" ]; then
+  for ((slot = 0; slot < AFL_JOBS; slot++)); do
+    WORKERS+=("mini-crs-afl-worker-$$-${slot}")
+    if ! bash "${ROOT}/fuzzer/Afl++/afl_pool.sh" start "${WORKERS[${slot}]}" \
+      "$([ "${AFL_PIN}" = "1" ] && echo "${CPUS[${slot}]}")"; then
+      echo "[afl] Could not start worker ${WORKERS[${slot}]}" >&2
+      bash "${ROOT}/fuzzer/Afl++/afl_pool.sh" stop "${WORKERS[@]}"
+      rm -rf "${STATUS_DIR}"
+      exit 1
+    fi
+  done
+fi
+
+# Reap every finished job, record its exit status and free its slot.
+reap_finished() {
+  local pid name status
+  for pid in "${!RUNNING_NAME[@]}"; do
+    if kill -0 "${pid}" 2>/dev/null; then
+      continue
+    fi
+    wait "${pid}" 2>/dev/null || true
+    name="${RUNNING_NAME[${pid}]}"
+    status="$(cat "${STATUS_DIR}/${name}" 2>/dev/null || echo 1)"
+    if [ "${status}" = "0" ]; then
+      PASSED=$((PASSED + 1))
+      echo "[afl] Finished ${name}"
+    else
+      FAILED+=("${name}")
+      echo "[afl] Harness ${name} failed with exit code ${status} (log: ${LOG_DIR}/${name}.log)" >&2
+    fi
+    FREE_SLOTS+=("${RUNNING_SLOT[${pid}]}")
+    unset "RUNNING_NAME[${pid}]" "RUNNING_SLOT[${pid}]"
+  done
+}
+
 for h in "${HARNESS_LIST[@]}"; do
+  # Queue: block until a slot frees up.
+  while [ "${#FREE_SLOTS[@]}" -eq 0 ]; do
+    wait -n || true
+    reap_finished
+  done
+  slot="${FREE_SLOTS[0]}"
+  FREE_SLOTS=("${FREE_SLOTS[@]:1}")
+
   name="$(basename "${h}" .c)"
-  outdir="/workspace/fuzzer/out-${name}-$(date +%s)"
-  echo "[afl] Running harness ${h} -> ${outdir}"
-  bash "${ROOT}/fuzzer/Afl++/run_afl.sh" "${h}" "${outdir}"
+  if [ "${AFL_RESUME}" = "1" ]; then
+    outdir="/workspace/fuzzer/out-${name}"
+  else
+    outdir="/workspace/fuzzer/out-${name}-$(date +%s)"
+  fi
+  cpu=""
+  if [ "${AFL_PIN}" = "1" ]; then
+    cpu="${CPUS[${slot}]}"
+  fi
+  container="mini-crs-afl-${name}-$$"
+  worker=""
+  if [ "${AFL_POOL}" = "1" ]; then
+    worker="${WORKERS[${slot}]}"
+  fi
+  if [ -n "${REGISTRY_DIR}" ]; then
+    # Pool jobs are stopped inside their worker, so they register the worker and the job name.
+    if [ -n "${worker}" ]; then
+      printf '%s\n%s\n%s\n' "${worker}" "${ROOT}${outdir#/workspace}" "${name}" > "${REGISTRY_DIR}/${name}"
+    else
+      printf '%s\n%s\n' "${container}" "${ROOT}${outdir#/workspace}" > "${REGISTRY_DIR}/${name}"
+    fi
+  fi
+  echo "[afl] Running harness ${h} -> ${outdir}${cpu:+ on CPU ${cpu}} (log: ${LOG_DIR}/${name}.log)"
+  (
+    status=0
+    AFL_CPU="${cpu}" AFL_NO_UI=1 AFL_CONTAINER_NAME="${container}" AFL_WORKER="${worker}" AFL_TIME_LIMIT="${RUN_TIME_LIMIT}" bash "${ROOT}/fuzzer/Afl++/run_afl.sh" "${h}" "${outdir}" \
+      > "${LOG_DIR}/${name}.log" 2>&1 || status=$?
+    echo "${status}" > "${STATUS_DIR}/${name}"
+    # Tells the scheduler the run is over, in case afl-fuzz never started.
+    if [ -n "${REGISTRY_DIR}" ]; then
+      rm -f "${REGISTRY_DIR}/${name}"
+    fi
+  ) &
+  RUNNING_NAME[$!]="${name}"
+  RUNNING_SLOT[$!]="${slot}"
+done
+
+while [ "${#RUNNING_NAME[@]}" -gt 0 ]; do
+  wait -n || true
+  reap_finished
 done
+stop_scheduler
+stop_workers
+rm -rf "${STATUS_DIR}"
+
+echo "[afl] ${PASSED}/${#HARNESS_LIST[@]} harnesses completed successfully"
+if [ "${#FAILED[@]}" -gt 0 ]; then
+  echo "[afl] Failed harnesses: ${FAILED[*]}" >&2
+  exit 1
+fi
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Coverage-feedback time budget allocator for AFL++ campaigns.
+
+run_afl_all.sh starts this next to the fuzzers when afl_budget is "bandit".
+The campaign gets a total budget of instance-seconds (afl_time_limit x number
+of harnesses); each harness is an arm of a bandit with an initial equal share.
+Every --interval seconds the scheduler reads the latest plot_data row of each
+running instance (telemetry.latest_plot_row) and rewards it for new queue
+entries (paths) and crashes. Then:
+
+  - an instance that found nothing new for --saturation seconds (after a
+    warm-up) is stopped early and its unused share returns to a pool;
+  - the pool is handed out as deadline extensions to running instances in
+    proportion to their discounted UCB score, so time moves to harnesses
+    that are still finding paths; time freed while nothing runs goes to the
+    next harness that starts, and what is never handed out is reported as
+    unallocated;
+  - an instance past its deadline is stopped.
+
+Instances register by writing a file named after the harness into the
+registry dir, with two lines: docker container name and host output dir.
+An instance is charged from when afl-fuzz writes fuzzer_stats or plot_data
+there (newer than the registry file), not while its harness builds; if the
+registry file goes away first (run_afl_all.sh removes it when the run ends)
+the whole share returns to the pool.
+Stopping is `docker stop`; run_afl.sh execs afl-fuzz so it gets the SIGTERM
+and shuts down cleanly. Jobs in a warm worker container (afl_pool.sh) add a
+third line, the job name; they are checked and stopped through afl_pool.sh,
+which signals the job inside the worker and leaves the worker running. A summary is written to fuzzer/logs/budget_report.json.
+
+Usage:
+  python3 fuzzer/budget_scheduler.py --registry DIR --budget SECONDS --harnesses N
+"""
+
+import argparse
+import json
+import math
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from telemetry import latest_plot_row
+
+ROOT = Path(__file__).resolve().parent.parent
+POOL_SCRIPT = ROOT / "fuzzer" / "Afl++" / "afl_pool.sh"
+DEFAULT_REPORT = ROOT / "fuzzer" / "logs" / "budget_report.json"
+# A crash is worth this many new paths.
+CRASH_WEIGHT = 10.0
+# Exploration weight and per-tick discount of the UCB statistics.
+UCB_C = 0.5
+DISCOUNT = 0.9
+
+
+class Arm:
+    """Scheduling state of one harness."""
+
+    def __init__(self, name: str, share: float) -> None:
+        self.name = name
+        self.allotment = share
+        self.container = ""
+        # Job name inside the container when it is a pool worker; empty for docker run instances.
+        self.job = ""
+        self.out_dir: Optional[Path] = None
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self.stop_reason = ""
+        self.paths = 0.0
+        self.crashes = 0.0
+        self.last_progress: Optional[float] = None
+        # Discounted reward sum and pull count (discounted UCB).
+        self.reward = 0.0
+        self.pulls = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self.started_at is not None and self.stopped_at is None
+
+    def used(self, now: float) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.stopped_at or now) - self.started_at
+
+
+class BudgetScheduler:
+    """Bandit policy over arms; `observe` feeds stats, `decide` returns arms to stop."""
+
+    def __init__(self, budget: float, harnesses: int, interval: float, saturation: float, warmup: float) -> None:
+        self.budget = budget
+        self.share = budget / max(1, harnesses)
+        self.interval = interval
+        self.saturation = saturation
+        self.warmup = warmup
+        self.arms: Dict[str, Arm] = {}
+        self.pool = 0.0
+
+    def register(self, name: str, container: str, out_dir: Path, now: float, job: str = "") -> Arm:
+        arm = self.arms.setdefault(name, Arm(name, self.share))
+        # Time freed while nothing was running goes to the next harness that starts.
+        if self.pool > 0 and not any(other.running for other in self.arms.values()):
+            arm.allotment += self.pool
+            self.pool = 0.0
+        arm.container = container
+        arm.job = job
+        arm.out_dir = out_dir
+        arm.started_at = now
+        arm.last_progress = now
+        return arm
+
+    def skip(self, name: str, now: float) -> Arm:
+        """Close an arm whose instance ended before afl-fuzz started; its share goes to the pool."""
+        arm = self.arms.setdefault(name, Arm(name, self.share))
+        arm.stop_reason = "not started"
+        self.finish(arm, now)
+        return arm
+
+    def tick(self) -> None:
+        """Age the statistics once per decision round so recent gains dominate."""
+        for arm in self.arms.values():
+            arm.reward *= DISCOUNT
+            arm.pulls *= DISCOUNT
+
+    def observe(self, arm: Arm, stats: Optional[Dict[str, float]], now: float) -> None:
+        if stats is None:
+            return
+        paths = stats.get("corpus_count", arm.paths)
+        crashes = stats.get("saved_crashes", arm.crashes)
+        gained = max(0.0, paths - arm.paths) + CRASH_WEIGHT * max(0.0, crashes - arm.crashes)
+        if arm.paths and gained > 0:
+            arm.last_progress = now
+        elif not arm.paths:
+            # First sample: the initial corpus is not progress.
+            arm.last_progress = now
+        arm.paths, arm.crashes = paths, crashes
+        arm.reward += gained / self.interval
+        arm.pulls += 1.0
+
+    def scores(self) -> Dict[str, float]:
+        running = [arm for arm in self.arms.values() if arm.running]
+        if not running:
+            return {}
+        means = {arm.name: arm.reward / arm.pulls if arm.pulls else 0.0 for arm in running}
+        best = max(means.values()) or 1.0
+        total = sum(arm.pulls for arm in running) or 1.0
+        return {
+            arm.name: means[arm.name] / best + UCB_C * math.sqrt(math.log(total + 1.0) / (arm.pulls or 1e-3))
+            for arm in running
+        }
+
+    def decide(self, now: float) -> List[Arm]:
+        """Arms to stop now; also hands the freed pool to the best-scoring arms."""
+        to_stop: List[Arm] = []
+        for arm in self.arms.values():
+            if not arm.running:
+                continue
+            used = arm.used(now)
+            if used >= arm.allotment:
+                arm.stop_reason = "budget"
+            elif used >= self.warmup and now - (arm.last_progress or now) >= self.saturation:
+                arm.stop_reason = "saturated"
+            else:
+                continue
+            to_stop.append(arm)
+        for arm in to_stop:
+            self.finish(arm, now)
+
+        scores = self.scores()
+        if self.pool > 0 and scores:
+            total = sum(scores.values())
+            for name, score in scores.items():
+                self.arms[name].allotment += self.pool * score / total
+            self.pool = 0.0
+        return to_stop
+
+    def finish(self, arm: Arm, now: float) -> None:
+        if arm.stopped_at is not None:
+            return
+        arm.stopped_at = now
+        self.pool += max(0.0, arm.allotment - arm.used(now))
+        arm.allotment = min(arm.allotment, arm.used(now))
+        if not arm.stop_reason:
+            arm.stop_reason = "exited"
+
+    def report(self, now: float) -> Dict[str, object]:
+        return {
+            "budget_seconds": self.budget,
+            "used_seconds": round(sum(arm.used(now) for arm in self.arms.values()), 1),
+            "unallocated_seconds": round(self.pool, 1),
+            "harnesses": [
+                {
+                    "harness": arm.name,
+                    "seconds": round(arm.used(now), 1),
+                    "allotment": round(arm.allotment, 1),
+                    "paths": int(arm.paths),
+                    "crashes": int(arm.crashes),
+                    "stopped": arm.stop_reason or "running",
+                }
+                for arm in sorted(self.arms.values(), key=lambda arm: arm.name)
+            ],
+        }
+
+
+def afl_started(out_dir: Path, since: float) -> bool:
+    """True once afl-fuzz wrote fuzzer_stats or plot_data after `since` (older ones are from a resumed run)."""
+    for name in ("fuzzer_stats", "plot_data"):
+        try:
+            if (out_dir / "default" / name).stat().st_mtime >= since:
+                return True
+        except OSError:
+            continue
+    return False
+
+
+def container_running(name: str, job: str = "") -> bool:
+    if job:
+        return subprocess.run(["bash", str(POOL_SCRIPT), "running", name, job], capture_output=True).returncode == 0
+    result = subprocess.run(
+        ["docker", "inspect", "-f", "{{.State.Running}}", name], capture_output=True, text=True
+    )
+    return result.returncode == 0 and result.stdout.strip() == "true"
+
+
+def stop_container(name: str, job: str = "") -> None:
+    if job:
+        subprocess.run(["bash", str(POOL_SCRIPT), "kill", name, job], capture_output=True)
+        return
+    subprocess.run(["docker", "stop", "-t", "10", name], capture_output=True)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Bandit time budget allocator for AFL++ instances.")
+    parser.add_argument("--registry", type=Path, required=True, help="dir where run_afl_all.sh registers instances")
+    parser.add_argument("--budget", type=float, required=True, help="total instance-seconds for the campaign")
+    parser.add_argument("--harnesses", type=int, required=True, help="number of harnesses in the campaign")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between decisions (default: 5)")
+    parser.add_argument(
+        "--saturation", type=float, default=0, help="stop after this many seconds without progress (default: budget share / 3)"
+    )
+    parser.add_argument("--report", type=Path, default=DEFAULT_REPORT, help="summary JSON path")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    share = args.budget / max(1, args.harnesses)
+    saturation = args.saturation or max(3 * args.interval, share / 3)
+    scheduler = BudgetScheduler(
+        args.budget, args.harnesses, args.interval, saturation, warmup=max(2 * args.interval, share / 4)
+    )
+    stopping = False
+
+    def request_stop(signum: int, frame: object) -> None:
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    print(
+        f"[budget] Budget {args.budget:.0f}s over {args.harnesses} harnesses "
+        f"(share {share:.0f}s, saturation {saturation:.0f}s)",
+        flush=True,
+    )
+
+    # Registered instances whose afl-fuzz has not started yet (harness still building).
+    pending: Set[str] = set()
+    while not stopping:
+        now = time.monotonic()
+        entries = sorted(args.registry.glob("*"))
+        for entry in entries:
+            if entry.name in scheduler.arms:
+                continue
+            try:
+                lines = entry.read_text().splitlines()
+                registered = entry.stat().st_mtime
+            except OSError:
+                continue
+            if len(lines) < 2:
+                continue
+            pending.add(entry.name)
+            if afl_started(Path(lines[1]), registered):
+                pending.discard(entry.name)
+                scheduler.register(entry.name, lines[0], Path(lines[1]), now, lines[2] if len(lines) > 2 else "")
+        for name in sorted(pending - {entry.name for entry in entries}):
+            pending.discard(name)
+            scheduler.skip(name, now)
+            print(f"[budget] {name} ended before afl-fuzz started", flush=True)
+        scheduler.tick()
+        for arm in scheduler.arms.values():
+            if not arm.running:
+                continue
+            if arm.used(now) > args.interval and not container_running(arm.container, arm.job):
+                scheduler.finish(arm, now)
+                continue
+            scheduler.observe(arm, latest_plot_row(arm.out_dir), now)  # type: ignore[arg-type]
+        for arm in scheduler.decide(now):
+            print(
+                f"[budget] Stopping {arm.name} after {arm.used(now):.0f}s ({arm.stop_reason}; "
+                f"paths={int(arm.paths)} crashes={int(arm.crashes)})",
+                flush=True,
+            )
+            stop_container(arm.container, arm.job)
+        time.sleep(args.interval)
+
+    now = time.monotonic()
+    report = scheduler.report(now)
+    args.report.parent.mkdir(parents=True, exist_ok=True)
+    args.report.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"[budget] Used {report['used_seconds']}s of {args.budget:.0f}s; report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,19 +20,52 @@ Scans fuzzer/out-* directories, reads crash files, and writes a JSON summary:
     ...
   ]
 }
+
+With --triage every crash input is replayed against an AddressSanitizer build
+of its harness (fuzzer/build/<harness>_asan, built by Afl++/build_harness.sh)
+on a pool of worker threads with a per-input timeout. The top stack frames of
+each report are normalized and hashed into a bucket, and "crashes" then holds
+one representative per bucket (the smallest input) with "bucket", "crash_type",
+"frames" and "count" added; "total_inputs" counts every input seen. Replay
+results are cached in fuzzer/triage_cache.json by binary and input hash.
+
+With --watch the crash directories are followed live (inotify, or polling as
+a fallback; see crash_watch.py): each new unique crash is appended to the
+crash store (fuzzer/crash_store.jsonl) as soon as AFL++ writes it, and the
+JSON summary is rewritten from the store once no new crash has arrived for
+--debounce seconds. Stop with Ctrl-C or --duration.
 """
 
+import argparse
+import hashlib
 import json
 import os
+import re
+import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 
 ROOT = Path(__file__).resolve().parent.parent
 HARNESS_INDEX = ROOT / "fuzzer" / "harnesses.json"
 FUZZER_DIR = ROOT / "fuzzer"
 CONFIG_PATH = ROOT / "config.yml"
 DEFAULT_OUTPUT = ROOT / "fuzzer" / "crashes_report.json"
+BUILD_DIR = ROOT / "fuzzer" / "build"
+BUILD_SCRIPT = ROOT / "fuzzer" / "Afl++" / "build_harness.sh"
+TRIAGE_CACHE = ROOT / "fuzzer" / "triage_cache.json"
+TRIAGE_CACHE_VERSION = 1
+CRASH_STORE = ROOT / "fuzzer" / "crash_store.jsonl"
+SANITIZER_VARIANT = "_asan"
+SANITIZER_CFLAGS = "-fsanitize=address,undefined -fno-sanitize-recover=undefined -g -O1 -fno-omit-frame-pointer"
+SANITIZER_ENV = {
+    "ASAN_OPTIONS": "detect_leaks=0:symbolize=1:handle_abort=1:allocator_may_return_null=1",
+    "UBSAN_OPTIONS": "print_stacktrace=1:halt_on_error=1",
+}
+# Frames this deep into the (filtered) stack identify a bucket.
+STACK_DEPTH = 3
 
 
 def load_config(default_out: Path) -> Path:
@@ -78,34 +111,232 @@ def parse_crash_filename(fname: str) -> Dict[str, str]:
     return meta
 
 
-def collect_crashes_for_harness(base_name: str) -> List[Dict[str, str]]:
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Content hashes of crash inputs, shared by deduplication and triage.
+_INPUT_HASHES: Dict[Path, str] = {}
+
+
+def input_hash(path: Path) -> str:
+    if path not in _INPUT_HASHES:
+        _INPUT_HASHES[path] = file_hash(path)
+    return _INPUT_HASHES[path]
+
+
+def index_output_dirs(fuzzer_dir: Path = FUZZER_DIR) -> Dict[str, List[Path]]:
     """
-    Find crash files under fuzzer/out-<base_name>*.
-    Returns list of {path, sig?, time?, execs?}.
+    Map harness base name -> its AFL++ output dirs, from one scan of fuzzer_dir.
+
+    Output dirs are named out-<base> (the persistent dir of resume mode) or
+    out-<base>-<timestamp>; base names never contain "-". Dirs are sorted by
+    name, so out-<base> comes first and then the timestamped runs, oldest
+    first. The name does not tell when out-<base> last ran (see
+    telemetry.latest_stats).
+    """
+    index: Dict[str, List[Path]] = {}
+    try:
+        with os.scandir(fuzzer_dir) as entries:
+            for entry in entries:
+                if not entry.name.startswith("out-") or not entry.is_dir():
+                    continue
+                base = entry.name[len("out-") :].split("-", 1)[0]
+                index.setdefault(base, []).append(Path(entry.path))
+    except FileNotFoundError:
+        return {}
+    for dirs in index.values():
+        dirs.sort(key=lambda path: path.name)
+    return index
+
+
+def collect_crashes_for_harness(base_name: str, output_index: Dict[str, List[Path]]) -> List[Dict[str, str]]:
+    """
+    List crash files in the output dirs of `base_name` (see index_output_dirs).
+    Returns list of {path, sig?, time?, execs?}; inputs with identical content
+    are listed once (first occurrence wins).
     """
     crashes: List[Dict[str, str]] = []
-    patterns = [
-        FUZZER_DIR.glob(f"out-{base_name}*/default/crashes/*"),
-        FUZZER_DIR.glob(f"out-{base_name}/default/crashes/*"),
-    ]
-    for pattern in patterns:
+    seen: Set[str] = set()
+    for out_dir in output_index.get(base_name, []):
+        crash_dir = out_dir / "default" / "crashes"
         try:
-            for path in pattern:
-                if path.name == "README.txt":
-                    continue
-                if not path.is_file():
-                    continue
-                rel = path.relative_to(ROOT)
-                meta = parse_crash_filename(path.name)
-                entry = {"path": rel.as_posix()}
-                entry.update(meta)
-                crashes.append(entry)
+            with os.scandir(crash_dir) as entries:
+                files = sorted(
+                    (entry for entry in entries if entry.name != "README.txt" and entry.is_file()),
+                    key=lambda entry: entry.name,
+                )
+        except (FileNotFoundError, NotADirectoryError):
+            continue
         except PermissionError:
             # Skip directories not readable (e.g., root-owned old runs).
             continue
+        for file_entry in files:
+            path = Path(file_entry.path)
+            try:
+                digest = input_hash(path)
+            except OSError:
+                continue
+            if digest in seen:
+                continue
+            seen.add(digest)
+            rel = path.relative_to(ROOT)
+            meta = parse_crash_filename(path.name)
+            entry = {"path": rel.as_posix()}
+            entry.update(meta)
+            crashes.append(entry)
     return crashes
 
 
+_FRAME_RE = re.compile(r"^\s*#(\d+) 0x[0-9a-fA-F]+ (?:in (\S+)(?: (.*))?|\((.*)\))\s*$")
+_ERROR_RE = re.compile(r"ERROR: \w+Sanitizer: ([\w-]+)|runtime error: (.*)")
+# Sanitizer runtime, libc and harness plumbing: never part of a bucket.
+_SKIP_FRAME_RE = re.compile(
+    r"^(?:__asan|__interceptor_|__sanitizer|__ubsan|__lsan|__libc_|__GI_|_start$|abort$|raise$|"
+    r"mini_crs_|run_one$|replay_file$|main$)"
+)
+
+
+def parse_sanitizer_report(stderr: str) -> Tuple[str, List[str]]:
+    """Crash type and the top non-runtime frames ("func file:line") of the first reported stack."""
+    crash_type = "unknown"
+    frames: List[str] = []
+    in_stack = False
+    for line in stderr.splitlines():
+        if crash_type == "unknown":
+            error = _ERROR_RE.search(line)
+            if error:
+                crash_type = error.group(1) or "ubsan: " + re.sub(r"0x[0-9a-fA-F]+|\d+", "N", error.group(2))
+        match = _FRAME_RE.match(line)
+        if not match:
+            if in_stack:
+                break  # only the first stack (the crash site, not alloc/free stacks)
+            continue
+        in_stack = True
+        func, location, module = match.group(2), match.group(3) or "", match.group(4)
+        if func is None:
+            # Unsymbolized frame: keep the module+offset.
+            frames.append(module)
+        elif not _SKIP_FRAME_RE.match(func) and "compiler-rt" not in location:
+            frames.append(f"{func} {os.path.basename(location)}".strip())
+        if len(frames) >= STACK_DEPTH:
+            break
+    return crash_type, frames
+
+
+def stack_bucket(crash_type: str, frames: List[str]) -> str:
+    """Stable bucket id: function names (no line numbers or addresses) plus the crash type."""
+    names = [frame.split(" ", 1)[0] for frame in frames]
+    return hashlib.sha1("\n".join([crash_type] + names).encode()).hexdigest()[:16]
+
+
+def build_sanitizer_binary(harness: Path) -> Optional[Path]:
+    """Build (or reuse) the sanitizer variant of a harness; None if it cannot be built here."""
+    env = dict(os.environ)
+    env["CC"] = os.environ.get("TRIAGE_CC", "clang")
+    env["CFLAGS"] = SANITIZER_CFLAGS
+    env["VARIANT"] = SANITIZER_VARIANT
+    result = subprocess.run(
+        ["bash", str(BUILD_SCRIPT), str(harness)], cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        print(f"[triage] Could not build sanitizer harness for {harness.name}; leaving its crashes untriaged",
+              file=sys.stderr)
+        return None
+    return BUILD_DIR / f"{harness.stem}{SANITIZER_VARIANT}"
+
+
+def replay_crash(binary: Path, crash_path: Path, timeout: float) -> Dict[str, object]:
+    """Run one input through the sanitizer build and classify the result."""
+    env = dict(os.environ, **SANITIZER_ENV)
+    try:
+        result = subprocess.run(
+            [str(binary), str(crash_path)], env=env, capture_output=True, text=True, errors="replace",
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        return {"crash_type": "timeout", "frames": [], "bucket": stack_bucket("timeout", [])}
+    if result.returncode == 0:
+        return {"crash_type": "no-repro", "frames": [], "bucket": stack_bucket("no-repro", [])}
+    crash_type, frames = parse_sanitizer_report(result.stderr)
+    if crash_type == "unknown" and result.returncode < 0:
+        crash_type = f"signal-{-result.returncode}"
+    return {"crash_type": crash_type, "frames": frames, "bucket": stack_bucket(crash_type, frames)}
+
+
+def load_triage_cache() -> Dict[str, Dict[str, object]]:
+    if not TRIAGE_CACHE.exists():
+        return {}
+    try:
+        data = json.loads(TRIAGE_CACHE.read_text())
+    except (OSError, json.JSONDecodeError):
+        return {}
+    if data.get("version") != TRIAGE_CACHE_VERSION:
+        return {}
+    return data.get("entries", {})
+
+
+def save_triage_cache(entries: Dict[str, Dict[str, object]]) -> None:
+    tmp_path = TRIAGE_CACHE.with_name(TRIAGE_CACHE.name + ".tmp")
+    tmp_path.write_text(json.dumps({"version": TRIAGE_CACHE_VERSION, "entries": entries}, indent=2) + "\n")
+    os.replace(tmp_path, TRIAGE_CACHE)
+
+
+def triage_harness(
+    harness: Path,
+    crashes: List[Dict[str, str]],
+    cache: Dict[str, Dict[str, object]],
+    pool: ThreadPoolExecutor,
+    timeout: float,
+) -> Optional[List[Dict[str, object]]]:
+    """
+    Bucket one harness's crashes by stack hash; returns one representative per
+    bucket (largest bucket first), or None if no sanitizer build is available.
+    """
+    if not crashes:
+        return []
+    binary = build_sanitizer_binary(harness)
+    if binary is None or not binary.exists():
+        return None
+    binary_hash = file_hash(binary)
+
+    keys: List[str] = []
+    pending: Dict[str, Path] = {}
+    for crash in crashes:
+        path = ROOT / crash["path"]
+        key = f"{binary_hash[:16]}:{input_hash(path)}"
+        keys.append(key)
+        if key not in cache:
+            pending.setdefault(key, path)
+    if pending:
+        print(f"[triage] {harness.stem}: replaying {len(pending)} of {len(crashes)} inputs "
+              f"({len(crashes) - len(pending)} cached)", file=sys.stderr)
+    futures = {key: pool.submit(replay_crash, binary, path, timeout) for key, path in pending.items()}
+    for key, future in futures.items():
+        cache[key] = future.result()
+
+    buckets: Dict[str, List[Tuple[Dict[str, str], Dict[str, object]]]] = {}
+    for crash, key in zip(crashes, keys):
+        result = cache[key]
+        buckets.setdefault(str(result["bucket"]), []).append((crash, result))
+    representatives: List[Dict[str, object]] = []
+    for bucket, members in buckets.items():
+        # The smallest input is the easiest to debug; path breaks ties deterministically.
+        crash, result = min(members, key=lambda item: ((ROOT / item[0]["path"]).stat().st_size, item[0]["path"]))
+        entry: Dict[str, object] = dict(crash)
+        entry.update(
+            {"bucket": bucket, "crash_type": result["crash_type"], "frames": result["frames"], "count": len(members)}
+        )
+        representatives.append(entry)
+    representatives.sort(key=lambda entry: (-int(entry["count"]), str(entry["bucket"])))
+    return representatives
+
+
 def load_harnesses() -> List[Path]:
     if not HARNESS_INDEX.exists():
         raise SystemExit(f"[collect] Harness index not found: {HARNESS_INDEX}")
@@ -114,28 +345,185 @@ def load_harnesses() -> List[Path]:
     return harnesses
 
 
+def write_report(report: Dict[str, List[Dict[str, object]]], out_path: Path) -> None:
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    tmp_path.write_text(json.dumps(report, indent=2) + "\n")
+    os.replace(tmp_path, out_path)
+
+
+def watch(out_path: Path, debounce: float, duration: float, use_inotify: bool) -> None:
+    """Follow AFL++ crash directories and record crashes as they appear (see module docstring)."""
+    from crash_watch import CrashStore, DirWatcher
+
+    harnesses: Dict[str, Path] = {}
+    functions: Dict[str, str] = {}
+    # Out dirs seen before their harness was in the index, by base name; the watcher
+    # reports a name only once, so they are revisited when the index grows.
+    pending: Dict[Path, str] = {}
+    index_stamp: Optional[Tuple[int, int, int]] = None
+
+    def load_index() -> None:
+        nonlocal index_stamp
+        try:
+            stat = HARNESS_INDEX.stat()
+            stamp: Optional[Tuple[int, int, int]] = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            stamp = None
+        if stamp is not None and stamp == index_stamp:
+            return
+        index_stamp = stamp
+        for harness in load_harnesses():
+            if harness.stem not in harnesses:
+                harnesses[harness.stem] = harness
+                functions[harness.stem] = derive_function_from_harness(harness)
+
+    def known(base: str) -> bool:
+        # The index grows while start.py --pipelined generates harnesses, so re-read it for new names.
+        if base not in harnesses:
+            load_index()
+        return base in harnesses
+
+    def revisit_pending() -> int:
+        """Handle pending out dirs whose harness has been added to the index since; returns crashes added."""
+        if not pending:
+            return 0
+        load_index()
+        ready = [path for path, base in pending.items() if base in harnesses]
+        for path in ready:
+            del pending[path]
+        return sum(handle(path) for path in ready)
+
+    load_index()
+    store = CrashStore(CRASH_STORE, ROOT)
+    watcher = DirWatcher(use_inotify=use_inotify)
+
+    def summary() -> Dict[str, List[Dict[str, object]]]:
+        recorded = store.crashes_by_harness()
+        report: Dict[str, List[Dict[str, object]]] = {"harnesses": []}
+        for base, harness in harnesses.items():
+            rel = harness.relative_to(ROOT).as_posix()
+            report["harnesses"].append({"harness": rel, "function": functions[base], "crashes": recorded.get(rel, [])})
+        return report
+
+    def handle(path: Path) -> int:
+        """Follow new dirs towards out-<base>/default/crashes and record new crash files; returns crashes added."""
+        parent = path.parent
+        if parent == FUZZER_DIR:
+            if not path.name.startswith("out-"):
+                return 0
+            base = path.name[len("out-") :].split("-", 1)[0]
+            if not known(base):
+                pending[path] = base
+                return 0
+            crash_dir = path / "default" / "crashes"
+            # Existing runs: watch only their crashes dir to keep the number of watches down.
+            targets = watcher.add(crash_dir) if crash_dir.is_dir() else watcher.add(path)
+            return sum(handle(entry) for entry in targets)
+        if path.name == "default" and parent.parent == FUZZER_DIR:
+            return sum(handle(entry) for entry in watcher.add(path))
+        if path.name == "crashes" and parent.name == "default":
+            return sum(handle(entry) for entry in watcher.add(path))
+        if parent.name != "crashes" or path.name == "README.txt":
+            return 0
+        rel = path.relative_to(ROOT).as_posix()
+        if store.has_path(rel) or not path.is_file():
+            return 0
+        base = parent.parent.parent.name[len("out-") :].split("-", 1)[0]
+        try:
+            digest = input_hash(path)
+        except OSError:
+            return 0
+        crash = {"path": rel}
+        crash.update(parse_crash_filename(path.name))
+        harness_rel = harnesses[base].relative_to(ROOT).as_posix()
+        if not store.add(harness_rel, functions[base], digest, crash):
+            return 0
+        print(f"[watch] New crash for {functions[base]}: {rel}", flush=True)
+        return 1
+
+    added = sum(handle(entry) for entry in watcher.add(FUZZER_DIR))
+    write_report(summary(), out_path)
+    print(f"[watch] Watching {FUZZER_DIR} via {watcher.backend} ({added} new, {len(store.records)} stored crashes)",
+          flush=True)
+    deadline = time.monotonic() + duration if duration > 0 else None
+    last_change: Optional[float] = None
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            timeout = debounce if last_change is not None else 1.0
+            if deadline is not None:
+                timeout = max(0.0, min(timeout, deadline - time.monotonic()))
+            if sum(handle(entry) for entry in watcher.wait(timeout)) + revisit_pending():
+                last_change = time.monotonic()
+            elif last_change is not None and time.monotonic() - last_change >= debounce:
+                write_report(summary(), out_path)
+                print(f"[watch] Updated {out_path} ({len(store.records)} crashes)", flush=True)
+                last_change = None
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        store.close()
+    write_report(summary(), out_path)
+    print(f"[collect] Wrote crash summary to {out_path} (crashes: {len(store.records)})")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Collect AFL++ crashes into a JSON report.")
+    parser.add_argument("output", nargs="?", type=Path, help="report path (default: config crash_report)")
+    parser.add_argument(
+        "--triage", action="store_true", help="replay crashes on sanitizer builds and bucket them by stack hash"
+    )
+    parser.add_argument(
+        "--triage-workers", type=int, default=0, help="parallel replays (default: one per CPU)"
+    )
+    parser.add_argument("--triage-timeout", type=float, default=10.0, help="seconds per replay (default: 10)")
+    parser.add_argument("--watch", action="store_true", help="record crashes live as AFL++ finds them")
+    parser.add_argument(
+        "--debounce", type=float, default=2.0, help="seconds without new crashes before the summary is rewritten"
+    )
+    parser.add_argument("--duration", type=float, default=0, help="stop watching after N seconds (default: never)")
+    parser.add_argument("--poll", action="store_true", help="poll directories instead of using inotify")
+    return parser.parse_args()
+
+
 def main() -> None:
+    args = parse_args()
+    if args.watch:
+        out_path = args.output.resolve() if args.output is not None else load_config(DEFAULT_OUTPUT)
+        watch(out_path, args.debounce, args.duration, use_inotify=not args.poll)
+        return
     report: Dict[str, List[Dict[str, object]]] = {"harnesses": []}
-    for harness in load_harnesses():
-        base = harness.stem  # e.g., instant_crash_afl
-        func = derive_function_from_harness(harness)
-        crashes = collect_crashes_for_harness(base)
-        report["harnesses"].append(
-            {
+    cache = load_triage_cache() if args.triage else {}
+    workers = args.triage_workers if args.triage_workers > 0 else (os.cpu_count() or 1)
+    output_index = index_output_dirs()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for harness in load_harnesses():
+            base = harness.stem  # e.g., instant_crash_afl
+            func = derive_function_from_harness(harness)
+            crashes = collect_crashes_for_harness(base, output_index)
+            entry: Dict[str, object] = {
                 "harness": harness.relative_to(ROOT).as_posix(),
                 "function": func,
                 "crashes": crashes,
             }
-        )
-    out_path = (
-        Path(sys.argv[1]).resolve()
-        if len(sys.argv) > 1
-        else load_config(DEFAULT_OUTPUT)
-    )
+            if args.triage:
+                representatives = triage_harness(harness, crashes, cache, pool, args.triage_timeout)
+                if representatives is not None:
+                    entry["crashes"] = representatives
+                    entry["total_inputs"] = len(crashes)
+            report["harnesses"].append(entry)
+    if args.triage:
+        save_triage_cache(cache)
+    out_path = args.output.resolve() if args.output is not None else load_config(DEFAULT_OUTPUT)
     out_path.parent.mkdir(parents=True, exist_ok=True)
     out_path.write_text(json.dumps(report, indent=2) + "\n")
     total_crashes = sum(len(h["crashes"]) for h in report["harnesses"])
-    print(f"[collect] Wrote crash summary to {out_path} (crashes: {total_crashes})")
+    if args.triage:
+        total_inputs = sum(h.get("total_inputs", len(h["crashes"])) for h in report["harnesses"])
+        print(f"[collect] Wrote crash summary to {out_path} (unique crashes: {total_crashes}, inputs: {total_inputs})")
+    else:
+        print(f"[collect] Wrote crash summary to {out_path} (crashes: {total_crashes})")
     json.dump(report, sys.stdout, indent=2)
     sys.stdout.write("\n")
 
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Building blocks for live crash collection (collect_crashes.py --watch).
+
+DirWatcher reports entries that appear in a set of watched directories. On
+Linux it waits on inotify (through ctypes) and only rescans directories that
+changed; elsewhere, or if inotify is unavailable, it polls with os.scandir.
+
+CrashStore is an append-only JSONL log of unique crashes, indexed in memory by
+path and by (harness, content hash) so known inputs are never recorded twice.
+The log outlives campaigns, so on load it drops (and rewrites the file without)
+crashes whose AFL++ output dir has been deleted since.
+"""
+
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """Minimal inotify binding; raises OSError if the platform does not provide it."""
+
+    def __init__(self) -> None:
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("libc not found")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify not supported")
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def add_watch(self, path: Path, mask: int) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(str(path)), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), str(path))
+        return wd
+
+    def read_events(self) -> List[Tuple[int, int]]:
+        """Drain pending events as (watch descriptor, mask) pairs."""
+        events: List[Tuple[int, int]] = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                events.append((wd, mask))
+                offset += _EVENT_HEADER.size + length
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class DirWatcher:
+    """
+    Reports new entries in watched directories.
+
+    Both backends keep the set of names already seen per directory; inotify
+    only tells which directories to rescan, so a queue overflow just means
+    rescanning everything.
+    """
+
+    # Files are reported once written and closed; new subdirectories on creation.
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+
+    def __init__(self, poll_interval: float = 1.0, use_inotify: bool = True) -> None:
+        self.poll_interval = poll_interval
+        self._known: Dict[Path, Set[str]] = {}
+        self._by_wd: Dict[int, Path] = {}
+        self._inotify: Optional[_Inotify] = None
+        if use_inotify:
+            try:
+                self._inotify = _Inotify()
+            except OSError:
+                self._inotify = None
+
+    @property
+    def backend(self) -> str:
+        return "inotify" if self._inotify is not None else "polling"
+
+    def add(self, path: Path) -> List[Path]:
+        """Start watching `path`; returns the entries it already contains."""
+        if path in self._known:
+            return []
+        if self._inotify is not None:
+            try:
+                self._by_wd[self._inotify.add_watch(path, self.MASK)] = path
+            except OSError:
+                # Out of watches (fs.inotify.max_user_watches) or similar: poll from now on.
+                self._inotify.close()
+                self._inotify = None
+                self._by_wd.clear()
+        self._known[path] = set()
+        return self._rescan(path)
+
+    def wait(self, timeout: float) -> List[Path]:
+        """Block for up to `timeout` seconds and return entries that appeared meanwhile."""
+        if self._inotify is None:
+            time.sleep(min(timeout, self.poll_interval))
+            return [entry for path in list(self._known) for entry in self._rescan(path)]
+        ready, _, _ = select.select([self._inotify.fd], [], [], timeout)
+        if not ready:
+            return []
+        dirty: Set[Path] = set()
+        for wd, mask in self._inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                dirty.update(self._known)
+                continue
+            path = self._by_wd.get(wd)
+            if path is None:
+                continue
+            if mask & IN_IGNORED:
+                # The directory was removed.
+                del self._by_wd[wd]
+                self._known.pop(path, None)
+                continue
+            if mask & IN_CREATE and not mask & IN_ISDIR:
+                # Wait for IN_CLOSE_WRITE so files are never read half-written.
+                continue
+            dirty.add(path)
+        return [entry for path in sorted(dirty) if path in self._known for entry in self._rescan(path)]
+
+    def close(self) -> None:
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def _rescan(self, path: Path) -> List[Path]:
+        try:
+            with os.scandir(path) as entries:
+                names = {entry.name for entry in entries}
+        except OSError:
+            return []
+        known = self._known[path]
+        new = sorted(names - known)
+        known.update(new)
+        return [path / name for name in new]
+
+
+class CrashStore:
+    """Append-only JSONL log of unique crashes with in-memory indexes by path and content hash."""
+
+    def __init__(self, path: Path, root: Path) -> None:
+        self.path = path
+        # Crash paths in the records are relative to root.
+        self.root = root
+        self.records: List[Dict[str, object]] = []
+        self._paths: Set[str] = set()
+        self._hashes: Set[Tuple[str, str]] = set()
+        self._load()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open("a")
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        data = self.path.read_bytes()
+        # Drop a partial last line left by an interrupted append.
+        complete = data[: data.rfind(b"\n") + 1]
+        if len(complete) != len(data):
+            with self.path.open("r+b") as f:
+                f.truncate(len(complete))
+        stale = 0
+        for line in complete.decode().splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if self._out_dir(record).is_dir():
+                self._index(record)
+            else:
+                stale += 1
+        if stale:
+            self._rewrite()
+
+    def _out_dir(self, record: Dict[str, object]) -> Path:
+        """out-<harness>-<ts> dir of a crash (fuzzer/out-.../default/crashes/<file>)."""
+        return (self.root / str(record["crash"]["path"])).parents[2]  # type: ignore[index]
+
+    def _rewrite(self) -> None:
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with tmp_path.open("w") as f:
+            for seq, record in enumerate(self.records):
+                record["seq"] = seq
+                f.write(json.dumps(record) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def _index(self, record: Dict[str, object]) -> None:
+        self.records.append(record)
+        self._paths.add(str(record["crash"]["path"]))  # type: ignore[index]
+        self._hashes.add((str(record["harness"]), str(record["sha256"])))
+
+    def has_path(self, rel_path: str) -> bool:
+        return rel_path in self._paths
+
+    def add(self, harness: str, function: str, sha256: str, crash: Dict[str, str]) -> bool:
+        """Append a crash unless the harness already has one with the same content; True if added."""
+        self._paths.add(crash["path"])
+        if (harness, sha256) in self._hashes:
+            return False
+        record: Dict[str, object] = {
+            "seq": len(self.records),
+            "harness": harness,
+            "function": function,
+            "sha256": sha256,
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "crash": crash,
+        }
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        self._index(record)
+        return True
+
+    def crashes_by_harness(self) -> Dict[str, List[Dict[str, str]]]:
+        grouped: Dict[str, List[Dict[str, str]]] = {}
+        for record in self.records:
+            grouped.setdefault(str(record["harness"]), []).append(record["crash"])  # type: ignore[arg-type]
+        return grouped
+
+    def close(self) -> None:
+        self._file.close()
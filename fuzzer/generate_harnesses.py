@@ -2,11 +2,21 @@
 """
 Generate AFL++ harnesses for functions listed in the vulnerable_functions.json output.
 
-Harnesses are written to fuzzer/harnesses/<function>_afl.c and include the
-ossfuzz-target source directly so even static functions can be exercised.
+Harnesses are written to fuzzer/harnesses/<function>_afl.c. The target itself
+is compiled once: fuzzer/harnesses/target_shim.c includes the ossfuzz-target
+source (so even static functions can be exercised) and exposes each function
+under test as mini_crs_<function>; fuzzer/Afl++/build_harness.sh builds it into
+fuzzer/build/libtarget.a and links every harness against that archive.
+
+Under afl-clang-fast the harnesses run in persistent mode: a deferred
+forkserver (__AFL_INIT), up to PERSISTENT_ITERATIONS inputs per process
+(__AFL_LOOP) and test cases read from shared memory (__AFL_FUZZ_TESTCASE_BUF),
+so afl-fuzz is run without @@. Passing a file argument replays that single
+input, and plain compilers fall back to reading inputs from stdin.
 """
 
 import json
+import os
 import re
 import sys
 from pathlib import Path
@@ -18,6 +28,9 @@ DEFAULT_VULN_JSON = ROOT / "static-analyzer" / "vulnerable_functions.json"
 DEFAULT_TARGET_SRC = ROOT / "ossfuzz-target" / "src" / "vuln_lib.c"
 HARNESS_DIR = ROOT / "fuzzer" / "harnesses"
 HARNESS_INDEX = ROOT / "fuzzer" / "harnesses.json"
+TARGET_SHIM = HARNESS_DIR / "target_shim.c"
+# Inputs run per forked process before AFL++ restarts it.
+PERSISTENT_ITERATIONS = 10000
 
 
 def load_config() -> Dict[str, str]:
@@ -48,40 +61,107 @@ def load_functions(vuln_json: Path) -> Set[str]:
     return funcs
 
 
-def write_harness(func: str, rel_src: str) -> Path:
+def shim_name(func: str) -> str:
+    return f"mini_crs_{sanitize_name(func)}"
+
+
+def write_target_shim(funcs: List[str], rel_src: str) -> Path:
+    """Write the translation unit that wraps every function under test in an external symbol."""
+    HARNESS_DIR.mkdir(parents=True, exist_ok=True)
+    trampolines = "\n".join(
+        f"void {shim_name(func)}(const uint8_t *data, size_t size) {{ (void){func}(data, size); }}"
+        for func in funcs
+    )
+    content = f"""// Auto-generated target shim: compiled once into fuzzer/build/libtarget.a
+#include <stddef.h>
+#include <stdint.h>
+
+// Pull in the implementation (includes static functions)
+#include "{rel_src}"
+
+{trampolines}
+"""
+    # Replaced atomically: harness builds may be compiling the previous shim (start.py --pipelined).
+    tmp_path = TARGET_SHIM.with_name(TARGET_SHIM.name + ".tmp")
+    tmp_path.write_text(content)
+    os.replace(tmp_path, TARGET_SHIM)
+    print(f"[harness] wrote {TARGET_SHIM}")
+    return TARGET_SHIM
+
+
+def write_harness(func: str) -> Path:
     HARNESS_DIR.mkdir(parents=True, exist_ok=True)
     fname = HARNESS_DIR / f"{sanitize_name(func)}_afl.c"
     content = f"""// Auto-generated AFL++ harness for {func}
 #include <stdint.h>
 #include <stdlib.h>
 #include <stdio.h>
+#include <string.h>
 #include <unistd.h>
 
-// Pull in the implementation (includes static functions)
-#include "{rel_src}"
+// Function under test, provided by libtarget.a (see target_shim.c)
+void {shim_name(func)}(const uint8_t *data, size_t size);
 
 #define MAX_INPUT (1 << 16)
+#define PERSISTENT_ITERATIONS {PERSISTENT_ITERATIONS}
+
+// Built without afl-clang-fast (plain cc, replay builds): read inputs from stdin instead
+// of shared memory and run the loop body once per read.
+#ifndef __AFL_FUZZ_TESTCASE_LEN
+#define __AFL_FUZZ_INIT() static ssize_t fuzz_len; static uint8_t fuzz_buf[MAX_INPUT]
+#define __AFL_FUZZ_TESTCASE_BUF fuzz_buf
+#define __AFL_FUZZ_TESTCASE_LEN fuzz_len
+#define __AFL_INIT() do {{ }} while (0)
+#define __AFL_LOOP(x) ((fuzz_len = read(STDIN_FILENO, fuzz_buf, sizeof(fuzz_buf))) > 0)
+#endif
+
+__AFL_FUZZ_INIT();
+
+static void run_one(const uint8_t *data, size_t len) {{
+  if (len == 0) {{
+    return;
+  }}
+  if (len > MAX_INPUT) {{
+    len = MAX_INPUT;
+  }}
+  // Exact-size heap copy so sanitizers catch reads past the end of the input.
+  uint8_t *copy = (uint8_t *)malloc(len);
+  if (!copy) {{
+    return;
+  }}
+  memcpy(copy, data, len);
+  {shim_name(func)}(copy, len);
+  free(copy);
+}}
 
-int main(int argc, char **argv) {{
-  uint8_t buf[MAX_INPUT];
-  ssize_t len = 0;
+// Crash replay: ./harness <input-file> runs a single input and exits.
+static int replay_file(const char *path) {{
+  static uint8_t buf[MAX_INPUT];
+  FILE *fp = fopen(path, "rb");
+  if (!fp) {{
+    return 0;
+  }}
+  size_t len = fread(buf, 1, sizeof(buf), fp);
+  fclose(fp);
+  run_one(buf, len);
+  return 0;
+}}
 
+int main(int argc, char **argv) {{
   if (argc > 1) {{
-    FILE *fp = fopen(argv[1], "rb");
-    if (!fp) {{
-      return 0;
-    }}
-    len = (ssize_t)fread(buf, 1, sizeof(buf), fp);
-    fclose(fp);
-  }} else {{
-    len = read(STDIN_FILENO, buf, sizeof(buf));
+    return replay_file(argv[1]);
   }}
 
-  if (len <= 0) {{
-    return 0;
+  // Deferred forkserver: fork only once setup above is done.
+  __AFL_INIT();
+  // The shared-memory testcase buffer is only valid after __AFL_INIT().
+  const uint8_t *buf = __AFL_FUZZ_TESTCASE_BUF;
+  while (__AFL_LOOP(PERSISTENT_ITERATIONS)) {{
+    ssize_t len = __AFL_FUZZ_TESTCASE_LEN;
+    if (len > 0) {{
+      run_one(buf, (size_t)len);
+    }}
   }}
-
-  {func}(buf, (size_t)len);
   return 0;
 }}
 """
@@ -90,6 +170,17 @@ int main(int argc, char **argv) {{
     return fname
 
 
+def relative_include(target_src: Path) -> str:
+    """The target source as #included from the harness dir."""
+    return Path(os.path.relpath(target_src, HARNESS_DIR)).as_posix()
+
+
+def write_index(harnesses: List[str]) -> None:
+    tmp_path = HARNESS_INDEX.with_name(HARNESS_INDEX.name + ".tmp")
+    tmp_path.write_text(json.dumps({"harnesses": harnesses}, indent=2) + "\n")
+    os.replace(tmp_path, HARNESS_INDEX)
+
+
 def main() -> None:
     cfg = load_config()
     vuln_json = Path(cfg["vuln_output"]).resolve()
@@ -99,19 +190,16 @@ def main() -> None:
     target_src = Path(cfg["target_src"]).resolve()
     if not target_src.exists():
         raise SystemExit(f"[harness] target source not found: {target_src}")
-    rel_include_from_harness = Path(
-        Path(
-            __import__("os").path.relpath(target_src, HARNESS_DIR)
-        )
-    ).as_posix()
+    rel_include_from_harness = relative_include(target_src)
     if not funcs:
         print("[harness] No functions found to generate harnesses for.")
         return
+    write_target_shim(sorted(funcs), rel_include_from_harness)
     written: List[str] = []
     for func in sorted(funcs):
-        path = write_harness(func, rel_include_from_harness)
+        path = write_harness(func)
         written.append(str(path.relative_to(ROOT)))
-    HARNESS_INDEX.write_text(json.dumps({"harnesses": written}, indent=2) + "\n")
+    write_index(written)
     print(f"[harness] index written to {HARNESS_INDEX}")
 
 
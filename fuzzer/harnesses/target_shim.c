@@ -0,0 +1,13 @@
+// Auto-generated target shim: compiled once into fuzzer/build/libtarget.a
+#include <stddef.h>
+#include <stdint.h>
+
+// Pull in the implementation (includes static functions)
+#include "../../ossfuzz-target/src/vuln_lib.c"
+
+void mini_crs_copy_to_stack(const uint8_t *data, size_t size) { (void)copy_to_stack(data, size); }
+void mini_crs_heap_overflow(const uint8_t *data, size_t size) { (void)heap_overflow(data, size); }
+void mini_crs_instant_crash(const uint8_t *data, size_t size) { (void)instant_crash(data, size); }
+void mini_crs_parse_chunks(const uint8_t *data, size_t size) { (void)parse_chunks(data, size); }
+void mini_crs_temporal_issues(const uint8_t *data, size_t size) { (void)temporal_issues(data, size); }
+void mini_crs_unchecked_format(const uint8_t *data, size_t size) { (void)unchecked_format(data, size); }
@@ -2,32 +2,71 @@
 #include <stdint.h>
 #include <stdlib.h>
 #include <stdio.h>
+#include <string.h>
 #include <unistd.h>
 
-// Pull in the implementation (includes static functions)
-#include "../../ossfuzz-target/src/vuln_lib.c"
+// Function under test, provided by libtarget.a (see target_shim.c)
+void mini_crs_temporal_issues(const uint8_t *data, size_t size);
 
 #define MAX_INPUT (1 << 16)
+#define PERSISTENT_ITERATIONS 10000
 
-int main(int argc, char **argv) {
-  uint8_t buf[MAX_INPUT];
-  ssize_t len = 0;
+// Built without afl-clang-fast (plain cc, replay builds): read inputs from stdin instead
+// of shared memory and run the loop body once per read.
+#ifndef __AFL_FUZZ_TESTCASE_LEN
+#define __AFL_FUZZ_INIT() static ssize_t fuzz_len; static uint8_t fuzz_buf[MAX_INPUT]
+#define __AFL_FUZZ_TESTCASE_BUF fuzz_buf
+#define __AFL_FUZZ_TESTCASE_LEN fuzz_len
+#define __AFL_INIT() do { } while (0)
+#define __AFL_LOOP(x) ((fuzz_len = read(STDIN_FILENO, fuzz_buf, sizeof(fuzz_buf))) > 0)
+#endif
 
-  if (argc > 1) {
-    FILE *fp = fopen(argv[1], "rb");
-    if (!fp) {
-      return 0;
-    }
-    len = (ssize_t)fread(buf, 1, sizeof(buf), fp);
-    fclose(fp);
-  } else {
-    len = read(STDIN_FILENO, buf, sizeof(buf));
+__AFL_FUZZ_INIT();
+
+static void run_one(const uint8_t *data, size_t len) {
+  if (len == 0) {
+    return;
   }
+  if (len > MAX_INPUT) {
+    len = MAX_INPUT;
+  }
+  // Exact-size heap copy so sanitizers catch reads past the end of the input.
+  uint8_t *copy = (uint8_t *)malloc(len);
+  if (!copy) {
+    return;
+  }
+  memcpy(copy, data, len);
+  mini_crs_temporal_issues(copy, len);
+  free(copy);
+}
 
-  if (len <= 0) {
+// Crash replay: ./harness <input-file> runs a single input and exits.
+static int replay_file(const char *path) {
+  static uint8_t buf[MAX_INPUT];
+  FILE *fp = fopen(path, "rb");
+  if (!fp) {
     return 0;
   }
+  size_t len = fread(buf, 1, sizeof(buf), fp);
+  fclose(fp);
+  run_one(buf, len);
+  return 0;
+}
 
-  temporal_issues(buf, (size_t)len);
+int main(int argc, char **argv) {
+  if (argc > 1) {
+    return replay_file(argv[1]);
+  }
+
+  // Deferred forkserver: fork only once setup above is done.
+  __AFL_INIT();
+  // The shared-memory testcase buffer is only valid after __AFL_INIT().
+  const uint8_t *buf = __AFL_FUZZ_TESTCASE_BUF;
+  while (__AFL_LOOP(PERSISTENT_ITERATIONS)) {
+    ssize_t len = __AFL_FUZZ_TESTCASE_LEN;
+    if (len > 0) {
+      run_one(buf, (size_t)len);
+    }
+  }
   return 0;
 }
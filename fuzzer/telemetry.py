@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Export AFL++ fuzzing telemetry per harness.
+
+Reads fuzzer_stats and plot_data from every fuzzer/out-*/default directory and
+writes:
+
+  - fuzzer/logs/telemetry.jsonl: one JSON object per plot_data sample (a time
+    series per run) plus a final "snapshot" record per run from fuzzer_stats:
+    {"kind": "sample", "harness": "heap_overflow_afl",
+     "run": "out-heap_overflow_afl-1717171717", "time": 1717171720,
+     "execs_per_sec": 1843.2, "corpus_count": 14, "bitmap_cvg": 0.42,
+     "edges_found": 37, "saved_crashes": 1, "saved_hangs": 0, ...}
+    Snapshot records also carry "stability" (only fuzzer_stats has it).
+
+  - fuzzer/logs/telemetry.prom: Prometheus text-format gauges for the latest
+    run of each harness (for node_exporter's textfile collector), e.g.
+    mini_crs_afl_execs_per_sec{harness="heap_overflow_afl"} 1843.2
+
+Both files are replaced atomically. A summary table, slowest harness first,
+is printed; harnesses with low stability are flagged.
+
+Usage:
+  python3 fuzzer/telemetry.py [--jsonl PATH] [--prom PATH]
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from collect_crashes import FUZZER_DIR, index_output_dirs
+
+ROOT = Path(__file__).resolve().parent.parent
+LOG_DIR = ROOT / "fuzzer" / "logs"
+DEFAULT_JSONL = LOG_DIR / "telemetry.jsonl"
+DEFAULT_PROM = LOG_DIR / "telemetry.prom"
+METRIC_PREFIX = "mini_crs_afl_"
+# Below this stability (percent) a harness is flagged as non-deterministic.
+STABILITY_WARN = 90.0
+
+# Column and key names changed in AFL++ 4.x; map the old ones to the new ones.
+_RENAMED = {
+    "paths_total": "corpus_count",
+    "cur_path": "cur_item",
+    "unique_crashes": "saved_crashes",
+    "unique_hangs": "saved_hangs",
+}
+# (metric, fuzzer_stats key, help text) exported to Prometheus.
+PROM_METRICS = [
+    ("execs_per_sec", "execs_per_sec", "Executions per second, averaged over the run."),
+    ("execs_done", "execs_done", "Total target executions."),
+    ("bitmap_coverage_percent", "bitmap_cvg", "Share of the coverage bitmap hit."),
+    ("edges_found", "edges_found", "Instrumented edges reached."),
+    ("stability_percent", "stability", "Share of edges that behave deterministically."),
+    ("corpus_count", "corpus_count", "Inputs in the queue."),
+    ("saved_crashes", "saved_crashes", "Unique crashes saved."),
+    ("saved_hangs", "saved_hangs", "Unique hangs saved."),
+    ("run_time_seconds", "run_time", "Seconds the instance has been fuzzing."),
+    ("last_update_timestamp_seconds", "last_update", "Unix time of the last fuzzer_stats update."),
+]
+
+
+def _number(raw: str) -> Optional[float]:
+    try:
+        return float(raw.strip().rstrip("%"))
+    except ValueError:
+        return None
+
+
+def _normalize(values: Dict[str, float]) -> Dict[str, float]:
+    for old, new in _RENAMED.items():
+        if old in values and new not in values:
+            values[new] = values.pop(old)
+    # plot_data calls bitmap coverage map_size.
+    if "map_size" in values and "bitmap_cvg" not in values:
+        values["bitmap_cvg"] = values.pop("map_size")
+    return values
+
+
+def read_fuzzer_stats(out_dir: Path) -> Optional[Dict[str, float]]:
+    """Numeric fields of <out_dir>/default/fuzzer_stats; None if AFL++ has not written it yet."""
+    try:
+        text = (out_dir / "default" / "fuzzer_stats").read_text(errors="replace")
+    except OSError:
+        return None
+    values: Dict[str, float] = {}
+    for line in text.splitlines():
+        key, sep, raw = line.partition(":")
+        if not sep:
+            continue
+        number = _number(raw)
+        if number is not None:
+            values[key.strip()] = number
+    return _normalize(values)
+
+
+def _plot_columns(header: str) -> Optional[List[str]]:
+    if not header.startswith("#"):
+        return None
+    return [name.strip() for name in header.lstrip("#").split(",")]
+
+
+def _plot_row(columns: List[str], line: str) -> Dict[str, float]:
+    values: Dict[str, float] = {}
+    for name, raw in zip(columns, line.split(",")):
+        number = _number(raw)
+        if number is not None:
+            values[name] = number
+    return _normalize(values)
+
+
+def read_plot_data(out_dir: Path) -> List[Dict[str, float]]:
+    """Every sample of <out_dir>/default/plot_data keyed by (4.x) column name."""
+    try:
+        lines = (out_dir / "default" / "plot_data").read_text(errors="replace").splitlines()
+    except OSError:
+        return []
+    columns = _plot_columns(lines[0]) if lines else None
+    if columns is None:
+        return []
+    return [_plot_row(columns, line) for line in lines[1:] if line.strip() and not line.startswith("#")]
+
+
+def latest_plot_row(out_dir: Path) -> Optional[Dict[str, float]]:
+    """Last sample of plot_data without reading the whole file; None until AFL++ wrote one."""
+    path = out_dir / "default" / "plot_data"
+    try:
+        with path.open("rb") as f:
+            header = f.readline().decode(errors="replace")
+            f.seek(0, 2)
+            f.seek(max(0, f.tell() - 4096))
+            tail = f.read().decode(errors="replace").splitlines()
+    except OSError:
+        return None
+    columns = _plot_columns(header)
+    rows = [line for line in tail if line.strip() and not line.startswith("#")]
+    if columns is None or not rows:
+        return None
+    return _plot_row(columns, rows[-1])
+
+
+def sample_time(row: Dict[str, float], start_time: Optional[float]) -> Optional[float]:
+    """Unix time of a plot_data row (AFL++ 4.x logs seconds since start, older versions unix time)."""
+    if "unix_time" in row:
+        return row["unix_time"]
+    if "relative_time" in row and start_time is not None:
+        return start_time + row["relative_time"]
+    return None
+
+
+def collect_runs(fuzzer_dir: Path = FUZZER_DIR) -> List[Dict[str, object]]:
+    """One entry per output dir: harness, run dir, plot_data samples and fuzzer_stats snapshot."""
+    runs: List[Dict[str, object]] = []
+    for harness, out_dirs in sorted(index_output_dirs(fuzzer_dir).items()):
+        for out_dir in out_dirs:
+            stats = read_fuzzer_stats(out_dir)
+            samples = read_plot_data(out_dir)
+            if stats is None and not samples:
+                continue
+            try:
+                mtime = out_dir.stat().st_mtime
+            except OSError:
+                mtime = 0.0
+            runs.append({"harness": harness, "run": out_dir.name, "samples": samples, "stats": stats, "mtime": mtime})
+    return runs
+
+
+def telemetry_records(runs: List[Dict[str, object]]) -> List[Dict[str, object]]:
+    records: List[Dict[str, object]] = []
+    for run in runs:
+        stats: Optional[Dict[str, float]] = run["stats"]  # type: ignore[assignment]
+        start_time = stats.get("start_time") if stats else None
+        for row in run["samples"]:  # type: ignore[attr-defined]
+            record: Dict[str, object] = {"kind": "sample", "harness": run["harness"], "run": run["run"]}
+            record["time"] = sample_time(row, start_time)
+            record.update(row)
+            records.append(record)
+        if stats:
+            record = {"kind": "snapshot", "harness": run["harness"], "run": run["run"]}
+            record["time"] = stats.get("last_update")
+            record.update(stats)
+            records.append(record)
+    return records
+
+
+def run_updated(run: Dict[str, object]) -> float:
+    """When a run was last active: fuzzer_stats last_update, else start_time, else its dir's mtime."""
+    stats: Dict[str, float] = run["stats"] or {}  # type: ignore[assignment]
+    for key in ("last_update", "start_time"):
+        if stats.get(key):
+            return stats[key]
+    return float(run["mtime"])  # type: ignore[arg-type]
+
+
+def latest_stats(runs: List[Dict[str, object]]) -> Dict[str, Dict[str, float]]:
+    """
+    fuzzer_stats of the most recently updated run per harness. Dir names do not
+    order runs: the persistent out-<harness> of resume mode sorts before the
+    timestamped dirs of older runs.
+    """
+    newest: Dict[str, Dict[str, object]] = {}
+    for run in runs:
+        harness = str(run["harness"])
+        if run["stats"] and (harness not in newest or run_updated(run) >= run_updated(newest[harness])):
+            newest[harness] = run
+    return {harness: run["stats"] for harness, run in newest.items()}  # type: ignore[misc]
+
+
+def prometheus_text(latest: Dict[str, Dict[str, float]]) -> str:
+    lines: List[str] = []
+    for metric, key, help_text in PROM_METRICS:
+        name = METRIC_PREFIX + metric
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for harness, stats in sorted(latest.items()):
+            if key in stats:
+                lines.append(f'{name}{{harness="{harness}"}} {stats[key]:g}')
+    return "\n".join(lines) + "\n"
+
+
+def write_atomic(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+def print_summary(latest: Dict[str, Dict[str, float]]) -> None:
+    print(f"[telemetry] {'harness':<28} {'execs/s':>10} {'bitmap':>8} {'stability':>10} {'corpus':>7} {'crashes':>8}")
+    for harness, stats in sorted(latest.items(), key=lambda item: item[1].get("execs_per_sec", 0.0)):
+        stability = stats.get("stability")
+        flag = "  <- unstable" if stability is not None and stability < STABILITY_WARN else ""
+        print(
+            f"[telemetry] {harness:<28} {stats.get('execs_per_sec', 0.0):>10.1f} "
+            f"{stats.get('bitmap_cvg', 0.0):>7.2f}% "
+            f"{'n/a' if stability is None else f'{stability:.2f}%':>10} "
+            f"{int(stats.get('corpus_count', 0)):>7} {int(stats.get('saved_crashes', 0)):>8}{flag}"
+        )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Export AFL++ telemetry as JSON lines and a Prometheus text file.")
+    parser.add_argument("--jsonl", type=Path, default=DEFAULT_JSONL, help="time series output (JSON lines)")
+    parser.add_argument("--prom", type=Path, default=DEFAULT_PROM, help="Prometheus text-file output")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    runs = collect_runs()
+    if not runs:
+        print("[telemetry] No AFL++ stats found under fuzzer/out-*")
+        return
+    records = telemetry_records(runs)
+    write_atomic(args.jsonl, "".join(json.dumps(record) + "\n" for record in records))
+    latest = latest_stats(runs)
+    write_atomic(args.prom, prometheus_text(latest))
+    print_summary(latest)
+    print(f"[telemetry] {len(records)} records from {len(runs)} runs written to {args.jsonl} and {args.prom}")
+
+
+if __name__ == "__main__":
+    main()
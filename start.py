@@ -1,27 +1,90 @@
 #!/usr/bin/env python3
 """
-Orchestrates a build check and code database generation for the ossfuzz-target project.
+Orchestrates the mini-crs pipeline for the ossfuzz-target project.
+
+Stages, in order: build check, code DB, static analysis, harness generation,
+AFL++ fuzzing and crash collection. Each stage declares the files it reads and
+writes; their hashes are recorded in out/stage_manifest.json after the stage
+succeeds, and a stage whose inputs (and outputs) still match is skipped.
+
+Setting code_db_sqlite in config.yml (e.g. code-db-builder/code_db.sqlite)
+also writes the code DB as an indexed SQLite store, which the static analysis
+then queries instead of parsing the JSON.
+
+With --profile every stage that runs is accounted: wall time, user/sys CPU of
+this process and its children (getrusage), peak RSS (wait4 for commands, the
+process high-water mark for in-process stages) and bytes read and written
+(/proc/self/io, which includes reaped children). The report is written to
+out/profile/run-<timestamp>.json (and out/profile/latest.json) for comparison
+across runs. --cprofile also dumps cProfile stats of in-process stages (the
+code DB) to out/profile/<stage>.prof. Work done inside docker containers is
+not a child of this process and only shows up in the wall time.
+
+An output path ending in .ndjson writes the code DB line-delimited (one file
+record per line, see build_code_db.py), which the later stages read one file
+at a time.
+
+With --pipelined the stages after the code DB run concurrently (asyncio)
+instead of one after another: SARIF results are mapped to functions as they
+are read, each new function gets its harness right away, each harness is
+built and fuzzed as soon as an AFL++ slot (one per CPU, or afl_jobs) is free,
+and collect_crashes.py --watch records crashes while the fuzzers run; the
+triaged crash report is written once they are done. For the manifest the four
+stages are one "pipelined" stage. Every command runs in its own process
+group: on Ctrl-C/SIGTERM or when one step fails, the others are cancelled
+and their processes (and AFL++ containers) are stopped. afl_budget bandit is
+not available in this mode, as the number of harnesses is not known up front.
+The AFL++ settings are resolved once (fuzzer/Afl++/afl_config.sh); with
+afl_pool (the default) every slot is a warm worker container, started while
+CodeQL runs, that its harnesses are run in with docker exec.
 
 Usage:
-  python3 start.py [path-to-project] [output-json]
+  python3 start.py [path-to-project] [output-json] [--jobs N] [--quiet]
+                   [--force] [--from-stage STAGE] [--pipelined]
+                   [--profile] [--cprofile]
 
 Defaults:
   project path: ./ossfuzz-target
   output json:  ./code-db-builder/code_db.json
+  --jobs:       1 (code DB parser worker processes; 0 = one per CPU)
+  --quiet:      do not echo the code DB to stdout
+  --force:      run every stage regardless of the manifest
+  --from-stage: run STAGE and all later stages even if cached
+  --pipelined:  overlap static analysis, harnesses, fuzzing and crash collection
+  --profile:    record per-stage resource usage in out/profile/
 """
 
+import argparse
+import asyncio
+import cProfile
+import hashlib
 import json
+import os
+import platform
+import resource
+import signal
 import subprocess
 import sys
+import threading
+import time
 from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
 # Allow imports from code-db-builder
 ROOT = Path(__file__).resolve().parent
 CODE_DB_DIR = ROOT / "code-db-builder"
 CONFIG_PATH = ROOT / "config.yml"
+MANIFEST_PATH = ROOT / "out" / "stage_manifest.json"
+MANIFEST_VERSION = 1
+PROFILE_DIR = ROOT / "out" / "profile"
+PROFILE_VERSION = 1
 sys.path.insert(0, str(CODE_DB_DIR))
+sys.path.insert(0, str(ROOT / "static-analyzer"))
+sys.path.insert(0, str(ROOT / "fuzzer"))
 
 import build_code_db  # type: ignore  # noqa: E402
+import generate_harnesses as harness_generator  # type: ignore  # noqa: E402
+import run_static_analysis as static_analysis  # type: ignore  # noqa: E402
 
 
 def load_config() -> dict:
@@ -30,6 +93,8 @@ def load_config() -> dict:
         "json_path": str(CODE_DB_DIR / "code_db.json"),
         "vuln_output": str(ROOT / "static-analyzer" / "vulnerable_functions.json"),
         "crash_report": str(ROOT / "fuzzer" / "crashes_report.json"),
+        # Optional indexed SQLite copy of the code DB; empty = not written.
+        "code_db_sqlite": "",
     }
     if not CONFIG_PATH.exists():
         return cfg
@@ -49,106 +114,1014 @@ def load_config() -> dict:
             cfg["vuln_output"] = value
         if key == "crash_report" and value:
             cfg["crash_report"] = value
+        if key == "code_db_sqlite":
+            cfg["code_db_sqlite"] = value
     return cfg
 
 
+# Peak RSS (kB) of each command run_command reaped; run_stages reads it per stage.
+_CHILD_PEAKS: List[int] = []
+
+
+def run_command(args: Sequence[str], **kwargs) -> int:
+    """Run a command to completion and return its exit code, recording its peak RSS via wait4."""
+    proc = subprocess.Popen(args, **kwargs)
+    try:
+        _, status, usage = os.wait4(proc.pid, 0)
+    except BaseException:
+        proc.kill()
+        proc.wait()
+        raise
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    _CHILD_PEAKS.append(usage.ru_maxrss)
+    return proc.returncode
+
+
 def run_check_build() -> None:
     script = ROOT / "builder" / "check_build.sh"
     if not script.exists():
         raise SystemExit(f"[build] Missing build check script at {script}")
     print(f"[build] Running {script} ...")
-    result = subprocess.run(["bash", str(script)], cwd=ROOT)
-    if result.returncode != 0:
-        raise SystemExit(f"[build] Build check failed with exit code {result.returncode}")
+    returncode = run_command(["bash", str(script)], cwd=ROOT)
+    if returncode != 0:
+        raise SystemExit(f"[build] Build check failed with exit code {returncode}")
     print("[build] Build check succeeded.")
 
 
-def generate_code_db(target: Path, out_path: Path) -> None:
+def generate_code_db(
+    target: Path, out_path: Path, jobs: int = 1, sqlite_path: Optional[Path] = None, quiet: bool = False
+) -> None:
     print(f"[code-db] Scanning {target} ...")
-    db = build_code_db.build_db(target)
-    out_path.write_text(json.dumps(db, indent=2) + "\n")
-    print(f"[code-db] Wrote JSON to {out_path}")
-    # Also echo JSON to stdout for immediate visibility.
-    json.dump(db, sys.stdout, indent=2)
-    sys.stdout.write("\n")
+    sys.stdout.flush()
+    records = build_code_db.iter_db(target, cache_path=build_code_db.default_cache_path(out_path), jobs=jobs)
+    ndjson = build_code_db.is_ndjson_path(out_path)
+    # Records go to the file, the stdout echo (for immediate visibility) and the store as each file is parsed.
+    build_code_db.write_db(records, str(target), out_path, quiet=quiet, sqlite_path=sqlite_path)
+    print(f"[code-db] Wrote {'NDJSON' if ndjson else 'JSON'} to {out_path}")
+    if sqlite_path is not None:
+        print(f"[code-db] Wrote SQLite store to {sqlite_path}")
 
 
-def main() -> None:
-    args = sys.argv[1:]
-    config = load_config()
-    default_out = ROOT / config["json_path"]
-    default_vuln_out = ROOT / config["vuln_output"]
-    default_crash_report = ROOT / config["crash_report"]
-    harness_index = ROOT / "fuzzer" / "harnesses.json"
+# Directory entries never hashed as stage inputs: build products and caches.
+HASH_SKIP_DIRS = {"out", "__pycache__", ".git"}
+HASH_SKIP_SUFFIXES = {".o", ".a", ".so", ".pyc"}
 
-    target = Path(args[0]) if len(args) >= 1 else ROOT / "ossfuzz-target"
-    out_path = Path(args[1]) if len(args) >= 2 else default_out
+StagePath = Union[Path, str]
+
+
+def hash_path(path: Path) -> str:
+    """Content hash of a file, or of every file below a directory (by relative path)."""
+    try:
+        if path.is_file():
+            digest = hashlib.sha256()
+            with path.open("rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+            return digest.hexdigest()
+        if not path.is_dir():
+            return "missing"
+        digest = hashlib.sha256()
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames[:] = sorted(d for d in dirnames if d not in HASH_SKIP_DIRS)
+            for name in sorted(filenames):
+                if os.path.splitext(name)[1] in HASH_SKIP_SUFFIXES:
+                    continue
+                file_path = Path(dirpath, name)
+                digest.update(file_path.relative_to(path).as_posix().encode() + b"\0")
+                digest.update(hash_path(file_path).encode() + b"\n")
+        return digest.hexdigest()
+    except OSError:
+        # e.g. root-owned AFL output left by an old container run
+        return "unreadable"
+
+
+def expand_paths(paths: Sequence[StagePath]) -> List[Path]:
+    """Resolve stage paths; strings are glob patterns relative to ROOT, expanded at check time."""
+    expanded: List[Path] = []
+    for entry in paths:
+        if isinstance(entry, str):
+            expanded.extend(sorted(ROOT.glob(entry)))
+        else:
+            expanded.append(entry)
+    return expanded
+
+
+def display_path(path: Path) -> str:
+    try:
+        return path.resolve().relative_to(ROOT).as_posix()
+    except ValueError:
+        return str(path)
+
+
+class Stage:
+    """A pipeline step with the files it reads (`inputs`) and writes (`outputs`)."""
+
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[], None],
+        inputs: Sequence[StagePath],
+        outputs: Sequence[StagePath] = (),
+        params: Optional[Dict[str, str]] = None,
+        in_process: bool = False,
+    ) -> None:
+        self.name = name
+        self.run = run
+        self.inputs = inputs
+        self.outputs = outputs
+        self.params = params or {}
+        # Does its work in this interpreter (so cProfile can see it) rather than in a command.
+        self.in_process = in_process
+
+    def hash_inputs(self) -> Dict[str, str]:
+        return {display_path(path): hash_path(path) for path in expand_paths(self.inputs)}
+
+    def hash_outputs(self) -> Dict[str, str]:
+        return {display_path(path): hash_path(path) for path in expand_paths(self.outputs)}
+
+
+def load_manifest(path: Path) -> Dict[str, Dict]:
+    """Per-stage records from the last runs; an unreadable or outdated manifest is treated as empty."""
+    if not path.exists():
+        return {}
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, json.JSONDecodeError):
+        return {}
+    if data.get("version") != MANIFEST_VERSION:
+        return {}
+    return data.get("stages", {})
+
+
+def save_manifest(path: Path, stages: Dict[str, Dict]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps({"version": MANIFEST_VERSION, "stages": stages}, indent=2) + "\n")
+    os.replace(tmp_path, path)
+
+
+def stale_reason(stage: Stage, record: Optional[Dict], inputs: Dict[str, str]) -> Optional[str]:
+    """Why `stage` must run given its last manifest record, or None if it can be skipped."""
+    if record is None:
+        return "no previous run"
+    if record.get("params") != stage.params:
+        return "parameters changed"
+    previous = record.get("inputs", {})
+    changed = sorted(path for path in set(inputs) | set(previous) if inputs.get(path) != previous.get(path))
+    if changed:
+        more = f" (+{len(changed) - 3} more)" if len(changed) > 3 else ""
+        return "inputs changed: " + ", ".join(changed[:3]) + more
+    if record.get("outputs", {}) != stage.hash_outputs():
+        return "outputs missing or modified"
+    return None
+
+
+def read_proc_io() -> Dict[str, int]:
+    """I/O counters of this process from /proc/self/io (empty where unavailable)."""
+    try:
+        text = Path("/proc/self/io").read_text()
+    except OSError:
+        return {}
+    counters: Dict[str, int] = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(":")
+        counters[key.strip()] = int(value)
+    return counters
 
-    if not target.exists():
-        raise SystemExit(f"[code-db] Target path does not exist: {target}")
 
-    run_check_build()
-    generate_code_db(target, out_path)
+def resource_snapshot() -> Dict[str, float]:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    snapshot: Dict[str, float] = {
+        "wall": time.monotonic(),
+        "user": own.ru_utime + children.ru_utime,
+        "sys": own.ru_stime + children.ru_stime,
+        "self_maxrss": own.ru_maxrss,
+        "children_maxrss": children.ru_maxrss,
+    }
+    snapshot.update(read_proc_io())
+    return snapshot
+
+
+def stage_usage(
+    stage: Stage, before: Dict[str, float], after: Dict[str, float], child_peaks: List[int]
+) -> Dict[str, object]:
+    """
+    Resources a stage used between two snapshots; RSS in kB, I/O in bytes.
+
+    Linux starts a forked child's ru_maxrss at the parent's RSS, so a command's
+    peak is never reported below what this process held when it was spawned.
+    """
+    peaks = list(child_peaks)
+    if after["children_maxrss"] > before["children_maxrss"]:
+        # e.g. code DB worker processes, reaped by the pool rather than run_command
+        peaks.append(int(after["children_maxrss"]))
+    if stage.in_process:
+        # ru_maxrss is a high-water mark: exact if the stage raised it, an upper bound otherwise.
+        peaks.append(int(after["self_maxrss"]))
+    usage: Dict[str, object] = {
+        "wall_seconds": round(after["wall"] - before["wall"], 3),
+        "user_seconds": round(after["user"] - before["user"], 3),
+        "sys_seconds": round(after["sys"] - before["sys"], 3),
+        "max_rss_kb": max(peaks) if peaks else None,
+    }
+    # read_bytes/write_bytes hit storage; rchar/wchar count every read()/write() incl. page cache and pipes.
+    io_fields = (
+        ("read_bytes", "read_bytes"),
+        ("write_bytes", "write_bytes"),
+        ("rchar", "read_chars"),
+        ("wchar", "write_chars"),
+    )
+    for key, name in io_fields:
+        if key in before and key in after:
+            usage[name] = int(after[key] - before[key])
+    return usage
+
+
+def run_stage_profiled(stage: Stage, cprofile_dir: Optional[Path]) -> Dict[str, object]:
+    """Run a stage and return its resource usage; in-process stages are run under cProfile if requested."""
+    del _CHILD_PEAKS[:]
+    before = resource_snapshot()
+    if cprofile_dir is not None and stage.in_process:
+        profiler = cProfile.Profile()
+        profiler.runcall(stage.run)
+        cprofile_dir.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(str(cprofile_dir / f"{stage.name}.prof"))
+    else:
+        stage.run()
+    after = resource_snapshot()
+    return stage_usage(stage, before, after, _CHILD_PEAKS)
+
 
+def run_stages(
+    stages: List[Stage],
+    manifest_path: Path,
+    force: bool = False,
+    from_stage: Optional[str] = None,
+    profile: bool = False,
+    cprofile_dir: Optional[Path] = None,
+) -> List[Dict[str, object]]:
+    """
+    Run stages in order, skipping those whose inputs match the last successful run.
+
+    `force` runs everything; `from_stage` runs that stage and every later one.
+    The manifest is saved after each successful stage so a failure keeps the
+    records of the stages before it. Returns one summary row per stage; with
+    `profile` the rows of stages that ran carry a "usage" dict.
+    """
+    records = load_manifest(manifest_path)
+    names = [stage.name for stage in stages]
+    first_forced = names.index(from_stage) if from_stage is not None else len(stages)
+    summary: List[Dict[str, object]] = []
+    for position, stage in enumerate(stages):
+        inputs = stage.hash_inputs()
+        if force or position >= first_forced:
+            reason: Optional[str] = "forced"
+        else:
+            reason = stale_reason(stage, records.get(stage.name), inputs)
+        if reason is None:
+            print(f"[pipeline] {stage.name}: inputs unchanged, skipping")
+            summary.append({"stage": stage.name, "status": "cached", "seconds": 0.0})
+            continue
+        print(f"[pipeline] {stage.name}: running ({reason})")
+        started = time.monotonic()
+        usage = run_stage_profiled(stage, cprofile_dir) if profile else None
+        if usage is None:
+            stage.run()
+        elapsed = time.monotonic() - started
+        records[stage.name] = {
+            "inputs": inputs,
+            "outputs": stage.hash_outputs(),
+            "params": stage.params,
+            "completed_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        save_manifest(manifest_path, records)
+        row: Dict[str, object] = {"stage": stage.name, "status": "ran", "reason": reason, "seconds": elapsed}
+        if usage is not None:
+            row["usage"] = usage
+        summary.append(row)
+    return summary
+
+
+def print_summary(summary: List[Dict[str, object]]) -> None:
+    cached = sum(1 for row in summary if row["status"] == "cached")
+    print(f"[pipeline] Stage summary ({cached}/{len(summary)} cached):")
+    for row in summary:
+        detail = "cached" if row["status"] == "cached" else f"ran in {row['seconds']:.1f}s ({row['reason']})"
+        print(f"[pipeline]   {row['stage']:<16} {detail}")
+        usage: Dict = row.get("usage") or {}
+        if usage:
+            rss = usage["max_rss_kb"]
+            print(
+                f"[pipeline]   {'':<16} cpu user {usage['user_seconds']:.1f}s sys {usage['sys_seconds']:.1f}s, "
+                f"peak rss {'n/a' if rss is None else f'{rss / 1024:.1f} MiB'}, "
+                f"read {usage.get('read_chars', 0) / 1e6:.1f} MB, written {usage.get('write_chars', 0) / 1e6:.1f} MB"
+            )
+
+
+def write_run_report(summary: List[Dict[str, object]], argv: List[str], started_at: str, profile_dir: Path) -> Path:
+    """Save the profiled run as out/profile/run-<timestamp>.json and latest.json; returns the former."""
+    report = {
+        "version": PROFILE_VERSION,
+        "started_at": started_at,
+        "argv": argv,
+        "host": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        "stages": [],
+    }
+    for row in summary:
+        entry: Dict[str, object] = {"stage": row["stage"], "status": row["status"], "reason": row.get("reason")}
+        # Cached stages did no work; only stages that ran carry usage.
+        entry.update(row.get("usage") or {"wall_seconds": 0.0})  # type: ignore[arg-type]
+        report["stages"].append(entry)  # type: ignore[attr-defined]
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    text = json.dumps(report, indent=2) + "\n"
+    path = profile_dir / f"run-{started_at.replace(':', '').replace('-', '')}.json"
+    path.write_text(text)
+    tmp_path = profile_dir / "latest.json.tmp"
+    tmp_path.write_text(text)
+    os.replace(tmp_path, profile_dir / "latest.json")
+    return path
+
+
+def run_static_analysis(code_db: Path, sarif_path: Path, vuln_out: Path) -> None:
     # Run static analyzer via dockerized CodeQL
     print("[static-analyzer] Running static analysis via CodeQL docker...")
-    vuln_out = default_vuln_out
-    result = subprocess.run(
+    returncode = run_command(
         [
             "python3",
             "static-analyzer/run_static_analysis.py",
-            str(out_path),
-            str(ROOT / "out" / "findings.sarif"),
+            str(code_db),
+            str(sarif_path),
             str(vuln_out),
         ],
         cwd=ROOT,
     )
-    if result.returncode != 0:
-        raise SystemExit(f"[static-analyzer] Static analysis failed with exit code {result.returncode}")
+    if returncode != 0:
+        raise SystemExit(f"[static-analyzer] Static analysis failed with exit code {returncode}")
     print(f"[static-analyzer] Vulnerable functions written to {vuln_out}")
 
+
+def generate_harnesses(harness_index: Path) -> None:
     # Generate harnesses based on vulnerable functions
     print("[harness] Generating AFL++ harnesses from vulnerable_functions.json ...")
-    result = subprocess.run(
+    returncode = run_command(
         ["python3", "fuzzer/generate_harnesses.py"],
         cwd=ROOT,
     )
-    if result.returncode != 0:
-        raise SystemExit(f"[harness] Harness generation failed with exit code {result.returncode}")
+    if returncode != 0:
+        raise SystemExit(f"[harness] Harness generation failed with exit code {returncode}")
     print(f"[harness] Harness index written to {harness_index}")
 
+
+def run_fuzzers() -> None:
     # Run AFL++ across all harnesses
     print("[fuzz] Running AFL++ on all harnesses (see fuzzer/out-* for results)...")
-    result = subprocess.run(
+    returncode = run_command(
         ["bash", "fuzzer/Afl++/run_afl_all.sh"],
         cwd=ROOT,
     )
-    if result.returncode != 0:
-        raise SystemExit(f"[fuzz] AFL++ run failed with exit code {result.returncode}")
-    print("[fuzz] AFL++ runs started/completed (check fuzzer/out-*).")
+    if returncode != 0:
+        raise SystemExit(f"[fuzz] AFL++ run failed with exit code {returncode}")
+    print("[fuzz] AFL++ runs completed (check fuzzer/out-*).")
+    # Per-harness execs/sec, coverage and stability; export failures are not fatal.
+    run_command(["python3", "fuzzer/telemetry.py"], cwd=ROOT)
 
-    # Collect crash reports
-    print("[crash] Collecting crash reports from AFL++ outputs ...")
-    result = subprocess.run(
-        ["python3", "fuzzer/collect_crashes.py", str(default_crash_report)],
+
+def collect_crash_reports(crash_report: Path) -> None:
+    # Collect crash reports, deduplicated by sanitizer stack hash
+    print("[crash] Collecting and triaging crash reports from AFL++ outputs ...")
+    returncode = run_command(
+        ["python3", "fuzzer/collect_crashes.py", "--triage", str(crash_report)],
         cwd=ROOT,
-        capture_output=True,
-        text=True,
     )
-    sys.stdout.write(result.stdout)
-    sys.stderr.write(result.stderr)
-    if result.returncode != 0:
-        raise SystemExit(f"[crash] Crash collection failed with exit code {result.returncode}")
+    if returncode != 0:
+        raise SystemExit(f"[crash] Crash collection failed with exit code {returncode}")
     try:
-        with open(default_crash_report, "r") as f:
+        with open(crash_report, "r") as f:
             data = json.load(f)
         total_crashes = sum(len(h.get("crashes", [])) for h in data.get("harnesses", []))
     except Exception:
         total_crashes = None
     if total_crashes is None:
-        print(f"[crash] Crash summary written to {default_crash_report}")
+        print(f"[crash] Crash summary written to {crash_report}")
     else:
-        print(f"[crash] Crash summary written to {default_crash_report} (total crashes: {total_crashes})")
+        print(f"[crash] Crash summary written to {crash_report} (total crashes: {total_crashes})")
+
+
+# --- Pipelined mode (--pipelined) -------------------------------------------------------------
+
+# Stages --pipelined overlaps; they run as the single "pipelined" stage.
+PIPELINED_STAGES = ["static-analysis", "harness", "fuzz", "crash"]
+AFL_LOG_DIR = ROOT / "fuzzer" / "logs"
+AFL_SCRIPTS = "fuzzer/Afl++"
+
+
+class PipelineError(Exception):
+    """A pipelined step failed; raised inside tasks so the orchestrator can shut the others down."""
+
+
+def _signal_group(pid: int, sig: int) -> None:
+    try:
+        os.killpg(pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class ChildProcesses:
+    """
+    Commands started by the pipelined orchestrator.
+
+    Each command runs in its own session, so its whole process group (bash,
+    docker client, helpers) can be signalled. A command whose awaiting task is
+    cancelled is stopped: SIGTERM to the group (docker run forwards it to the
+    container, afl_pool.sh exec to its job, where afl-fuzz shuts down cleanly),
+    SIGKILL after GRACE seconds, then its container, if any, is removed.
+    """
+
+    GRACE = 15.0
+
+    def __init__(self) -> None:
+        self.running: Dict[int, "asyncio.subprocess.Process"] = {}
+
+    async def start(self, args: Sequence[str], **kwargs) -> "asyncio.subprocess.Process":
+        proc = await asyncio.create_subprocess_exec(*args, start_new_session=True, **kwargs)
+        self.running[proc.pid] = proc
+        return proc
+
+    async def wait(self, proc: "asyncio.subprocess.Process", container: str = "") -> int:
+        try:
+            returncode = await proc.wait()
+        except asyncio.CancelledError:
+            await self.stop(proc, container=container)
+            raise
+        self.running.pop(proc.pid, None)
+        return returncode
+
+    async def run(self, args: Sequence[str], container: str = "", **kwargs) -> int:
+        return await self.wait(await self.start(args, **kwargs), container)
+
+    async def stop(self, proc: "asyncio.subprocess.Process", sig: int = signal.SIGTERM, container: str = "") -> None:
+        if proc.returncode is None:
+            _signal_group(proc.pid, sig)
+            try:
+                await asyncio.wait_for(proc.wait(), self.GRACE)
+            except asyncio.TimeoutError:
+                _signal_group(proc.pid, signal.SIGKILL)
+                await proc.wait()
+        self.running.pop(proc.pid, None)
+        if container:
+            try:
+                remover = await asyncio.create_subprocess_exec(
+                    "docker", "rm", "-f", container, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                )
+                await remover.wait()
+            except OSError:
+                pass
+
+    def kill_all(self) -> None:
+        """Last resort when the orchestrator exits: kill whatever is still running."""
+        for pid in list(self.running):
+            _signal_group(pid, signal.SIGKILL)
+        self.running.clear()
+
+
+class Timeline:
+    """When each pipelined stage was first and last active, and first-event milestones."""
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.spans: Dict[str, List[float]] = {}
+        self.firsts: Dict[str, float] = {}
+
+    def touch(self, stage: str) -> None:
+        now = time.monotonic() - self.started
+        self.spans.setdefault(stage, [now, now])[1] = now
+
+    def first(self, event: str) -> None:
+        if event not in self.firsts:
+            self.firsts[event] = time.monotonic() - self.started
+            print(f"[pipeline] First {event} after {self.firsts[event]:.1f}s", flush=True)
+
+
+def parse_cpu_list(spec: str) -> List[int]:
+    """Expand an AFL_CPUS list such as "0-3,8"."""
+    cpus: List[int] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if "-" in part:
+            first, last = part.split("-", 1)
+            cpus.extend(range(int(first), int(last) + 1))
+        elif part:
+            cpus.append(int(part))
+    return cpus
+
+
+def afl_settings() -> Dict[str, str]:
+    """AFL_* campaign settings from the environment and config.yml, resolved once by afl_config.sh."""
+    result = subprocess.run(
+        ["bash", f"{AFL_SCRIPTS}/afl_config.sh"], cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"[pipeline] Could not read the AFL++ settings: {result.stderr.strip()}")
+    settings: Dict[str, str] = {}
+    for line in result.stdout.splitlines():
+        key, sep, value = line.partition("=")
+        if sep:
+            settings[key] = value
+    return settings
+
+
+def afl_slots(afl: Dict[str, str]) -> List[Optional[int]]:
+    """One entry per concurrent AFL++ instance: its CPU, or None unpinned (same rules as run_afl_all.sh)."""
+    cpus = parse_cpu_list(os.environ["AFL_CPUS"]) if os.environ.get("AFL_CPUS") else list(range(os.cpu_count() or 1))
+    jobs = int(afl["AFL_JOBS"] or 0)
+    pin = os.environ.get("AFL_PIN", "1") == "1"
+    if jobs <= 0 or (pin and jobs > len(cpus)):
+        # Pinned instances never share a CPU, so there is at most one slot per CPU.
+        jobs = len(cpus)
+    return [cpus[slot] if pin else None for slot in range(jobs)]
+
+
+async def stream_findings(
+    children: ChildProcesses,
+    analysis_db: Path,
+    vuln_out: Path,
+    sarif_path: Path,
+    functions: "asyncio.Queue[Optional[str]]",
+    timeline: Timeline,
+) -> int:
+    """Run CodeQL, then map SARIF results to functions in a thread, queueing each function as it is found."""
+    timeline.touch("static-analysis")
+    print("[static-analyzer] Running CodeQL via docker image mini-crs-codeql...", flush=True)
+    returncode = await children.run(static_analysis.codeql_command(), cwd=ROOT)
+    if returncode != 0:
+        raise PipelineError(f"[static-analyzer] CodeQL run failed with exit code {returncode}")
+    if not sarif_path.exists():
+        raise PipelineError(f"[static-analyzer] SARIF report not found at {sarif_path}")
+    loop = asyncio.get_running_loop()
+    cancelled = threading.Event()
+
+    def forward(findings: Iterable[Dict[str, object]]) -> Iterator[Dict[str, object]]:
+        for finding in findings:
+            if cancelled.is_set():
+                raise PipelineError("[static-analyzer] Cancelled")
+            if finding.get("function"):
+                loop.call_soon_threadsafe(functions.put_nowait, str(finding["function"]))
+            yield finding
+
+    def write_findings() -> int:
+        project_root, index = static_analysis.load_code_db(analysis_db)
+        findings = static_analysis.iter_findings(sarif_path, project_root, index)
+        vuln_out.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = vuln_out.with_name(vuln_out.name + ".tmp")
+        try:
+            with tmp_path.open("w") as out:
+                count = static_analysis.write_json_array(
+                    forward(static_analysis.with_instant_crash(findings, index)), [out]
+                )
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        os.replace(tmp_path, vuln_out)
+        return count
+
+    try:
+        count = await asyncio.to_thread(write_findings)
+    except asyncio.CancelledError:
+        cancelled.set()
+        raise
+    finally:
+        functions.put_nowait(None)
+    timeline.touch("static-analysis")
+    print(f"[static-analyzer] Wrote {count} findings to {vuln_out}", flush=True)
+    return count
+
+
+async def start_workers(children: ChildProcesses, cpus: List[Optional[int]], workers: List[str]) -> None:
+    """Start one warm AFL++ worker container per slot (afl_pool.sh), adding each to workers."""
+    for slot, cpu in enumerate(cpus):
+        worker = f"mini-crs-afl-worker-{os.getpid()}-{slot}"
+        workers.append(worker)
+        args = ["bash", f"{AFL_SCRIPTS}/afl_pool.sh", "start", worker, "" if cpu is None else str(cpu)]
+        if await children.run(args, cwd=ROOT) != 0:
+            raise PipelineError(f"[afl] Could not start worker {worker}")
+
+
+async def stop_workers(children: ChildProcesses, workers: List[str]) -> None:
+    if workers:
+        await children.run(["bash", f"{AFL_SCRIPTS}/afl_pool.sh", "stop", *workers], cwd=ROOT)
+
+
+async def fuzz_harness(
+    children: ChildProcesses,
+    harness: str,
+    slots: "asyncio.Queue[Tuple[Optional[int], str]]",
+    afl: Dict[str, str],
+    timeline: Timeline,
+) -> bool:
+    """
+    Build and fuzz one harness with run_afl.sh once a slot is free; True if it succeeded.
+
+    A slot is a CPU (None when unpinned) and, with the worker pool, the worker
+    container the harness runs in.
+    """
+    cpu, worker = await slots.get()
+    try:
+        name = Path(harness).stem
+        resume = afl["AFL_RESUME"] == "1"
+        outdir = f"/workspace/fuzzer/out-{name}" if resume else f"/workspace/fuzzer/out-{name}-{int(time.time())}"
+        # A pool job is stopped by its run_afl.sh; the worker itself stays until the campaign ends.
+        container = "" if worker else f"mini-crs-afl-{name}-{os.getpid()}"
+        log_path = AFL_LOG_DIR / f"{name}.log"
+        # AFL_CONFIG_RESOLVED keeps run_afl.sh from parsing config.yml again (afl_config.sh).
+        env = dict(os.environ, **afl, AFL_CONFIG_RESOLVED="1", AFL_NO_UI="1")
+        env.update(AFL_CONTAINER_NAME=container, AFL_WORKER=worker)
+        env.pop("AFL_CPU", None)
+        if cpu is not None:
+            env["AFL_CPU"] = str(cpu)
+        print(
+            f"[afl] Running harness {harness} -> {outdir}{'' if cpu is None else f' on CPU {cpu}'} "
+            f"(log: {display_path(log_path)})",
+            flush=True,
+        )
+        timeline.touch("fuzz")
+        timeline.first("fuzzer started")
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        with log_path.open("w") as log:
+            returncode = await children.run(
+                ["bash", f"{AFL_SCRIPTS}/run_afl.sh", harness, outdir],
+                container=container,
+                cwd=ROOT,
+                env=env,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+    finally:
+        slots.put_nowait((cpu, worker))
+    timeline.touch("fuzz")
+    if returncode != 0:
+        print(f"[afl] Harness {name} failed with exit code {returncode} (log: {display_path(log_path)})", file=sys.stderr)
+        return False
+    print(f"[afl] Finished {name}", flush=True)
+    return True
+
+
+async def generate_and_fuzz(
+    children: ChildProcesses,
+    functions: "asyncio.Queue[Optional[str]]",
+    harness_index: Path,
+    index_ready: asyncio.Event,
+    afl: Dict[str, str],
+    workers: List[str],
+    timeline: Timeline,
+) -> List[str]:
+    """
+    Write a harness for every new function as it is queued and start fuzzing it.
+
+    Functions that arrive together are handled as one batch, so the target
+    shim (which must list every function) is rewritten once per batch. The
+    harness index grows as harnesses are added and is left sorted like
+    generate_harnesses.py writes it. With afl_pool the worker containers are
+    started first, while CodeQL is still running, and listed in workers for
+    the caller to remove. Returns the harnesses whose fuzzing failed.
+    """
+    cfg = harness_generator.load_config()
+    target_src = Path(cfg["target_src"]).resolve()
+    if not target_src.exists():
+        raise PipelineError(f"[harness] target source not found: {target_src}")
+    include = harness_generator.relative_include(target_src)
+    cpus = afl_slots(afl)
+    if afl["AFL_POOL"] == "1":
+        await start_workers(children, cpus, workers)
+    slots: "asyncio.Queue[Tuple[Optional[int], str]]" = asyncio.Queue()
+    for slot, cpu in enumerate(cpus):
+        slots.put_nowait((cpu, workers[slot] if workers else ""))
+
+    harnesses: Dict[str, str] = {}
+    jobs: Dict[str, "asyncio.Task[bool]"] = {}
+    try:
+        done = False
+        while not done:
+            batch = [await functions.get()]
+            while not functions.empty():
+                batch.append(functions.get_nowait())
+            done = None in batch
+            new = sorted({func for func in batch if func is not None and func not in harnesses})
+            if not new:
+                continue
+            timeline.touch("harness")
+            for func in new:
+                harnesses[func] = ""
+            harness_generator.write_target_shim(sorted(harnesses), include)
+            for func in new:
+                harnesses[func] = harness_generator.write_harness(func).relative_to(ROOT).as_posix()
+            harness_generator.write_index(list(harnesses.values()))
+            index_ready.set()
+            timeline.first("harness written")
+            for func in new:
+                jobs[func] = asyncio.create_task(fuzz_harness(children, harnesses[func], slots, afl, timeline))
+        if not harnesses:
+            print("[harness] No functions found to generate harnesses for.")
+            return []
+        harness_generator.write_index([harnesses[func] for func in sorted(harnesses)])
+        timeline.touch("harness")
+        print(f"[harness] index written to {harness_index} ({len(harnesses)} harnesses)", flush=True)
+        results = await asyncio.gather(*jobs.values())
+    except BaseException:
+        for job in jobs.values():
+            job.cancel()
+        await asyncio.gather(*jobs.values(), return_exceptions=True)
+        raise
+    return [harnesses[func] for func, ok in zip(jobs, results) if not ok]
+
+
+async def watch_crashes(
+    children: ChildProcesses, crash_report: Path, index_ready: asyncio.Event, timeline: Timeline
+) -> None:
+    """Run collect_crashes.py --watch once the first harness exists, until cancelled (then SIGINT, which saves)."""
+    await index_ready.wait()
+    timeline.touch("crash")
+    proc = await children.start(
+        [sys.executable, "fuzzer/collect_crashes.py", "--watch", str(crash_report)],
+        cwd=ROOT,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    )
+    assert proc.stdout is not None
+
+    def show(raw: bytes) -> None:
+        line = raw.decode(errors="replace").rstrip()
+        if line.startswith("[watch] New crash"):
+            timeline.first("crash recorded")
+        print(line, flush=True)
+
+    try:
+        async for raw in proc.stdout:
+            show(raw)
+    finally:
+        # Cancelled once fuzzing is over (or on shutdown): on SIGINT the watcher writes its final report.
+        await children.stop(proc, signal.SIGINT)
+        for raw in (await proc.stdout.read()).splitlines():
+            show(raw)
+        timeline.touch("crash")
+
+
+async def run_pipeline(
+    analysis_db: Path,
+    sarif_path: Path,
+    vuln_out: Path,
+    harness_index: Path,
+    crash_report: Path,
+    afl: Dict[str, str],
+    timeline: Timeline,
+) -> List[str]:
+    """Static analysis, harness generation, fuzzing and live crash collection as concurrent tasks."""
+    children = ChildProcesses()
+    functions: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+    index_ready = asyncio.Event()
+    workers: List[str] = []
+    work = [
+        asyncio.create_task(stream_findings(children, analysis_db, vuln_out, sarif_path, functions, timeline)),
+        asyncio.create_task(
+            generate_and_fuzz(children, functions, harness_index, index_ready, afl, workers, timeline)
+        ),
+    ]
+    watcher = asyncio.create_task(watch_crashes(children, crash_report, index_ready, timeline))
+    loop = asyncio.get_running_loop()
+    main_task = asyncio.current_task()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, main_task.cancel)  # type: ignore[union-attr]
+    try:
+        _, failed = await asyncio.gather(*work)
+        return failed
+    except BaseException:
+        # A failed or interrupted step stops every other one and their child processes.
+        for task in work:
+            task.cancel()
+        await asyncio.gather(*work, return_exceptions=True)
+        raise
+    finally:
+        watcher.cancel()
+        await asyncio.gather(watcher, return_exceptions=True)
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(sig)
+        # Their jobs are done or stopped by now; nothing cancels this any more.
+        await stop_workers(children, workers)
+        children.kill_all()
+
+
+def run_pipelined(
+    analysis_db: Path,
+    sarif_path: Path,
+    vuln_out: Path,
+    harness_index: Path,
+    crash_report: Path,
+) -> None:
+    """The static-analysis, harness, fuzz and crash stages without barriers between them (--pipelined)."""
+    afl = afl_settings()
+    if afl["AFL_BUDGET"] != "fixed":
+        print("[pipeline] afl_budget bandit needs the harness count up front; using fixed per-harness time limits")
+    timeline = Timeline()
+    try:
+        failed = asyncio.run(
+            run_pipeline(analysis_db, sarif_path, vuln_out, harness_index, crash_report, afl, timeline)
+        )
+    except PipelineError as exc:
+        raise SystemExit(str(exc))
+    except (asyncio.CancelledError, KeyboardInterrupt):
+        raise SystemExit("[pipeline] Interrupted; child processes stopped")
+    # Per-harness execs/sec, coverage and stability; export failures are not fatal.
+    run_command(["python3", "fuzzer/telemetry.py"], cwd=ROOT)
+    if failed:
+        raise SystemExit(f"[fuzz] AFL++ failed for: {', '.join(failed)}")
+    # The live report lists every crash; bucket them by stack hash like the crash stage does.
+    collect_crash_reports(crash_report)
+    timeline.touch("crash")
+    for stage in PIPELINED_STAGES:
+        if stage in timeline.spans:
+            first, last = timeline.spans[stage]
+            print(f"[pipeline]   {stage:<16} active {first:7.1f}s .. {last:7.1f}s")
+    firsts = ", ".join(f"{event} {seconds:.1f}s" for event, seconds in timeline.firsts.items())
+    print(f"[pipeline] Milestones: {firsts or 'none'}")
+
+
+STAGE_NAMES = ["build", "code-db", "static-analysis", "harness", "fuzz", "crash"]
+
+
+def build_stages(
+    target: Path,
+    out_path: Path,
+    config: Dict[str, str],
+    jobs: int = 1,
+    quiet: bool = False,
+    pipelined: bool = False,
+) -> List[Stage]:
+    """
+    The pipeline stages with their declared inputs and outputs, in run order.
+
+    With `pipelined` the stages in PIPELINED_STAGES are replaced by one
+    "pipelined" stage that overlaps them (run_pipelined); it reads and writes
+    what they do, minus what they hand each other.
+    """
+    vuln_out = ROOT / config["vuln_output"]
+    crash_report = ROOT / config["crash_report"]
+    sarif_path = ROOT / "out" / "findings.sarif"
+    harness_index = ROOT / "fuzzer" / "harnesses.json"
+    harness_dir = ROOT / "fuzzer" / "harnesses"
+    # With code_db_sqlite set, the static analysis queries the SQLite store instead of the JSON.
+    sqlite_path = ROOT / config["code_db_sqlite"] if config["code_db_sqlite"] else None
+    code_db_outputs = [out_path] if sqlite_path is None else [out_path, sqlite_path]
+    analysis_db = sqlite_path if sqlite_path is not None else out_path
+    stages = [
+        Stage(
+            "build",
+            run_check_build,
+            inputs=[ROOT / "builder" / "check_build.sh", ROOT / "ossfuzz-target"],
+        ),
+        Stage(
+            "code-db",
+            lambda: generate_code_db(target, out_path, jobs=jobs, sqlite_path=sqlite_path, quiet=quiet),
+            inputs=[CODE_DB_DIR / "build_code_db.py", CODE_DB_DIR / "code_db_store.py", target],
+            outputs=code_db_outputs,
+            params={
+                "target": str(target.resolve()),
+                "output": str(out_path.resolve()),
+                "sqlite": str(sqlite_path.resolve()) if sqlite_path is not None else "",
+            },
+            in_process=True,
+        ),
+        Stage(
+            "static-analysis",
+            lambda: run_static_analysis(analysis_db, sarif_path, vuln_out),
+            inputs=[
+                ROOT / "static-analyzer" / "run_static_analysis.py",
+                CODE_DB_DIR / "build_code_db.py",
+                CODE_DB_DIR / "code_db_store.py",
+                ROOT / "code-ql" / "run_codeql.sh",
+                ROOT / "code-ql" / "queries",
+                ROOT / "ossfuzz-target",
+                analysis_db,
+            ],
+            outputs=[sarif_path, vuln_out],
+        ),
+        Stage(
+            "harness",
+            lambda: generate_harnesses(harness_index),
+            inputs=[ROOT / "fuzzer" / "generate_harnesses.py", CONFIG_PATH, vuln_out, ROOT / "ossfuzz-target"],
+            outputs=[harness_index, harness_dir],
+        ),
+        Stage(
+            "fuzz",
+            run_fuzzers,
+            inputs=[
+                ROOT / "fuzzer" / "Afl++",
+                ROOT / "fuzzer" / "budget_scheduler.py",
+                ROOT / "fuzzer" / "telemetry.py",
+                CONFIG_PATH,
+                harness_index,
+                harness_dir,
+                ROOT / "fuzzer" / "user_seeds",
+                ROOT / "ossfuzz-target",
+            ],
+            # Deleting or editing the AFL++ output dirs makes the next run fuzz again.
+            outputs=["fuzzer/out-*"],
+        ),
+        Stage(
+            "crash",
+            lambda: collect_crash_reports(crash_report),
+            inputs=[
+                ROOT / "fuzzer" / "collect_crashes.py",
+                ROOT / "fuzzer" / "crash_watch.py",
+                ROOT / "fuzzer" / "Afl++" / "build_harness.sh",
+                harness_index,
+                harness_dir,
+                "fuzzer/out-*/default/crashes",
+            ],
+            outputs=[crash_report],
+        ),
+    ]
+    if not pipelined:
+        return stages
+
+    overlapped = [stage for stage in stages if stage.name in PIPELINED_STAGES]
+    outputs: List[StagePath] = [sarif_path, vuln_out, harness_index, harness_dir, "fuzzer/out-*", crash_report]
+    inputs: List[StagePath] = []
+    for stage in overlapped:
+        for path in stage.inputs:
+            # Crash dirs are written by the fuzzers of this very stage.
+            if path not in outputs and path not in inputs and path != "fuzzer/out-*/default/crashes":
+                inputs.append(path)
+    return [stage for stage in stages if stage.name not in PIPELINED_STAGES] + [
+        Stage(
+            "pipelined",
+            lambda: run_pipelined(analysis_db, sarif_path, vuln_out, harness_index, crash_report),
+            inputs=inputs,
+            outputs=outputs,
+            # Maps SARIF results in this interpreter, so it is profiled like an in-process stage.
+            in_process=True,
+        )
+    ]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the mini-crs pipeline against a target project.")
+    parser.add_argument("target", nargs="?", type=Path, help="project root (default: ./ossfuzz-target)")
+    parser.add_argument("output", nargs="?", type=Path, help="code DB JSON path (default: config json_path)")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1, help="code DB parser worker processes (0 = one per CPU, default: 1)"
+    )
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not echo the code DB to stdout")
+    parser.add_argument("--force", action="store_true", help="run every stage even if its inputs are unchanged")
+    parser.add_argument(
+        "--from-stage", choices=STAGE_NAMES, help="run this stage and all later ones even if cached"
+    )
+    parser.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="overlap static analysis, harness generation, fuzzing and crash collection",
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="record per-stage wall/CPU time, peak RSS and I/O in out/profile/"
+    )
+    parser.add_argument(
+        "--cprofile", action="store_true", help="--profile plus cProfile dumps of in-process stages (code DB)"
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    config = load_config()
+    default_out = ROOT / config["json_path"]
+
+    target = args.target if args.target is not None else ROOT / "ossfuzz-target"
+    out_path = args.output if args.output is not None else default_out
+
+    if not target.exists():
+        raise SystemExit(f"[code-db] Target path does not exist: {target}")
+
+    profile = args.profile or args.cprofile
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+    stages = build_stages(target, out_path, config, jobs=args.jobs, quiet=args.quiet, pipelined=args.pipelined)
+    from_stage = args.from_stage
+    if args.pipelined and from_stage in PIPELINED_STAGES:
+        from_stage = "pipelined"
+    summary = run_stages(
+        stages,
+        MANIFEST_PATH,
+        force=args.force,
+        from_stage=from_stage,
+        profile=profile,
+        cprofile_dir=PROFILE_DIR if args.cprofile else None,
+    )
+    print_summary(summary)
+    if profile:
+        report_path = write_run_report(summary, sys.argv[1:], started_at, PROFILE_DIR)
+        print(f"[pipeline] Profile written to {display_path(report_path)}")
 
 
 if __name__ == "__main__":
@@ -3,15 +3,25 @@
 Run CodeQL via the project helper, then read the SARIF report and map findings
 to functions using the code database produced by code-db-builder.
 
+The SARIF report is streamed one result at a time and findings are written
+out as they are mapped, so memory stays flat regardless of report size.
+
+The code DB may be the JSON document, its line-delimited NDJSON form (indexed
+one file record at a time) or its SQLite store (code_db_sqlite in config.yml,
+see code-db-builder/code_db_store.py); the store is queried per location
+instead of being loaded whole.
+
 Usage:
   python3 static-analyzer/run_static_analysis.py \
     [--sarif out/findings.sarif] [--code-db code-db-builder/code_db.json]
 """
 
 import json
+import os
 import sys
+from bisect import bisect_right
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
 
 import subprocess
 
@@ -21,6 +31,12 @@ DEFAULT_SARIF = ROOT / "out" / "findings.sarif"
 DEFAULT_CODE_DB = ROOT / "code-db-builder" / "code_db.json"
 DEFAULT_OUTPUT = ROOT / "static-analyzer" / "vulnerable_functions.json"
 CONFIG_PATH = ROOT / "config.yml"
+sys.path.insert(0, str(ROOT / "code-db-builder"))
+
+from build_code_db import iter_db_file  # noqa: E402
+from code_db_store import CodeDbStore, is_store  # noqa: E402
+
+Intervals = Tuple[List[int], List[int], List[Dict[str, int]]]
 
 
 def load_config() -> Dict[str, str]:
@@ -33,13 +49,13 @@ def load_config() -> Dict[str, str]:
             key, value = stripped.split(":", 1)
             if key.strip() == "json_path":
                 cfg["json_path"] = value.strip()
+            if key.strip() == "code_db_sqlite" and value.strip():
+                cfg["code_db_sqlite"] = value.strip()
     return cfg
 
 
-def run_codeql() -> None:
-    """Invoke the CodeQL docker image (mini-crs-codeql)."""
-    print("[static-analyzer] Running CodeQL via docker image mini-crs-codeql...")
-    cmd = [
+def codeql_command() -> List[str]:
+    return [
         "docker",
         "run",
         "--rm",
@@ -51,7 +67,12 @@ def run_codeql() -> None:
         f"RESULTS={DEFAULT_SARIF}",
         "mini-crs-codeql",
     ]
-    result = subprocess.run(cmd, cwd=ROOT)
+
+
+def run_codeql() -> None:
+    """Invoke the CodeQL docker image (mini-crs-codeql); it reuses cached DBs/SARIF for unchanged inputs."""
+    print("[static-analyzer] Running CodeQL via docker image mini-crs-codeql...")
+    result = subprocess.run(codeql_command(), cwd=ROOT)
     if result.returncode != 0:
         raise SystemExit(f"[static-analyzer] CodeQL run failed with exit code {result.returncode}")
     print("[static-analyzer] CodeQL run complete.")
@@ -63,80 +84,384 @@ def normalize_uri(uri: str) -> Path:
     return Path(uri).resolve()
 
 
-def load_code_db(path: Path) -> Tuple[Path, Dict[str, List[Dict[str, int]]]]:
-    data = json.loads(path.read_text())
-    root = Path(data["project_root"]).resolve()
-    mapping: Dict[str, List[Dict[str, int]]] = {}
-    for entry in data.get("files", []):
+class FunctionIndex:
+    """
+    Code DB functions indexed for location lookups.
+
+    Each file keeps its functions sorted by (start_line, end_line) together with
+    a running maximum of end lines, so the function enclosing a line is found by
+    bisection and nested or overlapping ranges are still handled. A SARIF path
+    outside the project root is matched by looking up each of its trailing path
+    suffixes as an exact code DB path, instead of scanning all files.
+    """
+
+    def __init__(self, files: Dict[str, List[Dict[str, int]]]) -> None:
+        self._functions: Dict[str, List[Dict[str, int]]] = {}
+        self._intervals: Dict[str, Intervals] = {}
+        # Position of each file in the code DB, for the first-match rule of resolve_path.
+        self._order: Dict[str, int] = {}
+        self._resolved: Dict[Path, Optional[str]] = {}
+        for rel, funcs in files.items():
+            self.add_file(rel, funcs)
+
+    def add_file(self, rel: str, funcs: List[Dict[str, int]]) -> None:
+        """Index one code DB file; lets the index be built while the DB is streamed."""
+        self._functions[rel] = funcs
+        self._intervals[rel] = self._build_intervals(funcs)
+        self._order.setdefault(rel, len(self._order))
+
+    @staticmethod
+    def _build_intervals(funcs: Iterable[Dict[str, int]]) -> Intervals:
+        valid = sorted(
+            (fn for fn in funcs if isinstance(fn.get("start_line"), int) and isinstance(fn.get("end_line"), int)),
+            key=lambda fn: (fn["start_line"], fn["end_line"]),
+        )
+        starts = [fn["start_line"] for fn in valid]
+        max_ends: List[int] = []
+        running = 0
+        for fn in valid:
+            running = max(running, fn["end_line"])
+            max_ends.append(running)
+        return starts, max_ends, valid
+
+    def _first_file(self, paths: List[str]) -> Optional[str]:
+        """The earliest code DB file (in DB order) among paths, matched exactly."""
+        found = [path for path in paths if path in self._order]
+        return min(found, key=self._order.__getitem__) if found else None
+
+    def functions(self, rel: str) -> List[Dict[str, int]]:
+        return self._functions.get(rel, [])
+
+    def resolve_path(self, loc_path: Path, project_root: Path) -> Optional[str]:
+        """Map a resolved SARIF location path to a code DB file key."""
+        if loc_path in self._resolved:
+            return self._resolved[loc_path]
+        rel: Optional[str] = None
+        try:
+            rel = str(loc_path.relative_to(project_root))
+        except ValueError:
+            # Fallback: the first code DB file that is a trailing path suffix of the location.
+            parts = loc_path.parts
+            start = 1 if loc_path.is_absolute() else 0
+            rel = self._first_file(["/".join(parts[i:]) for i in range(start, len(parts))])
+        self._resolved[loc_path] = rel
+        return rel
+
+    def lookup(self, rel: str, line: int) -> Optional[Dict[str, int]]:
+        """Return the innermost function in rel whose range contains line."""
+        entry = self._intervals.get(rel)
+        if entry is None:
+            return None
+        starts, max_ends, funcs = entry
+        return self._enclosing(max_ends, funcs, bisect_right(starts, line) - 1, line)
+
+    def lookup_many(self, rel: str, lines: List[int]) -> List[Optional[Dict[str, int]]]:
+        """Batched lookup: sort the lines once and sweep them against the intervals."""
+        entry = self._intervals.get(rel)
+        if entry is None:
+            return [None] * len(lines)
+        return self._sweep(entry, lines)
+
+    @classmethod
+    def _sweep(cls, entry: Intervals, lines: List[int]) -> List[Optional[Dict[str, int]]]:
+        matches: List[Optional[Dict[str, int]]] = [None] * len(lines)
+        starts, max_ends, funcs = entry
+        last = -1  # index of the last function starting at or before the current line
+        for k in sorted(range(len(lines)), key=lines.__getitem__):
+            line = lines[k]
+            while last + 1 < len(starts) and starts[last + 1] <= line:
+                last += 1
+            matches[k] = cls._enclosing(max_ends, funcs, last, line)
+        return matches
+
+    @staticmethod
+    def _enclosing(
+        max_ends: List[int], funcs: List[Dict[str, int]], i: int, line: int
+    ) -> Optional[Dict[str, int]]:
+        # Walk left only while some earlier function could still reach this line.
+        while i >= 0 and max_ends[i] >= line:
+            if funcs[i]["end_line"] >= line:
+                return funcs[i]
+            i -= 1
+        return None
+
+
+class StoreFunctionIndex(FunctionIndex):
+    """
+    FunctionIndex over an SQLite code DB store (code_db_store.py).
+
+    Nothing is loaded up front: a single lookup is a point query on the
+    (file, start_line, end_line) index, a batched lookup fetches only the
+    functions overlapping the batch's line range (small batches use point
+    queries too), and location path suffixes are looked up as exact paths
+    in the store's files table.
+    """
+
+    # Up to this many lines in one file are looked up one query each; more fetch the covering range.
+    POINT_QUERY_LIMIT = 64
+
+    def __init__(self, store: CodeDbStore) -> None:
+        super().__init__({})
+        self._store = store
+
+    def _first_file(self, paths: List[str]) -> Optional[str]:
+        return self._store.first_file(paths)
+
+    def functions(self, rel: str) -> List[Dict[str, int]]:
+        return self._store.functions(rel)  # type: ignore[return-value]
+
+    def lookup(self, rel: str, line: int) -> Optional[Dict[str, int]]:
+        return self._store.enclosing(rel, line)  # type: ignore[return-value]
+
+    def lookup_many(self, rel: str, lines: List[int]) -> List[Optional[Dict[str, int]]]:
+        if len(lines) <= self.POINT_QUERY_LIMIT:
+            return [self.lookup(rel, line) for line in lines]
+        overlapping = self._store.functions_overlapping(rel, min(lines), max(lines))
+        return self._sweep(self._build_intervals(overlapping), lines)  # type: ignore[arg-type]
+
+
+def load_code_db(path: Path) -> Tuple[Path, FunctionIndex]:
+    if is_store(path):
+        store = CodeDbStore(path)
+        return Path(store.project_root).resolve(), StoreFunctionIndex(store)
+    # NDJSON code DBs are indexed one file record at a time as they are read.
+    project_root, records = iter_db_file(path)
+    index = FunctionIndex({})
+    for entry in records:
         rel = entry.get("path")
         if not rel:
             continue
-        mapping[rel] = entry.get("functions", [])
-    return root, mapping
+        index.add_file(rel, entry.get("functions", []))  # type: ignore[arg-type]
+    return Path(project_root).resolve(), index
+
+
+def describe_function(rel: str, fn: Dict[str, int]) -> Dict[str, object]:
+    return {
+        "file": rel,
+        "function": fn.get("name"),
+        "start_line": fn.get("start_line"),
+        "end_line": fn.get("end_line"),
+    }
 
 
 def find_function_for_location(
-    loc_path: Path, line: int, project_root: Path, files: Dict[str, List[Dict[str, int]]]
+    loc_path: Path, line: int, project_root: Path, index: FunctionIndex
 ) -> Optional[Dict[str, object]]:
-    # Prefer relative path from project_root.
-    rel: Optional[str] = None
-    try:
-        rel = str(loc_path.resolve().relative_to(project_root))
-    except ValueError:
-        # Fallback: match by suffix.
-        for candidate in files.keys():
-            if loc_path.as_posix().endswith(candidate):
-                rel = candidate
-                break
+    rel = index.resolve_path(loc_path.resolve(), project_root)
     if rel is None:
         return None
-    funcs = files.get(rel, [])
-    for fn in funcs:
-        if (
-            isinstance(fn.get("start_line"), int)
-            and isinstance(fn.get("end_line"), int)
-            and fn["start_line"] <= line <= fn["end_line"]
-        ):
-            return {
-                "file": rel,
-                "function": fn.get("name"),
-                "start_line": fn.get("start_line"),
-                "end_line": fn.get("end_line"),
+    fn = index.lookup(rel, line)
+    return describe_function(rel, fn) if fn is not None else None
+
+
+def resolve_locations(
+    locations: List[Tuple[Path, int]], project_root: Path, index: FunctionIndex
+) -> List[Optional[Dict[str, object]]]:
+    """Map many (path, line) pairs at once, grouping them by file for a sorted join."""
+    resolved: List[Optional[Dict[str, object]]] = [None] * len(locations)
+    by_file: Dict[str, List[int]] = {}
+    for k, (loc_path, _) in enumerate(locations):
+        rel = index.resolve_path(loc_path, project_root)
+        if rel is not None:
+            by_file.setdefault(rel, []).append(k)
+    for rel, positions in by_file.items():
+        matches = index.lookup_many(rel, [locations[k][1] for k in positions])
+        for k, fn in zip(positions, matches):
+            if fn is not None:
+                resolved[k] = describe_function(rel, fn)
+    return resolved
+
+
+_NUMBER_CHARS = frozenset("0123456789+-.eE")
+
+
+class JsonStream:
+    """
+    Pull reader over a JSON text file.
+
+    Containers are walked token by token while individual values are decoded
+    with json.JSONDecoder.raw_decode, so only one value (e.g. one SARIF
+    result) needs to be buffered at a time.
+    """
+
+    def __init__(self, fh: TextIO, chunk_size: int = 1 << 16) -> None:
+        self._fh = fh
+        self._chunk_size = chunk_size
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self, min_size: int = 0) -> bool:
+        if self._eof:
+            return False
+        if self._pos:
+            self._buf = self._buf[self._pos :]
+            self._pos = 0
+        data = self._fh.read(max(self._chunk_size, min_size))
+        if not data:
+            self._eof = True
+            return False
+        self._buf += data
+        return True
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it ('' at EOF)."""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"expected {char!r} in JSON stream, found {found!r}")
+        self._pos += 1
+
+    def value(self) -> object:
+        """Decode the next complete JSON value, reading more input as needed."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                # Probably cut off mid-value; grow geometrically so retries stay linear.
+                if not self._fill(len(self._buf)):
+                    raise
+                continue
+            # A number cut off by the buffer end decodes as a prefix ("11" of "11.5"); read on and redo it.
+            if self._may_continue(value, end) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def _may_continue(self, value: object, end: int) -> bool:
+        """True if value is a number and only number characters follow it up to the buffer end."""
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return False
+        return all(char in _NUMBER_CHARS for char in self._buf[end:])
+
+    def items(self) -> Iterator[str]:
+        """Iterate the keys of an object; the caller must consume each value."""
+        self.expect("{")
+        first = True
+        while True:
+            if self.peek() == "}":
+                self._pos += 1
+                return
+            if not first:
+                self.expect(",")
+            first = False
+            key = self.value()
+            self.expect(":")
+            yield str(key)
+
+    def elements(self) -> Iterator[None]:
+        """Iterate the elements of an array; the caller must consume each element."""
+        self.expect("[")
+        first = True
+        while True:
+            if self.peek() == "]":
+                self._pos += 1
+                return
+            if not first:
+                self.expect(",")
+            first = False
+            yield None
+
+
+def iter_sarif_results(sarif_path: Path) -> Iterator[Dict[str, object]]:
+    """Yield runs[].results[] entries one at a time without loading the whole report."""
+    with sarif_path.open("r", encoding="utf-8") as fh:
+        stream = JsonStream(fh)
+        for key in stream.items():
+            if key != "runs" or stream.peek() != "[":
+                stream.value()
+                continue
+            for _ in stream.elements():
+                if stream.peek() != "{":
+                    stream.value()
+                    continue
+                for run_key in stream.items():
+                    if run_key != "results" or stream.peek() != "[":
+                        stream.value()
+                        continue
+                    for _ in stream.elements():
+                        result = stream.value()
+                        if isinstance(result, dict):
+                            yield result
+
+
+def iter_findings(
+    sarif_path: Path, project_root: Path, index: FunctionIndex, batch_size: int = 4096
+) -> Iterator[Dict[str, object]]:
+    """
+    Stream findings from a SARIF report as results arrive.
+
+    Locations are mapped to functions in bounded batches (one sorted join per
+    batch), so memory does not grow with the size of the report.
+    """
+    pending: List[Tuple[object, str, int]] = []
+    locations: List[Tuple[Path, int]] = []
+    uri_paths: Dict[str, Path] = {}
+
+    def flush() -> Iterator[Dict[str, object]]:
+        funcs = resolve_locations(locations, project_root, index)
+        for (rule_id, message, start_line), (loc_path, _), func in zip(pending, locations, funcs):
+            yield {
+                "rule_id": rule_id,
+                "message": message,
+                "file": func["file"] if func else str(loc_path),
+                "function": func.get("function") if func else None,
+                "function_start": func.get("start_line") if func else None,
+                "function_end": func.get("end_line") if func else None,
+                "line": start_line,
             }
-    return None
+        pending.clear()
+        locations.clear()
+
+    for result in iter_sarif_results(sarif_path):
+        message = result.get("message", {}).get("text", "")
+        rule_id = result.get("ruleId") or result.get("rule", {}).get("id")
+        for loc in result.get("locations", []):
+            phys = loc.get("physicalLocation", {})
+            artifact = phys.get("artifactLocation", {})
+            uri = artifact.get("uri")
+            region = phys.get("region", {})
+            start_line = region.get("startLine")
+            if not uri or not isinstance(start_line, int):
+                continue
+            loc_path = uri_paths.get(uri)
+            if loc_path is None:
+                loc_path = uri_paths[uri] = normalize_uri(uri)
+            pending.append((rule_id, message, start_line))
+            locations.append((loc_path, start_line))
+        if len(locations) >= batch_size:
+            yield from flush()
+    yield from flush()
 
 
 def collect_findings(sarif_path: Path, code_db_path: Path) -> List[Dict[str, object]]:
-    sarif = json.loads(sarif_path.read_text())
-    project_root, files = load_code_db(code_db_path)
-
-    findings: List[Dict[str, object]] = []
-    for run in sarif.get("runs", []):
-        for result in run.get("results", []):
-            message = result.get("message", {}).get("text", "")
-            rule_id = result.get("ruleId") or result.get("rule", {}).get("id")
-            for loc in result.get("locations", []):
-                phys = loc.get("physicalLocation", {})
-                artifact = phys.get("artifactLocation", {})
-                uri = artifact.get("uri")
-                region = phys.get("region", {})
-                start_line = region.get("startLine")
-                if not uri or not isinstance(start_line, int):
-                    continue
-                loc_path = normalize_uri(uri)
-                func = find_function_for_location(loc_path, start_line, project_root, files)
-                findings.append(
-                    {
-                        "rule_id": rule_id,
-                        "message": message,
-                        "file": func["file"] if func else str(loc_path),
-                        "function": func.get("function") if func else None,
-                        "function_start": func.get("start_line") if func else None,
-                        "function_end": func.get("end_line") if func else None,
-                        "line": start_line,
-                    }
-                )
-    return findings
+    project_root, index = load_code_db(code_db_path)
+    return list(iter_findings(sarif_path, project_root, index))
+
+
+def instant_crash_finding(index: FunctionIndex) -> Optional[Dict[str, object]]:
+    for fn in index.functions("src/vuln_lib.c"):
+        if fn.get("name") == "instant_crash":
+            return {
+                "rule_id": "custom/instant-crash",
+                "message": "Synthetic: known crash function instant_crash",
+                "file": "src/vuln_lib.c",
+                "function": "instant_crash",
+                "function_start": fn.get("start_line"),
+                "function_end": fn.get("end_line"),
+                "line": fn.get("start_line"),
+            }
+    return None
 
 
 def ensure_instant_crash(findings: List[Dict[str, object]], code_db_path: Path) -> None:
@@ -144,28 +469,45 @@ def ensure_instant_crash(findings: List[Dict[str, object]], code_db_path: Path)
     has_instant = any(f.get("function") == "instant_crash" for f in findings)
     if has_instant:
         return
-    _, files = load_code_db(code_db_path)
-    funcs = files.get("src/vuln_lib.c", [])
-    for fn in funcs:
-        if fn.get("name") == "instant_crash":
-            findings.append(
-                {
-                    "rule_id": "custom/instant-crash",
-                    "message": "Synthetic: known crash function instant_crash",
-                    "file": "src/vuln_lib.c",
-                    "function": "instant_crash",
-                    "function_start": fn.get("start_line"),
-                    "function_end": fn.get("end_line"),
-                    "line": fn.get("start_line"),
-                }
-            )
-            break
+    _, index = load_code_db(code_db_path)
+    synthetic = instant_crash_finding(index)
+    if synthetic is not None:
+        findings.append(synthetic)
+
+
+def with_instant_crash(
+    findings: Iterable[Dict[str, object]], index: FunctionIndex
+) -> Iterator[Dict[str, object]]:
+    """Streaming variant of ensure_instant_crash: append the synthetic finding at the end."""
+    has_instant = False
+    for finding in findings:
+        has_instant = has_instant or finding.get("function") == "instant_crash"
+        yield finding
+    if not has_instant:
+        synthetic = instant_crash_finding(index)
+        if synthetic is not None:
+            yield synthetic
+
+
+def write_json_array(items: Iterable[object], streams: List[TextIO]) -> int:
+    """Write items as a JSON array formatted like json.dumps(items, indent=2), one at a time."""
+    count = 0
+    for item in items:
+        chunk = ("[\n  " if count == 0 else ",\n  ") + json.dumps(item, indent=2).replace("\n", "\n  ")
+        for stream in streams:
+            stream.write(chunk)
+        count += 1
+    tail = "[]\n" if count == 0 else "\n]\n"
+    for stream in streams:
+        stream.write(tail)
+    return count
 
 
 def main() -> None:
     args = sys.argv[1:]
     cfg = load_config()
-    code_db_path = Path(cfg["json_path"]).resolve() if not args else Path(args[0]).resolve()
+    default_db = cfg.get("code_db_sqlite", cfg["json_path"])
+    code_db_path = Path(default_db).resolve() if not args else Path(args[0]).resolve()
     sarif_path = Path(args[1]).resolve() if len(args) > 1 else DEFAULT_SARIF
     output_path = Path(args[2]).resolve() if len(args) > 2 else DEFAULT_OUTPUT
 
@@ -175,13 +517,19 @@ def main() -> None:
     if not code_db_path.exists():
         raise SystemExit(f"[static-analyzer] Code DB not found at {code_db_path}")
 
-    findings = collect_findings(sarif_path, code_db_path)
-    ensure_instant_crash(findings, code_db_path)
+    project_root, index = load_code_db(code_db_path)
+    findings = with_instant_crash(iter_findings(sarif_path, project_root, index), index)
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text(json.dumps(findings, indent=2) + "\n")
-    print(f"[static-analyzer] Wrote findings to {output_path}")
-    json.dump(findings, sys.stdout, indent=2)
-    sys.stdout.write("\n")
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    # Echo to stdout while writing so nothing is held in memory.
+    try:
+        with tmp_path.open("w") as out:
+            count = write_json_array(findings, [out, sys.stdout])
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    os.replace(tmp_path, output_path)
+    print(f"[static-analyzer] Wrote {count} findings to {output_path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,39 @@
+"""Regression tests for code-ql/analyze.py."""
+
+import sys
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "code-ql"))
+
+from analyze import Rule, RuleEngine, detect_issues  # noqa: E402
+
+
+def issue_types(lines: List[str]) -> List[str]:
+    return [issue["type"] for issue in detect_issues(lines)]
+
+
+def test_rules_matching_at_the_same_position_all_get_their_hits() -> None:
+    def count(name: str):
+        return lambda hits, snippet: [{"type": name, "detail": str(len(hits))}]
+
+    engine = RuleEngine(
+        [Rule("any_mem", r"mem\w*\(", count("any_mem"), "m"), Rule("copy", r"memcpy\(", count("copy"), "m")]
+    )
+    assert engine.detect(["memcpy(a, b, n); memset(a, 0, n);"]) == [
+        {"type": "any_mem", "detail": "2"},
+        {"type": "copy", "detail": "1"},
+    ]
+
+
+def test_printf_with_the_format_on_the_next_line_is_flagged() -> None:
+    assert issue_types(["printf(", '    "fmt %d", x);']) == ["format_string"]
+    assert issue_types(['printf("fmt %d",', "    x);"]) == []
+    assert issue_types(["sprintf(buf, fmt);"]) == ["unsafe_copy", "format_string"]
+
+
+def test_free_split_over_lines_is_not_a_use_after_free_anchor() -> None:
+    assert issue_types(["free(", "  p);", "use(p);"]) == []
+    assert issue_types(["free(p);", "use(p);"]) == ["use_after_free"]
+    assert issue_types(["free(p);", "free(p);"]) == ["double_free"]
@@ -0,0 +1,96 @@
+"""Regression tests for the bandit time budget in fuzzer/budget_scheduler.py."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "fuzzer"))
+
+from budget_scheduler import DISCOUNT, BudgetScheduler  # noqa: E402
+
+OUT = Path("/nonexistent")
+
+
+def make_scheduler(harnesses: int = 2) -> BudgetScheduler:
+    # 100s per harness, decisions every 5s, saturated after 20s without progress past a 10s warm-up.
+    return BudgetScheduler(budget=100.0 * harnesses, harnesses=harnesses, interval=5.0, saturation=20.0, warmup=10.0)
+
+
+def feed(scheduler: BudgetScheduler, name: str, paths: float, now: float) -> None:
+    scheduler.observe(scheduler.arms[name], {"corpus_count": paths, "saved_crashes": 0.0}, now)
+
+
+def test_saturated_arm_hands_its_share_to_the_arms_still_running() -> None:
+    scheduler = make_scheduler(3)
+    for name in ("stuck", "fast", "slow"):
+        scheduler.register(name, name, OUT, now=0.0)
+    for now in (5.0, 10.0, 15.0, 20.0, 25.0):
+        scheduler.tick()
+        feed(scheduler, "stuck", 10.0, now)
+        feed(scheduler, "fast", 10.0 + 20.0 * now, now)
+        feed(scheduler, "slow", 10.0 + now, now)
+        stopped = scheduler.decide(now)
+    assert [arm.name for arm in stopped] == ["stuck"]
+    stuck, fast, slow = (scheduler.arms[name] for name in ("stuck", "fast", "slow"))
+    assert stuck.stop_reason == "saturated"
+    assert stuck.allotment == pytest.approx(25.0)
+    # 75s came free: the arm finding more paths gets the larger part, and none is lost.
+    assert fast.allotment > slow.allotment > 100.0
+    assert scheduler.pool == 0.0
+    assert stuck.allotment + fast.allotment + slow.allotment == pytest.approx(300.0)
+
+
+def test_arm_is_stopped_at_its_allotment() -> None:
+    scheduler = make_scheduler(1)
+    scheduler.register("only", "only", OUT, now=0.0)
+    for now in range(5, 101, 5):
+        feed(scheduler, "only", float(now), float(now))
+        stopped = scheduler.decide(float(now))
+    assert [arm.stop_reason for arm in stopped] == ["budget"]
+    assert scheduler.report(100.0)["used_seconds"] == 100.0
+
+
+def test_share_freed_while_nothing_runs_goes_to_the_next_arm() -> None:
+    scheduler = make_scheduler(2)
+    first = scheduler.register("first", "first", OUT, now=0.0)
+    scheduler.finish(first, now=30.0)
+    assert scheduler.pool == pytest.approx(70.0)
+    assert scheduler.decide(31.0) == []
+    second = scheduler.register("second", "second", OUT, now=40.0)
+    assert second.allotment == pytest.approx(170.0)
+    assert scheduler.pool == 0.0
+    assert scheduler.report(40.0)["unallocated_seconds"] == 0.0
+
+
+def test_arm_that_never_started_returns_its_whole_share() -> None:
+    scheduler = make_scheduler(2)
+    running = scheduler.register("running", "running", OUT, now=0.0)
+    skipped = scheduler.skip("broken", now=5.0)
+    assert skipped.stop_reason == "not started"
+    assert skipped.allotment == 0.0
+    scheduler.decide(5.0)
+    assert running.allotment == pytest.approx(200.0)
+
+
+def test_unallocated_time_is_reported() -> None:
+    scheduler = make_scheduler(1)
+    scheduler.finish(scheduler.register("only", "only", OUT, now=0.0), now=40.0)
+    assert scheduler.report(50.0)["unallocated_seconds"] == 60.0
+
+
+def test_statistics_are_discounted_each_tick() -> None:
+    scheduler = make_scheduler(2)
+    old = scheduler.register("old", "old", OUT, now=0.0)
+    new = scheduler.register("new", "new", OUT, now=0.0)
+    feed(scheduler, "old", 10.0, 5.0)
+    feed(scheduler, "old", 60.0, 10.0)
+    reward, pulls = old.reward, old.pulls
+    scheduler.tick()
+    assert (old.reward, old.pulls) == (pytest.approx(reward * DISCOUNT), pytest.approx(pulls * DISCOUNT))
+    feed(scheduler, "new", 10.0, 15.0)
+    scores = scheduler.scores()
+    # "new" has no gains yet but fewer pulls, so exploration keeps it in play.
+    assert scores["old"] > 0 and scores["new"] > 0
+    assert set(scores) == {"old", "new"}
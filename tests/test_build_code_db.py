@@ -0,0 +1,62 @@
+"""Regression tests for the function scanner in code-db-builder/build_code_db.py."""
+
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "code-db-builder"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+import legacy_parser  # noqa: E402
+from build_code_db import extract_functions, scan_functions  # noqa: E402
+
+
+def ranges(text: str) -> List[Tuple[str, int, int]]:
+    return [(f["name"], f["start_line"], f["end_line"]) for f in scan_functions(text)]
+
+
+def test_braces_and_comment_markers_in_string_literals() -> None:
+    text = 'int a(void) {\n  puts("}");\n  puts("{ // }");\n  return 0;\n}\nint b(void) {\n  return 1;\n}\n'
+    assert ranges(text) == [("a", 1, 5), ("b", 6, 8)]
+
+
+def test_braces_and_quotes_in_char_literals() -> None:
+    text = "int a(char c) {\n  if (c == '}') return 1;\n  if (c == '{') return 2;\n  return '\\'';\n}\n"
+    text += "int b(void) { return 0; }\n"
+    assert ranges(text) == [("a", 1, 5), ("b", 6, 6)]
+
+
+def test_braces_in_comments() -> None:
+    text = "/* } { */\nint a(void) { // }\n  return 0; /* { */\n}\nint b(void) { return 1; }\n"
+    assert ranges(text) == [("a", 1, 4), ("b", 5, 5)]
+
+
+def test_preprocessor_lines_are_skipped() -> None:
+    text = "#include <stdio.h>\n#define CALL(f) f(\\\n  1); {\nint a(void) {\n  return 0;\n}\n"
+    assert ranges(text) == [("a", 1, 6)]
+
+
+def test_define_with_a_brace_belongs_to_the_next_function() -> None:
+    # Directives are transparent, so the range starts after the previous declaration
+    # and takes in the #define (the old parser reset its header on the brace and started at line 3).
+    text = "int x;\n#define OPEN {\nint a(void) {\n  return 0;\n}\n"
+    assert ranges(text) == [("a", 2, 5)]
+    assert [(f["name"], f["start_line"]) for f in legacy_parser.extract_functions(text)] == [("a", 3)]
+
+
+def test_attributes_and_keywords_do_not_name_functions() -> None:
+    text = "int g(int);\nstatic int f(int x) __attribute__((unused)) {\n  if (x) { x++; }\n  return g(x);\n}\n"
+    assert ranges(text) == [("f", 2, 5)]
+
+
+def test_functions_inside_extern_c_blocks() -> None:
+    text = 'extern "C" {\nstruct s { int x; };\nint a(void) {\n  return 0;\n}\n}\n'
+    assert ranges(text) == [("a", 3, 5)]
+
+
+def test_parity_with_the_legacy_parser_on_vuln_lib() -> None:
+    path = ROOT / "ossfuzz-target" / "src" / "vuln_lib.c"
+    functions = extract_functions(path)
+    assert functions
+    assert functions == legacy_parser.extract_functions(path.read_text())
@@ -0,0 +1,134 @@
+"""Regression tests for fuzzer/collect_crashes.py and fuzzer/crash_watch.py."""
+
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "fuzzer"))
+
+import collect_crashes  # noqa: E402
+from crash_watch import CrashStore, DirWatcher  # noqa: E402
+
+ASAN_REPORT = """\
+==1234==ERROR: AddressSanitizer: heap-buffer-overflow on address 0x602000000011 at pc 0x4f1a2b bp 0x7ffd sp 0x7ffd
+READ of size 1 at 0x602000000011 thread T0
+    #0 0x4f1a2b in __asan_memcpy /src/llvm/compiler-rt/lib/asan/asan_interceptors_memintrinsics.cpp:22:3
+    #1 0x4f2c3d in parse_header /src/vuln_lib.c:{line}:5
+    #2 0x4f2d4e in parse_packet /src/vuln_lib.c:88:12
+    #3 0x4f2e5f in LLVMFuzzerTestOneInput /src/harness.c:14:3
+    #4 0x4f3a00 in main /src/afl_driver.c:40:10
+    #5 0x7f0000 in __libc_start_main (/lib/x86_64-linux-gnu/libc.so.6+0x21b96)
+
+0x602000000011 is located 0 bytes to the right of 1-byte region
+allocated by thread T0 here:
+    #0 0x4e0000 in malloc /src/llvm/compiler-rt/lib/asan/asan_malloc_linux.cpp:69:3
+    #1 0x4f2c00 in alloc_buffer /src/vuln_lib.c:20:9
+"""
+
+
+def test_asan_report_parses_to_the_crash_site_stack() -> None:
+    crash_type, frames = collect_crashes.parse_sanitizer_report(ASAN_REPORT.format(line=42))
+    assert crash_type == "heap-buffer-overflow"
+    assert frames == [
+        "parse_header vuln_lib.c:42:5",
+        "parse_packet vuln_lib.c:88:12",
+        "LLVMFuzzerTestOneInput harness.c:14:3",
+    ]
+
+
+def test_stack_bucket_ignores_lines_and_addresses() -> None:
+    first = collect_crashes.parse_sanitizer_report(ASAN_REPORT.format(line=42))
+    moved = collect_crashes.parse_sanitizer_report(ASAN_REPORT.format(line=57).replace("0x4f2c3d", "0x4f9999"))
+    assert collect_crashes.stack_bucket(*first) == collect_crashes.stack_bucket(*moved)
+    assert collect_crashes.stack_bucket("stack-buffer-overflow", first[1]) != collect_crashes.stack_bucket(*first)
+
+
+def test_ubsan_crash_type_drops_numbers() -> None:
+    report = "vuln_lib.c:12:7: runtime error: signed integer overflow: 2147483647 + 1 cannot be represented\n"
+    crash_type, frames = collect_crashes.parse_sanitizer_report(report)
+    assert crash_type == "ubsan: signed integer overflow: N + N cannot be represented"
+    assert frames == []
+
+
+def write_crash(out_dir: Path, name: str, data: bytes) -> Path:
+    crash_dir = out_dir / "default" / "crashes"
+    crash_dir.mkdir(parents=True, exist_ok=True)
+    (crash_dir / "README.txt").write_text("Command line used to find this crash:\n")
+    path = crash_dir / name
+    path.write_bytes(data)
+    return path
+
+
+def test_crashes_with_the_same_content_are_listed_once(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(collect_crashes, "ROOT", tmp_path)
+    fuzzer_dir = tmp_path / "fuzzer"
+    write_crash(fuzzer_dir / "out-h_afl-100", "id:000000,sig:11,time:5", b"AAAA")
+    write_crash(fuzzer_dir / "out-h_afl-200", "id:000000,sig:06,time:9", b"AAAA")
+    write_crash(fuzzer_dir / "out-h_afl-200", "id:000001,sig:11,time:12", b"BBBB")
+    index = collect_crashes.index_output_dirs(fuzzer_dir)
+    crashes = collect_crashes.collect_crashes_for_harness("h_afl", index)
+    assert [crash["path"] for crash in crashes] == [
+        "fuzzer/out-h_afl-100/default/crashes/id:000000,sig:11,time:5",
+        "fuzzer/out-h_afl-200/default/crashes/id:000001,sig:11,time:12",
+    ]
+    assert crashes[0]["sig"] == "11"
+
+
+def test_crash_store_dedups_and_drops_deleted_runs(tmp_path: Path) -> None:
+    store_path = tmp_path / "crash_store.jsonl"
+    kept = write_crash(tmp_path / "fuzzer" / "out-h_afl-200", "id:000000", b"x")
+    (tmp_path / "fuzzer" / "out-h_afl-100").mkdir()
+    store = CrashStore(store_path, tmp_path)
+    assert store.add("h.c", "h", "hash-old", {"path": "fuzzer/out-h_afl-100/default/crashes/id:000000"})
+    assert store.add("h.c", "h", "hash-new", {"path": kept.relative_to(tmp_path).as_posix()})
+    assert not store.add("h.c", "h", "hash-new", {"path": "fuzzer/out-h_afl-200/default/crashes/id:000001"})
+    store.close()
+
+    (tmp_path / "fuzzer" / "out-h_afl-100").rmdir()
+    store = CrashStore(store_path, tmp_path)
+    store.close()
+    assert [record["sha256"] for record in store.records] == ["hash-new"]
+    lines = [json.loads(line) for line in store_path.read_text().splitlines()]
+    assert [(record["seq"], record["sha256"]) for record in lines] == [(0, "hash-new")]
+
+
+def test_dir_watcher_reports_each_entry_once(tmp_path: Path) -> None:
+    watcher = DirWatcher(poll_interval=0.01, use_inotify=False)
+    (tmp_path / "a").write_text("")
+    assert watcher.add(tmp_path) == [tmp_path / "a"]
+    (tmp_path / "b").write_text("")
+    assert watcher.wait(0.01) == [tmp_path / "b"]
+    assert watcher.wait(0.01) == []
+    watcher.close()
+
+
+def test_watch_follows_out_dirs_created_before_their_harness(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    fuzzer_dir = tmp_path / "fuzzer"
+    index = fuzzer_dir / "harnesses.json"
+    monkeypatch.setattr(collect_crashes, "ROOT", tmp_path)
+    monkeypatch.setattr(collect_crashes, "FUZZER_DIR", fuzzer_dir)
+    monkeypatch.setattr(collect_crashes, "HARNESS_INDEX", index)
+    monkeypatch.setattr(collect_crashes, "CRASH_STORE", fuzzer_dir / "crash_store.jsonl")
+    fuzzer_dir.mkdir()
+    index.write_text(json.dumps({"harnesses": ["fuzzer/harnesses/a_afl.c"]}))
+    write_crash(fuzzer_dir / "out-b_afl-1", "id:000000,sig:11", b"crash")
+
+    def grow_index() -> None:
+        time.sleep(0.5)
+        tmp = index.with_name("harnesses.json.tmp")
+        tmp.write_text(json.dumps({"harnesses": ["fuzzer/harnesses/a_afl.c", "fuzzer/harnesses/b_afl.c"]}))
+        tmp.replace(index)
+
+    thread = threading.Thread(target=grow_index)
+    thread.start()
+    report_path = tmp_path / "report.json"
+    collect_crashes.watch(report_path, debounce=0.2, duration=2.0, use_inotify=False)
+    thread.join()
+    report = json.loads(report_path.read_text())
+    crashes = {entry["harness"]: [crash["path"] for crash in entry["crashes"]] for entry in report["harnesses"]}
+    assert crashes["fuzzer/harnesses/b_afl.c"] == ["fuzzer/out-b_afl-1/default/crashes/id:000000,sig:11"]
@@ -0,0 +1,93 @@
+"""Regression tests for static-analyzer/run_static_analysis.py."""
+
+import io
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "code-db-builder"))
+sys.path.insert(0, str(ROOT / "static-analyzer"))
+
+from code_db_store import CodeDbStore, write_store  # noqa: E402
+from run_static_analysis import FunctionIndex, JsonStream, StoreFunctionIndex  # noqa: E402
+
+PROJECT_ROOT = Path("/proj")
+
+
+def make_index(*paths: str) -> FunctionIndex:
+    return FunctionIndex({path: [{"name": "f", "start_line": 1, "end_line": 9}] for path in paths})
+
+
+def test_out_of_tree_path_sharing_a_basename_does_not_resolve() -> None:
+    index = make_index("lib/foo.c", "other/src/vuln_lib.c")
+    assert index.resolve_path(Path("/tmp/foo.c"), PROJECT_ROOT) is None
+    assert index.resolve_path(Path("/a/b/src/vuln_lib.c"), PROJECT_ROOT) is None
+
+
+def test_out_of_tree_path_ending_in_a_db_path_resolves() -> None:
+    index = make_index("other/src/vuln_lib.c", "src/vuln_lib.c")
+    assert index.resolve_path(Path("/build/checkout/src/vuln_lib.c"), PROJECT_ROOT) == "src/vuln_lib.c"
+
+
+def test_first_db_file_wins_when_several_match() -> None:
+    index = make_index("vuln_lib.c", "src/vuln_lib.c")
+    assert index.resolve_path(Path("/x/src/vuln_lib.c"), PROJECT_ROOT) == "vuln_lib.c"
+    index = make_index("src/vuln_lib.c", "vuln_lib.c")
+    assert index.resolve_path(Path("/x/src/vuln_lib.c"), PROJECT_ROOT) == "src/vuln_lib.c"
+
+
+def test_in_tree_path_resolves_relative_to_project_root() -> None:
+    index = make_index("src/vuln_lib.c")
+    assert index.resolve_path(PROJECT_ROOT / "src" / "vuln_lib.c", PROJECT_ROOT) == "src/vuln_lib.c"
+
+
+def test_store_index_matches_exact_db_paths(tmp_path: Path) -> None:
+    paths = ["vuln_lib.c", "other/src/vuln_lib.c", "src/vuln_lib.c", "lib/foo.c"]
+    files = [{"path": path, "functions": []} for path in paths]
+    write_store({"project_root": str(PROJECT_ROOT), "files": files}, tmp_path / "db")
+    store = CodeDbStore(tmp_path / "db")
+    try:
+        index = StoreFunctionIndex(store)
+        assert index.resolve_path(Path("/tmp/foo.c"), PROJECT_ROOT) is None
+        assert index.resolve_path(Path("/a/b/lib/foo.c"), PROJECT_ROOT) == "lib/foo.c"
+        assert index.resolve_path(Path("/x/src/vuln_lib.c"), PROJECT_ROOT) == "vuln_lib.c"
+    finally:
+        store.close()
+
+
+def read_streamed(stream: JsonStream) -> object:
+    """Rebuild a value through the streaming API (containers token by token)."""
+    if stream.peek() == "[":
+        return [read_streamed(stream) for _ in stream.elements()]
+    if stream.peek() == "{":
+        return {key: read_streamed(stream) for key in stream.items()}
+    return stream.value()
+
+
+def test_json_stream_at_every_chunk_size() -> None:
+    text = json.dumps(
+        {
+            "version": "2.1.0",
+            "a": 4.5,
+            "runs": [
+                {
+                    "results": [
+                        [11.5, 2],
+                        {"startLine": 123, "ratio": -0.25, "big": 1.5e10, "tiny": 2E-7, "neg": -1234},
+                        {"text": "x, y: 1.5", "ok": True, "none": None, "list": [0, 10, 100.0]},
+                    ]
+                }
+            ],
+            "n": 98765,
+        }
+    )
+    for chunk_size in range(1, len(text) + 2):
+        stream = JsonStream(io.StringIO(text), chunk_size=chunk_size)
+        assert read_streamed(stream) == json.loads(text), chunk_size
+        assert stream.peek() == ""
+
+
+def test_json_stream_number_at_end_of_input() -> None:
+    for chunk_size in range(1, 6):
+        assert JsonStream(io.StringIO("12.75"), chunk_size=chunk_size).value() == 12.75
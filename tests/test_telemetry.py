@@ -0,0 +1,34 @@
+"""Regression tests for fuzzer/telemetry.py."""
+
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "fuzzer"))
+
+from telemetry import collect_runs, latest_stats  # noqa: E402
+
+
+def write_stats(out_dir: Path, **fields: float) -> None:
+    (out_dir / "default").mkdir(parents=True)
+    lines = [f"{key:<18}: {value:g}" for key, value in fields.items()]
+    (out_dir / "default" / "fuzzer_stats").write_text("\n".join(lines) + "\n")
+
+
+def test_live_resume_dir_wins_over_older_timestamped_runs(tmp_path: Path) -> None:
+    write_stats(tmp_path / "out-h_afl", start_time=1_700_000_500, last_update=1_700_009_000, execs_per_sec=50)
+    write_stats(tmp_path / "out-h_afl-1700000000", start_time=1_700_000_000, last_update=1_700_000_060, execs_per_sec=9)
+    write_stats(tmp_path / "out-g_afl-1700000000", start_time=1_700_000_000, last_update=1_700_000_060, execs_per_sec=7)
+    latest = latest_stats(collect_runs(tmp_path))
+    assert latest["h_afl"]["execs_per_sec"] == 50
+    assert latest["g_afl"]["execs_per_sec"] == 7
+
+
+def test_runs_without_timestamps_fall_back_to_the_dir_mtime(tmp_path: Path) -> None:
+    write_stats(tmp_path / "out-h_afl", execs_per_sec=50)
+    write_stats(tmp_path / "out-h_afl-1700000000", execs_per_sec=9)
+    os.utime(tmp_path / "out-h_afl", (1_000, 1_000))
+    assert latest_stats(collect_runs(tmp_path))["h_afl"]["execs_per_sec"] == 9
+    os.utime(tmp_path / "out-h_afl-1700000000", (500, 500))
+    assert latest_stats(collect_runs(tmp_path))["h_afl"]["execs_per_sec"] == 50